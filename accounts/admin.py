@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from accounts.models import AlocacaoShard
+
+
+@admin.register(AlocacaoShard)
+class AlocacaoShardAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'banco', 'migrando')
+    list_filter = ('banco', 'migrando')
+    search_fields = ('usuario__username',)
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        import accounts.shards  # noqa: F401
+        import accounts.versoes  # noqa: F401
+        from django.contrib.auth.signals import user_logged_in
+
+        from accounts.replicas import atualizar_ultimo_login
+
+        # Troca o receptor do django.contrib.auth (se houver last_login).
+        if user_logged_in.disconnect(dispatch_uid='update_last_login'):
+            user_logged_in.connect(atualizar_ultimo_login, dispatch_uid='update_last_login')
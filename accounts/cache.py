@@ -0,0 +1,72 @@
+"""
+Cache de respostas por usuário.
+
+A chave de cada resposta combina o espaço (``resumo``, ``planejamentos``,
+...), o usuário, a versão dos dados dele (``accounts.versoes``) e os
+parâmetros da requisição. Enquanto a versão não muda, a resposta é servida do
+cache ``respostas`` (memória local com descarte LRU por padrão, ver
+``CACHES`` em settings); uma escrita incrementa a versão e as entradas antigas
+simplesmente deixam de ser consultadas até serem descartadas.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+
+from accounts.versoes import versao_do_usuario
+
+
+_trava = threading.Lock()
+_acertos = Counter()
+_falhas = Counter()
+
+
+def _chave(espaco, user_id, versao, parametros):
+    itens = sorted(parametros.lists() if hasattr(parametros, 'lists') else parametros.items())
+    assinatura = hashlib.sha1(repr(itens).encode()).hexdigest()
+    return f"{espaco}:{user_id}:{versao}:{assinatura}"
+
+
+def em_cache(espaco, user_id, parametros, calcular):
+    """
+    Retorna ``(valor, acertou)``: o valor em cache para o usuário e os
+    parâmetros informados, ou o resultado de ``calcular()``, que passa a ficar
+    em cache até a próxima escrita do usuário. Exceções de ``calcular`` não
+    são guardadas. Sem usuário (``user_id`` nulo), apenas calcula.
+    """
+    if user_id is None:
+        return calcular(), False
+    cache = caches['respostas']
+    chave = _chave(espaco, user_id, versao_do_usuario(user_id), parametros)
+    valor = cache.get(chave)
+    acertou = valor is not None
+    with _trava:
+        (_acertos if acertou else _falhas)[espaco] += 1
+    if not acertou:
+        valor = calcular()
+        cache.set(chave, valor)
+    return valor, acertou
+
+
+def estatisticas():
+    """
+    Acertos, falhas e taxa de acerto por espaço, desde o início do processo.
+    """
+    with _trava:
+        espacos = sorted(set(_acertos) | set(_falhas))
+        resultado = {}
+        for espaco in espacos:
+            total = _acertos[espaco] + _falhas[espaco]
+            resultado[espaco] = {
+                'acertos': _acertos[espaco],
+                'falhas': _falhas[espaco],
+                'taxa_acerto': round(_acertos[espaco] / total, 4) if total else 0.0,
+            }
+    return resultado
+
+
+def zerar_estatisticas():
+    with _trava:
+        _acertos.clear()
+        _falhas.clear()
@@ -0,0 +1,243 @@
+"""
+Instrumentação de requisições: consultas SQL, tempos e tamanho da resposta.
+
+``MedicaoMiddleware`` instala um ``execute_wrapper`` nas conexões durante a
+requisição e registra, para cada uma:
+
+- quantidade de consultas e tempo total no banco;
+- consultas repetidas: o mesmo SQL (sem os parâmetros) executado mais de uma
+  vez na requisição, assinatura típica de N+1;
+- tempo de serialização (serializers com ``SerializacaoMedidaMixin`` ou
+  blocos ``serializacao_medida``) e de renderização da resposta;
+- tamanho do corpo.
+
+Os tempos saem no cabeçalho ``Server-Timing`` (visível nas ferramentas de
+desenvolvedor do navegador) e, por rota, em uma janela deslizante das últimas
+``INSTRUMENTACAO_JANELA`` requisições deste processo, consultada em
+``/api/contas/desempenho/``. A consulta mais repetida de cada rota também é
+contada só nessa janela: o SQL de uma amostra descartada sai da contagem, de
+modo que SQLs variáveis (listas ``IN`` de tamanhos diferentes) não acumulam
+memória. O custo por consulta é o de duas leituras de relógio e um incremento
+em um ``Counter``.
+
+Requisições assíncronas (o fluxo SSE) e o corpo de respostas em fluxo
+(exportação) só têm o tempo total medido: as consultas delas acontecem fora
+da janela em que o middleware observa a conexão.
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from transactions.carga import percentis
+
+
+logger = logging.getLogger(__name__)
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+_trava = threading.Lock()
+_janelas = defaultdict(lambda: deque(maxlen=settings.INSTRUMENTACAO_JANELA))
+_repeticoes = defaultdict(Counter)
+
+
+class Medicao:
+    __slots__ = ('consultas', 'tempo_banco', 'tempo_serializacao', 'tempo_render', 'assinaturas', '_serializando')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.tempo_serializacao = 0.0
+        self.tempo_render = 0.0
+        self.assinaturas = Counter()
+        self._serializando = False
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_banco += time.perf_counter() - inicio
+            self.consultas += 1
+            self.assinaturas[sql] += 1
+
+    def repetidas(self):
+        """
+        Consultas além da primeira execução de cada SQL, e o SQL mais repetido.
+        """
+        extras = sum(vezes - 1 for vezes in self.assinaturas.values())
+        sql, vezes = self.assinaturas.most_common(1)[0] if self.assinaturas else (None, 0)
+        return extras, (sql if vezes > 1 else None), vezes
+
+
+@contextmanager
+def serializacao_medida():
+    """
+    Soma o tempo do bloco ao tempo de serialização da requisição. Blocos
+    aninhados não são contados duas vezes.
+    """
+    medicao = _medicao_atual.get()
+    if medicao is None or medicao._serializando:
+        yield
+        return
+    medicao._serializando = True
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.tempo_serializacao += time.perf_counter() - inicio
+        medicao._serializando = False
+
+
+class SerializacaoMedidaMixin:
+    """
+    Soma o tempo de ``to_representation`` do serializer à medição da
+    requisição. Serializers aninhados não são contados duas vezes.
+    """
+    def to_representation(self, instance):
+        with serializacao_medida():
+            return super().to_representation(instance)
+
+
+def _rota(request):
+    correspondencia = getattr(request, 'resolver_match', None)
+    if correspondencia is None:
+        return None
+    return f"{request.method} /{correspondencia.route}"
+
+
+def _server_timing(total, medicao=None):
+    metricas = []
+    if medicao is not None:
+        extras, _, _ = medicao.repetidas()
+        metricas.append(f'db;dur={medicao.tempo_banco * 1000:.2f};desc="{medicao.consultas} consultas"')
+        if extras:
+            metricas.append(f'dup;desc="{extras} repetidas"')
+        if medicao.tempo_serializacao:
+            metricas.append(f'ser;dur={medicao.tempo_serializacao * 1000:.2f}')
+        if medicao.tempo_render:
+            metricas.append(f'render;dur={medicao.tempo_render * 1000:.2f}')
+    metricas.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(metricas)
+
+
+def _registrar(rota, total, medicao, tamanho):
+    extras, sql, vezes = medicao.repetidas()
+    if vezes >= settings.INSTRUMENTACAO_LIMIAR_REPETICAO:
+        logger.warning("%s executou a mesma consulta %d vezes: %s", rota, vezes, sql[:300])
+    amostra = (total, medicao.tempo_banco, medicao.consultas, medicao.tempo_serializacao, tamanho, extras, sql)
+    with _trava:
+        janela = _janelas[rota]
+        if len(janela) == janela.maxlen:
+            _esquecer_repeticao(rota, janela[0][-1])
+        janela.append(amostra)
+        if sql:
+            _repeticoes[rota][sql] += 1
+
+
+def _esquecer_repeticao(rota, sql):
+    if sql:
+        contagem = _repeticoes[rota]
+        contagem[sql] -= 1
+        if contagem[sql] <= 0:
+            del contagem[sql]
+
+
+class MedicaoMiddleware:
+    """
+    Mede cada requisição e adiciona o cabeçalho ``Server-Timing``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not settings.INSTRUMENTACAO_ATIVA:
+            return self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(medicao))
+                response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        total = time.perf_counter() - inicio
+
+        response['Server-Timing'] = _server_timing(total, medicao)
+        rota = _rota(request)
+        if rota:
+            tamanho = None if getattr(response, 'streaming', False) else len(response.content)
+            _registrar(rota, total, medicao, tamanho)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        if settings.INSTRUMENTACAO_ATIVA:
+            response['Server-Timing'] = _server_timing(time.perf_counter() - inicio)
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Respostas do DRF são renderizadas depois da view; o tempo da
+        renderização é medido pelo callback pós-renderização.
+        """
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            inicio = time.perf_counter()
+
+            def renderizada(response):
+                medicao.tempo_render += time.perf_counter() - inicio
+
+            response.add_post_render_callback(renderizada)
+        return response
+
+
+def estatisticas_por_rota():
+    """
+    Percentis de tempo total, de banco e de serialização (ms), consultas e
+    tamanho das respostas por rota, nas últimas requisições deste processo.
+    """
+    with _trava:
+        janelas = {rota: list(amostras) for rota, amostras in _janelas.items()}
+        repeticoes = {rota: contagem.most_common(1)[0] for rota, contagem in _repeticoes.items() if contagem}
+
+    resultado = {}
+    for rota, amostras in sorted(janelas.items()):
+        totais, bancos, consultas, serializacoes, tamanhos, extras, _ = zip(*amostras)
+        tamanhos = [t for t in tamanhos if t is not None]
+        resultado[rota] = {
+            'requisicoes': len(amostras),
+            'total': percentis([t * 1000 for t in totais]),
+            'banco': percentis([t * 1000 for t in bancos]),
+            'serializacao': percentis([t * 1000 for t in serializacoes]),
+            'consultas': {'media': round(sum(consultas) / len(consultas), 2), 'max': max(consultas)},
+            'consultas_repetidas_media': round(sum(extras) / len(extras), 2),
+            'tamanho_medio_bytes': round(sum(tamanhos) / len(tamanhos)) if tamanhos else None,
+        }
+        if rota in repeticoes:
+            sql, vezes = repeticoes[rota]
+            resultado[rota]['consulta_mais_repetida'] = {'sql': sql, 'requisicoes': vezes}
+    return resultado
+
+
+def zerar_estatisticas_por_rota():
+    with _trava:
+        _janelas.clear()
+        _repeticoes.clear()
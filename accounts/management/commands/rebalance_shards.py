@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.shards import (
+    ESPERA_CONGELAMENTO, TAMANHO_BLOCO, mover_usuario, planejar_rebalanceamento, sincronizar_referencias,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move para o shard indicado pelo anel de hash consistente os usuários "
+        "que estão em outro banco, em blocos e sem parar o sistema."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, nargs='*',
+                            help="IDs dos usuários a verificar (padrão: todos).")
+        parser.add_argument('--bloco', type=int, default=TAMANHO_BLOCO,
+                            help=f"Linhas copiadas por vez (padrão: {TAMANHO_BLOCO}).")
+        parser.add_argument('--pausa', type=float, default=0.0,
+                            help="Segundos de espera entre um bloco e o próximo.")
+        parser.add_argument('--espera', type=float, default=ESPERA_CONGELAMENTO,
+                            help="Segundos de espera pelas escritas em andamento antes da etapa final.")
+        parser.add_argument('--simular', action='store_true',
+                            help="Só lista os usuários que seriam movidos.")
+
+    def handle(self, *args, **opcoes):
+        if not settings.BANCOS_SHARD:
+            raise CommandError("Nenhum shard configurado (BANCO_SHARDS).")
+
+        plano = planejar_rebalanceamento(opcoes['usuarios'])
+        if opcoes['simular']:
+            for user_id, origem, destino in plano:
+                self.stdout.write(f"Usuário {user_id}: {origem} -> {destino}")
+            self.stdout.write(self.style.SUCCESS(f"{len(plano)} usuários a mover."))
+            return
+
+        sincronizar_referencias(bloco=opcoes['bloco'])
+        for user_id, origem, destino in plano:
+            resumo = mover_usuario(user_id, origem, destino, opcoes['bloco'], opcoes['pausa'], opcoes['espera'])
+            self.stdout.write(
+                f"Usuário {user_id}: {origem} -> {destino}, {resumo['copiadas']} linhas copiadas."
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(plano)} usuários movidos."))
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlocacaoShard',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='alocacao_shard', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+                ('banco', models.CharField(max_length=50, verbose_name='Banco')),
+                ('migrando', models.BooleanField(default=False, verbose_name='Em migração')),
+            ],
+            options={
+                'verbose_name': 'Alocação de Shard',
+                'verbose_name_plural': 'Alocações de Shard',
+            },
+        ),
+    ]
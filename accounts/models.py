@@ -1,3 +1,50 @@
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+
+class VersaoDados(models.Model):
+    """
+    Contador de versão dos dados financeiros de um usuário. É incrementado a
+    cada escrita em transações, dívidas, metas e planejamentos; respostas em
+    cache levam a versão na chave e deixam de ser usadas quando ela muda.
+    """
+    usuario = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Usuário",
+        related_name="versao_dados"
+    )
+    versao = models.PositiveBigIntegerField(default=0, verbose_name="Versão")
+
+    class Meta:
+        verbose_name = "Versão dos Dados"
+        verbose_name_plural = "Versões dos Dados"
+
+    def __str__(self):
+        return f"{self.usuario_id}: v{self.versao}"
+
+
+class AlocacaoShard(models.Model):
+    """
+    Banco (shard) onde ficam os dados de um usuário. A linha é criada junto
+    com o usuário, pelo anel de hash consistente; usuários sem linha têm os
+    dados no banco ``default``. ``migrando`` bloqueia as escritas do usuário
+    durante a etapa final de ``rebalance_shards``.
+    """
+    usuario = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Usuário",
+        related_name="alocacao_shard"
+    )
+    banco = models.CharField(max_length=50, verbose_name="Banco")
+    migrando = models.BooleanField(default=False, verbose_name="Em migração")
+
+    class Meta:
+        verbose_name = "Alocação de Shard"
+        verbose_name_plural = "Alocações de Shard"
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.banco}"
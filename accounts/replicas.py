@@ -0,0 +1,251 @@
+"""
+Leituras em réplicas do banco.
+
+``RoteadorReplicas`` envia para uma das réplicas de ``BANCOS_REPLICA`` as
+leituras feitas dentro de ``ler_da_replica()``; fora dele, e em todas as
+escritas, vale o banco ``default``. As views entram no roteamento com o
+decorador ``leitura_em_replica``, o ``LeituraEmReplicaMixin`` (DRF) ou o
+``ListagemEmReplicaAdminMixin`` (admin), de modo que só relatórios,
+gráficos, exportações e listagens pesadas leiam de uma réplica.
+
+A réplica pode estar alguns instantes atrás do banco principal. Para que o
+usuário veja o que acabou de gravar (read-your-writes):
+
+- dentro de um escopo, depois de qualquer escrita, as leituras voltam ao
+  principal até o fim do escopo;
+- ``ReplicaMiddleware`` marca a resposta de uma requisição que escreveu com o
+  cookie ``REPLICA_COOKIE``, válido por ``REPLICA_JANELA_APOS_ESCRITA``
+  segundos, e as requisições que trazem o cookie leem do principal. O cookie
+  vale para todos os processos do servidor, ao contrário de um registro em
+  memória;
+- leituras dentro de uma transação do banco principal ficam nele.
+
+A sessão (``APPS_SEM_LEITURA_DAS_ESCRITAS``) e o ``last_login`` gravado a
+cada login (``atualizar_ultimo_login``, no lugar do ``update_last_login`` do
+Django) não contam como escrita: nenhuma leitura pesada depende deles. As
+demais escritas no usuário (senha, e-mail, permissões) contam.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_COOKIE = 'leitura_no_principal'
+APPS_SEM_LEITURA_DAS_ESCRITAS = ('sessions',)
+
+_escopo_atual = ContextVar('escopo_de_leitura', default=None)
+
+
+class EscopoDeLeitura:
+    __slots__ = ('em_replica', 'fixado', 'fixar_apos_escrita', 'escreveu', 'alias')
+
+    def __init__(self, fixado=False, fixar_apos_escrita=True):
+        self.em_replica = False
+        self.fixado = fixado
+        self.fixar_apos_escrita = fixar_apos_escrita
+        self.escreveu = False
+        self.alias = None
+
+    def alias_de_leitura(self):
+        """
+        A réplica deste escopo (sorteada uma vez, para que as leituras de uma
+        requisição vejam o mesmo estado), ou ``default``.
+        """
+        if not self.em_replica or self.fixado or (self.escreveu and self.fixar_apos_escrita):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if self.alias is None:
+            self.alias = random.choice(settings.BANCOS_REPLICA) if settings.BANCOS_REPLICA else DEFAULT_DB_ALIAS
+        return self.alias
+
+
+@contextmanager
+def escopo_de_leitura(fixado=False, fixar_apos_escrita=True):
+    """
+    Abre um escopo que registra as escritas feitas nele. Sozinho não muda o
+    roteamento: as leituras só vão para a réplica dentro de ``ler_da_replica``.
+    """
+    escopo = EscopoDeLeitura(fixado, fixar_apos_escrita)
+    token = _escopo_atual.set(escopo)
+    try:
+        yield escopo
+    finally:
+        _escopo_atual.reset(token)
+
+
+@contextmanager
+def ler_da_replica(fixar_apos_escrita=True):
+    """
+    Envia para uma réplica as leituras feitas no bloco. Dentro do escopo de
+    uma requisição, herda dele o estado de read-your-writes; com
+    ``fixar_apos_escrita=False`` (trabalhadores que gravam só progresso), as
+    escritas do bloco não trazem as leituras de volta ao principal.
+    """
+    escopo = _escopo_atual.get()
+    if escopo is None:
+        with escopo_de_leitura(fixar_apos_escrita=fixar_apos_escrita) as escopo:
+            escopo.em_replica = True
+            yield escopo
+        return
+
+    anterior = escopo.em_replica, escopo.fixar_apos_escrita
+    escopo.em_replica, escopo.fixar_apos_escrita = True, fixar_apos_escrita and escopo.fixar_apos_escrita
+    try:
+        yield escopo
+    finally:
+        escopo.em_replica, escopo.fixar_apos_escrita = anterior
+
+
+def alias_de_leitura():
+    """
+    O alias para onde as leituras iriam agora. Respostas em fluxo leem depois
+    que a view retorna, já fora do escopo, e devem fixar o alias na consulta
+    com ``.using(alias_de_leitura())``.
+    """
+    escopo = _escopo_atual.get()
+    return escopo.alias_de_leitura() if escopo is not None else DEFAULT_DB_ALIAS
+
+
+def leitura_em_replica(view):
+    """
+    Decorador de views que leem de uma réplica.
+    """
+    @wraps(view)
+    def envolvida(*args, **kwargs):
+        with ler_da_replica():
+            return view(*args, **kwargs)
+    return envolvida
+
+
+class LeituraEmReplicaMixin:
+    """
+    Views cujas leituras vão para uma réplica nos métodos seguros (GET, HEAD
+    e OPTIONS); os demais continuam inteiramente no principal.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return super().dispatch(request, *args, **kwargs)
+        with ler_da_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ListagemEmReplicaAdminMixin:
+    """
+    ``ModelAdmin`` cuja listagem lê de uma réplica. As ações em lote (POST
+    na listagem) ficam no principal.
+    """
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with ler_da_replica():
+            return super().changelist_view(request, extra_context)
+
+
+def _fragmentado(modelo):
+    from accounts.shards import e_por_usuario
+
+    return bool(settings.BANCOS_SHARD) and e_por_usuario(modelo)
+
+
+@contextmanager
+def escritas_sem_fixar():
+    """
+    As escritas feitas dentro do bloco não levam as leituras seguintes do
+    escopo para o banco principal.
+    """
+    escopo = _escopo_atual.get()
+    escreveu = escopo.escreveu if escopo is not None else False
+    try:
+        yield
+    finally:
+        if escopo is not None:
+            escopo.escreveu = escreveu
+
+
+def atualizar_ultimo_login(sender, user, **kwargs):
+    """
+    Receptor de ``user_logged_in``: o ``update_last_login`` do Django dentro
+    de ``escritas_sem_fixar``.
+    """
+    from django.contrib.auth.models import update_last_login
+
+    with escritas_sem_fixar():
+        update_last_login(sender, user, **kwargs)
+
+
+class RoteadorReplicas:
+    """
+    Roteador de ``DATABASE_ROUTERS``: leituras no escopo de réplica vão para
+    ``BANCOS_REPLICA``; escritas, sempre para o principal. Com shards, os
+    modelos fragmentados ficam com o ``RoteadorShards``, que vem depois; as
+    escritas neles ainda contam para o read-your-writes.
+    """
+    def db_for_read(self, model, **hints):
+        if _fragmentado(model):
+            return None
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db:
+            return instancia._state.db
+        escopo = _escopo_atual.get()
+        if escopo is None or not escopo.em_replica:
+            return None
+        return escopo.alias_de_leitura()
+
+    def db_for_write(self, model, **hints):
+        escopo = _escopo_atual.get()
+        if escopo is not None and model._meta.app_label not in APPS_SEM_LEITURA_DAS_ESCRITAS:
+            escopo.escreveu = True
+        return None if _fragmentado(model) else DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {DEFAULT_DB_ALIAS, *settings.BANCOS_REPLICA}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # As réplicas recebem o esquema pela replicação.
+        if db in settings.BANCOS_REPLICA:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Abre o escopo de leitura de cada requisição e, se ela escreveu no banco,
+    envia o cookie que mantém as leituras seguintes no principal.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        with escopo_de_leitura(fixado=REPLICA_COOKIE in request.COOKIES) as escopo:
+            response = self.get_response(request)
+        return self._marcar(escopo, response)
+
+    async def __acall__(self, request):
+        with escopo_de_leitura(fixado=REPLICA_COOKIE in request.COOKIES) as escopo:
+            response = await self.get_response(request)
+        return self._marcar(escopo, response)
+
+    def _marcar(self, escopo, response):
+        if escopo.escreveu:
+            response.set_cookie(
+                REPLICA_COOKIE, '1', max_age=settings.REPLICA_JANELA_APOS_ESCRITA,
+                httponly=True, samesite='Lax',
+            )
+        return response
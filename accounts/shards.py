@@ -0,0 +1,497 @@
+"""
+Fragmentação (sharding) dos dados por usuário.
+
+Os dados de cada usuário (transações, dívidas, metas, planejamentos, painel
+e relatórios, ver ``MODELOS_POR_USUARIO``) ficam inteiros em um dos bancos de
+``BANCOS_SHARD``. O banco de um usuário novo é escolhido por um anel de hash
+consistente e gravado em ``AlocacaoShard``; acrescentar um shard ao anel muda
+o destino de apenas ~1/N dos usuários, que ``rebalance_shards`` move em
+blocos. Usuários sem alocação (anteriores aos shards) ficam no ``default``.
+
+``RoteadorShards`` descobre o usuário de cada consulta:
+
+- pela instância (``hints['instance']``): o próprio usuário, um objeto com
+  ``user``/``usuario`` ou um filho cujo pai está carregado;
+- senão, pelo contexto: ``ShardMiddleware`` usa o usuário da requisição, e
+  código sem requisição usa ``no_shard_do_usuario(user_id)`` ou, para
+  percorrer todos os usuários de um banco, ``em_shard(banco)`` sobre cada um
+  de ``bancos_de_usuarios()``.
+
+Sem contexto, as consultas a esses modelos vão para o ``default``.
+
+Usuários e categorias (``TABELAS_DE_REFERENCIA``) continuam no ``default`` e
+são copiados para todos os shards a cada gravação, para que as chaves
+estrangeiras valham dentro de cada banco. Cada shard gera ids em uma faixa
+própria (``FAIXA_DE_IDS``), de modo que as linhas mantêm a chave primária ao
+mudar de banco.
+
+Um ``transaction.atomic()`` sem ``using`` é aberto no ``default`` e não
+protege as escritas feitas em um shard. Os serviços que gravam dados de um
+usuário abrem o bloco com ``atomico_do_usuario(user_id)``, que também roteia
+as consultas do bloco para o shard dele, ou com
+``transaction.atomic(using=router.db_for_write(Modelo, ...))`` quando o
+usuário vem do contexto ou da instância. Operações sobre vários usuários
+(reconstruções de agregados) os separam por banco com
+``usuarios_por_banco``. As réplicas de leitura (``accounts.replicas``) valem
+apenas para os modelos que não são fragmentados.
+"""
+import bisect
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import AlocacaoShard
+from transactions.models import Category
+
+
+# Em ordem de dependência: pais antes dos filhos.
+MODELOS_POR_USUARIO = {
+    'transactions.Transaction': 'user',
+    'transactions.ChaveIdempotencia': 'user',
+    'transactions.SegmentoArquivado': 'user',
+    'debts.Divida': 'usuario',
+    'debts.PagamentoDivida': 'divida__usuario',
+    'goals.Meta': 'usuario',
+    'goals.RegistroMeta': 'meta__usuario',
+    'annual_planning.PlanejamentoAnual': 'usuario',
+    'annual_planning.CategoriaPlanejamento': 'planejamento__usuario',
+    'dashboard.DashboardSummary': 'user',
+    'dashboard.DashboardChart': 'user',
+    'dashboard.DashboardNotification': 'user',
+    'dashboard.MonthlyCategoryTotal': 'user',
+    'reports.Relatorio': 'usuario',
+    'reports.LogRelatorio': 'relatorio__usuario',
+}
+TABELAS_DE_REFERENCIA = (User, Category)
+
+PONTOS_POR_BANCO = 128
+FAIXA_DE_IDS = 10 ** 12
+TAMANHO_BLOCO = 1000
+ESPERA_CONGELAMENTO = 0.5
+
+_contexto = ContextVar('contexto_de_shard', default=None)
+
+
+class UsuarioEmMigracao(DatabaseError):
+    """
+    Escrita nos dados de um usuário durante a etapa final da mudança de shard.
+    """
+
+
+def _hash(texto):
+    return int.from_bytes(hashlib.md5(texto.encode()).digest()[:8], 'big')
+
+
+class AnelConsistente:
+    """
+    Anel de hash consistente com ``pontos_por_banco`` pontos virtuais por
+    banco, para que a distribuição fique equilibrada.
+    """
+    def __init__(self, bancos, pontos_por_banco=PONTOS_POR_BANCO):
+        self.pontos = sorted((_hash(f"{banco}#{i}"), banco) for banco in bancos for i in range(pontos_por_banco))
+        self._posicoes = [posicao for posicao, _ in self.pontos]
+
+    def banco_para(self, chave):
+        if not self.pontos:
+            return DEFAULT_DB_ALIAS
+        indice = bisect.bisect(self._posicoes, _hash(str(chave))) % len(self.pontos)
+        return self.pontos[indice][1]
+
+
+@lru_cache(maxsize=8)
+def _anel(bancos):
+    return AnelConsistente(bancos)
+
+
+def anel():
+    return _anel(tuple(settings.BANCOS_SHARD))
+
+
+@lru_cache(maxsize=None)
+def modelos_por_usuario():
+    """
+    ``{modelo: caminho até o id do usuário}``, na ordem de dependência.
+    """
+    return {apps.get_model(rotulo): f"{caminho}_id" for rotulo, caminho in MODELOS_POR_USUARIO.items()}
+
+
+def e_por_usuario(modelo):
+    return modelo in modelos_por_usuario()
+
+
+def bancos_de_usuarios():
+    """
+    Bancos que podem guardar dados de usuários: os shards e o ``default``.
+    """
+    return [DEFAULT_DB_ALIAS, *(banco for banco in settings.BANCOS_SHARD if banco != DEFAULT_DB_ALIAS)]
+
+
+def alocacao(user_id):
+    """
+    ``(banco, migrando)`` do usuário.
+    """
+    linha = (
+        AlocacaoShard.objects.using(DEFAULT_DB_ALIAS)
+        .filter(usuario_id=user_id).values_list('banco', 'migrando').first()
+    )
+    return linha or (DEFAULT_DB_ALIAS, False)
+
+
+def banco_do_usuario(user_id):
+    """
+    Banco com os dados do usuário: o da alocação, ou ``default`` sem shards.
+    """
+    if not settings.BANCOS_SHARD:
+        return DEFAULT_DB_ALIAS
+    contexto = _contexto.get()
+    return (contexto.alocacao(user_id) if contexto is not None else alocacao(user_id))[0]
+
+
+def usuarios_por_banco(user_ids):
+    """
+    ``{banco: [user_ids]}`` com os usuários separados pelo banco dos seus dados.
+    """
+    user_ids = list(user_ids)
+    if not settings.BANCOS_SHARD:
+        return {DEFAULT_DB_ALIAS: user_ids} if user_ids else {}
+    bancos = dict(
+        AlocacaoShard.objects.using(DEFAULT_DB_ALIAS)
+        .filter(usuario_id__in=user_ids).values_list('usuario_id', 'banco')
+    )
+    grupos = {}
+    for user_id in user_ids:
+        grupos.setdefault(bancos.get(user_id, DEFAULT_DB_ALIAS), []).append(user_id)
+    return grupos
+
+
+class ContextoDeShard:
+    __slots__ = ('banco', 'usuario', '_alocacoes')
+
+    def __init__(self, banco=None, usuario=None):
+        self.banco = banco
+        self.usuario = usuario
+        self._alocacoes = {}
+
+    def usuario_atual(self):
+        return self.usuario() if callable(self.usuario) else self.usuario
+
+    def alocacao(self, user_id):
+        if user_id not in self._alocacoes:
+            self._alocacoes[user_id] = alocacao(user_id)
+        return self._alocacoes[user_id]
+
+
+@contextmanager
+def _com_contexto(contexto):
+    token = _contexto.set(contexto)
+    try:
+        yield contexto
+    finally:
+        _contexto.reset(token)
+
+
+def no_shard_do_usuario(usuario):
+    """
+    Roteia para o shard do usuário (id ou função que o retorna) as consultas
+    do bloco que não trazem o usuário na instância.
+    """
+    return _com_contexto(ContextoDeShard(usuario=usuario))
+
+
+def em_shard(banco):
+    """
+    Fixa no banco informado as consultas do bloco que não trazem o usuário na
+    instância, para percorrer os dados de todos os usuários de um shard.
+    """
+    return _com_contexto(ContextoDeShard(banco=banco))
+
+
+@contextmanager
+def atomico_do_usuario(user_id):
+    """
+    ``transaction.atomic`` no banco dos dados do usuário, com as consultas do
+    bloco roteadas para ele. Devolve o alias do banco, para os blocos
+    aninhados (``transaction.atomic(using=banco)``).
+    """
+    with no_shard_do_usuario(user_id):
+        banco = banco_do_usuario(user_id)
+        with transaction.atomic(using=banco):
+            yield banco
+
+
+def _usuario_da_instancia(instancia):
+    if isinstance(instancia, User):
+        return instancia.pk
+    caminho = modelos_por_usuario().get(type(instancia))
+    if caminho is None:
+        return None
+    *pais, campo = caminho.split('__')
+    atual = instancia
+    for nome in pais:
+        relacao = type(atual)._meta.get_field(nome)
+        if not relacao.is_cached(atual):
+            return None
+        atual = relacao.get_cached_value(atual)
+        if atual is None:
+            return None
+    return getattr(atual, campo)
+
+
+class RoteadorShards:
+    """
+    Roteador de ``DATABASE_ROUTERS``: leituras e escritas dos modelos de
+    ``MODELOS_POR_USUARIO`` vão para o shard do usuário.
+    """
+    def _banco(self, modelo, hints, escrita):
+        if not settings.BANCOS_SHARD or not e_por_usuario(modelo):
+            return None
+        instancia = hints.get('instance')
+        usuario = _usuario_da_instancia(instancia) if instancia is not None else None
+        if usuario is None and instancia is not None and e_por_usuario(type(instancia)) and instancia._state.db:
+            return instancia._state.db
+
+        contexto = _contexto.get()
+        if usuario is None and contexto is not None:
+            if contexto.banco is not None:
+                return contexto.banco
+            usuario = contexto.usuario_atual()
+        if usuario is None:
+            return None
+
+        banco, migrando = contexto.alocacao(usuario) if contexto is not None else alocacao(usuario)
+        if escrita and migrando:
+            raise UsuarioEmMigracao(f"Os dados do usuário {usuario} estão mudando de banco; tente novamente.")
+        return banco
+
+    def db_for_read(self, model, **hints):
+        return self._banco(model, hints, escrita=False)
+
+    def db_for_write(self, model, **hints):
+        return self._banco(model, hints, escrita=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.BANCOS_SHARD:
+            return None
+        bancos = set(bancos_de_usuarios())
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+
+class ShardMiddleware:
+    """
+    Roteia as consultas da requisição para o shard do usuário autenticado.
+    O usuário só é resolvido na primeira consulta a um modelo fragmentado.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        with no_shard_do_usuario(lambda: self._usuario(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with no_shard_do_usuario(lambda: self._usuario(request)):
+            return await self.get_response(request)
+
+    @staticmethod
+    def _usuario(request):
+        usuario = getattr(request, 'user', None)
+        return usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+
+def _campos_atualizaveis(modelo):
+    return [campo.name for campo in modelo._meta.concrete_fields if not campo.primary_key]
+
+
+def _gravar(modelo, objetos, banco, sobrescrever):
+    if not objetos:
+        return
+    if sobrescrever:
+        modelo._base_manager.using(banco).bulk_create(
+            objetos, update_conflicts=True,
+            unique_fields=[modelo._meta.pk.name], update_fields=_campos_atualizaveis(modelo),
+        )
+    else:
+        modelo._base_manager.using(banco).bulk_create(objetos, ignore_conflicts=True)
+
+
+def _em_blocos(consulta, bloco):
+    consulta = consulta.order_by('pk')
+    ultimo = None
+    while True:
+        lote = list((consulta.filter(pk__gt=ultimo) if ultimo is not None else consulta)[:bloco])
+        if not lote:
+            return
+        yield lote
+        ultimo = lote[-1].pk
+
+
+def sincronizar_referencias(bancos=None, bloco=TAMANHO_BLOCO):
+    """
+    Copia usuários e categorias do ``default`` para os shards (necessário ao
+    criar um shard ou ao ativar os shards em uma base existente).
+    """
+    for banco in bancos or settings.BANCOS_SHARD:
+        if banco == DEFAULT_DB_ALIAS:
+            continue
+        for modelo in TABELAS_DE_REFERENCIA:
+            for lote in _em_blocos(modelo._base_manager.using(DEFAULT_DB_ALIAS), bloco):
+                _gravar(modelo, lote, banco, sobrescrever=True)
+
+
+def mover_usuario(user_id, origem, destino, bloco=TAMANHO_BLOCO, pausa=0.0, espera=ESPERA_CONGELAMENTO):
+    """
+    Move os dados do usuário de ``origem`` para ``destino`` sem parar o
+    sistema:
+
+    1. copia as linhas em blocos de ``bloco``, com ``pausa`` segundos entre
+       eles, enquanto leituras e escritas continuam na origem;
+    2. bloqueia as escritas do usuário (``migrando``), espera ``espera``
+       segundos pelas transações em andamento e, em uma transação em cada
+       banco, remove do destino o que foi apagado na origem e regrava o que
+       mudou desde o início (linhas com ``updated_at`` posterior; modelos sem
+       esse campo são regravados por inteiro; um ``QuerySet.update`` nesses
+       modelos precisa gravar ``updated_at`` junto, como faz
+       ``dashboard.rollups.aplicar_delta``);
+    3. aponta a alocação para o destino, libera as escritas e remove as
+       linhas da origem em blocos.
+
+    Retorna um resumo com as linhas copiadas e removidas.
+    """
+    from transactions.signals import movimentos_suspensos
+
+    modelos = modelos_por_usuario()
+    inicio = timezone.now()
+    copiadas = 0
+    for modelo, caminho in modelos.items():
+        for lote in _em_blocos(modelo._base_manager.using(origem).filter(**{caminho: user_id}), bloco):
+            _gravar(modelo, lote, destino, sobrescrever=False)
+            copiadas += len(lote)
+            if pausa:
+                time.sleep(pausa)
+
+    AlocacaoShard.objects.update_or_create(usuario_id=user_id, defaults={'banco': origem, 'migrando': True})
+    try:
+        time.sleep(espera)
+        with transaction.atomic(using=origem), transaction.atomic(using=destino), movimentos_suspensos():
+            for modelo, caminho in reversed(modelos.items()):
+                na_origem = modelo._base_manager.using(origem).filter(**{caminho: user_id}).values_list('pk', flat=True)
+                no_destino = modelo._base_manager.using(destino).filter(**{caminho: user_id}).values_list('pk', flat=True)
+                apagadas = set(no_destino) - set(na_origem)
+                if apagadas:
+                    modelo._base_manager.using(destino).filter(pk__in=apagadas).delete()
+            for modelo, caminho in modelos.items():
+                consulta = modelo._base_manager.using(origem).filter(**{caminho: user_id})
+                if any(campo.name == 'updated_at' for campo in modelo._meta.concrete_fields):
+                    consulta = consulta.filter(updated_at__gte=inicio)
+                for lote in _em_blocos(consulta, bloco):
+                    _gravar(modelo, lote, destino, sobrescrever=True)
+        AlocacaoShard.objects.filter(usuario_id=user_id).update(banco=destino, migrando=False)
+    except BaseException:
+        AlocacaoShard.objects.filter(usuario_id=user_id).update(migrando=False)
+        raise
+
+    removidas = 0
+    with movimentos_suspensos():
+        for modelo, caminho in reversed(modelos.items()):
+            consulta = modelo._base_manager.using(origem).filter(**{caminho: user_id})
+            for lote in _em_blocos(consulta, bloco):
+                modelo._base_manager.using(origem).filter(pk__in=[objeto.pk for objeto in lote]).delete()
+                removidas += len(lote)
+    return {'usuario': user_id, 'origem': origem, 'destino': destino, 'copiadas': copiadas, 'removidas': removidas}
+
+
+def planejar_rebalanceamento(user_ids=None):
+    """
+    ``[(user_id, banco atual, banco do anel)]`` dos usuários fora do lugar.
+    """
+    atuais = dict(AlocacaoShard.objects.using(DEFAULT_DB_ALIAS).values_list('usuario_id', 'banco'))
+    usuarios = User.objects.using(DEFAULT_DB_ALIAS).order_by('pk').values_list('pk', flat=True)
+    if user_ids:
+        usuarios = usuarios.filter(pk__in=user_ids)
+    plano = []
+    for user_id in usuarios.iterator():
+        atual, alvo = atuais.get(user_id, DEFAULT_DB_ALIAS), anel().banco_para(user_id)
+        if atual != alvo:
+            plano.append((user_id, atual, alvo))
+    return plano
+
+
+@receiver(post_save, sender=User)
+def alocar_usuario(sender, instance, created, using, raw=False, **kwargs):
+    if created and not raw and settings.BANCOS_SHARD and using == DEFAULT_DB_ALIAS:
+        AlocacaoShard.objects.get_or_create(usuario=instance, defaults={'banco': anel().banco_para(instance.pk)})
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Category)
+def copiar_referencia(sender, instance, using, **kwargs):
+    if settings.BANCOS_SHARD and using == DEFAULT_DB_ALIAS:
+        for banco in settings.BANCOS_SHARD:
+            if banco != DEFAULT_DB_ALIAS:
+                _gravar(sender, [instance], banco, sobrescrever=True)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Category)
+def remover_referencia(sender, instance, using, **kwargs):
+    """
+    A remoção no ``default`` é repetida em cada shard, com a cascata (ou o
+    ``SET_NULL``) acontecendo dentro de cada banco.
+    """
+    from transactions.signals import movimentos_suspensos
+
+    if settings.BANCOS_SHARD and using == DEFAULT_DB_ALIAS:
+        for banco in settings.BANCOS_SHARD:
+            if banco != DEFAULT_DB_ALIAS:
+                with em_shard(banco), movimentos_suspensos():
+                    sender._base_manager.using(banco).filter(pk=instance.pk).delete()
+
+
+@receiver(post_migrate)
+def reservar_faixa_de_ids(sender, using, **kwargs):
+    """
+    Começa a numeração dos modelos por usuário de cada shard em
+    ``SHARD_INDICE * FAIXA_DE_IDS``, para que as chaves primárias não colidam
+    entre bancos.
+    """
+    conexao = connections[using]
+    indice = conexao.settings_dict.get('SHARD_INDICE')
+    if not indice or sender.label != 'accounts':
+        return
+    inicio = indice * FAIXA_DE_IDS
+    with conexao.cursor() as cursor:
+        for modelo in modelos_por_usuario():
+            tabela, coluna = modelo._meta.db_table, modelo._meta.pk.column
+            if conexao.vendor == 'sqlite':
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                    [tabela, inicio, tabela],
+                )
+            elif conexao.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, %s), %s, false) "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {conexao.ops.quote_name(tabela)})",
+                    [tabela, coluna, inicio],
+                )
@@ -1,3 +1,278 @@
-from django.test import TestCase
+import io
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.cache import estatisticas, zerar_estatisticas
+from accounts.instrumentacao import Medicao, zerar_estatisticas_por_rota
+from accounts.models import AlocacaoShard, VersaoDados
+from accounts.replicas import REPLICA_COOKIE, ler_da_replica
+from accounts import instrumentacao, shards
+from accounts.shards import FAIXA_DE_IDS, AnelConsistente, mover_usuario, no_shard_do_usuario
+from accounts.versoes import versao_do_usuario
+from dashboard.models import DashboardSummary
+from debts.models import Divida, PagamentoDivida
+from debts.pagamentos import registrar_pagamentos
+from transactions.models import Transaction
+
+
+class CacheDeRespostasTests(TestCase):
+    """
+    Respostas ficam em cache até a próxima escrita do próprio usuário.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cacheado')
+        cls.outro = User.objects.create_user('vizinho')
+
+    def setUp(self):
+        caches['respostas'].clear()
+        zerar_estatisticas()
+        self.client.force_login(self.usuario)
+        self.url = reverse('transacoes_relatorio')
+
+    def receita(self, usuario, valor):
+        Transaction.objects.create(
+            user=usuario, transaction_type='income', amount=Decimal(valor), date=date(2024, 1, 1),
+        )
+
+    def consultar(self, **parametros):
+        resposta = self.client.get(self.url, parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta['X-Cache'], resposta.json()['total_receitas']
+
+    def test_escritas_invalidam_apenas_o_proprio_usuario(self):
+        self.receita(self.usuario, '10.00')
+        self.assertEqual(self.consultar(), ('MISS', '10.00'))
+        self.assertEqual(self.consultar(), ('HIT', '10.00'))
+        self.assertEqual(self.consultar(agrupar='mes')[0], 'MISS')
+
+        self.receita(self.outro, '99.00')
+        self.assertEqual(self.consultar(), ('HIT', '10.00'))
+
+        self.receita(self.usuario, '5.00')
+        self.assertEqual(self.consultar(), ('MISS', '15.00'))
+
+        Divida.objects.create(
+            usuario=self.usuario, credor='Banco', valor_total=Decimal('100.00'),
+            data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 31),
+        )
+        self.assertEqual(self.consultar(), ('MISS', '15.00'))
+        self.assertEqual(estatisticas()['resumo'], {'acertos': 2, 'falhas': 4, 'taxa_acerto': 0.3333})
+
+    def test_versao_lida_sem_gravar(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(versao_do_usuario(self.usuario.pk), 0)
+
+        VersaoDados.objects.filter(usuario=self.outro).delete()
+        self.assertEqual(versao_do_usuario(self.outro.pk), 0)
+        self.assertTrue(VersaoDados.objects.filter(usuario=self.outro).exists())
+
+
+class InstrumentacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('medido')
+        cls.admin = User.objects.create_superuser('admin')
+        Transaction.objects.bulk_create(
+            Transaction(user=cls.usuario, transaction_type='income', amount=Decimal(i + 1), date=date(2024, 1, 1))
+            for i in range(5)
+        )
+
+    def setUp(self):
+        zerar_estatisticas_por_rota()
+
+    def test_server_timing_e_estatisticas_por_rota(self):
+        self.client.force_login(self.usuario)
+        for _ in range(3):
+            resposta = self.client.get(reverse('transacoes'))
+        metricas = dict(m.split(';', 1) for m in resposta['Server-Timing'].split(', '))
+        self.assertEqual(set(metricas), {'db', 'ser', 'render', 'total'})
+        self.assertIn('desc="4 consultas"', metricas['db'])
+
+        self.client.force_login(self.admin)
+        rotas = self.client.get(reverse('estatisticas_desempenho')).json()['rotas']
+        listagem = rotas['GET /api/transacoes/']
+        self.assertEqual(listagem['requisicoes'], 3)
+        self.assertEqual(listagem['consultas'], {'media': 4.0, 'max': 4})
+        self.assertEqual(listagem['tamanho_medio_bytes'], len(resposta.content))
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(reverse('estatisticas_desempenho')).status_code, 403)
+
+    def test_consultas_repetidas(self):
+        medicao = Medicao()
+        with connection.execute_wrapper(medicao):
+            for transacao in Transaction.objects.all():
+                User.objects.get(pk=transacao.user_id)
+        extras, sql, vezes = medicao.repetidas()
+        self.assertEqual((medicao.consultas, extras, vezes), (6, 4, 5))
+        self.assertIn('auth_user', sql)
+
+    @override_settings(INSTRUMENTACAO_JANELA=3, INSTRUMENTACAO_LIMIAR_REPETICAO=1000)
+    def test_repeticoes_limitadas_a_janela(self):
+        for tamanho in range(1, 11):
+            medicao = Medicao()
+            medicao.assinaturas[f"SELECT * FROM t WHERE id IN ({', '.join(['%s'] * tamanho)})"] = 2
+            instrumentacao._registrar('GET /lista/', 0.01, medicao, 100)
+
+        self.assertEqual(len(instrumentacao._repeticoes['GET /lista/']), 3)
+        rota = instrumentacao.estatisticas_por_rota()['GET /lista/']
+        self.assertEqual(rota['requisicoes'], 3)
+        self.assertEqual(rota['consulta_mais_repetida']['requisicoes'], 1)
+
+
+@override_settings(BANCOS_REPLICA=['replica'])
+class ReplicasTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_roteamento_dentro_do_escopo(self):
+        usuario = User.objects.create_user('roteado')
+        self.assertEqual(Transaction.objects.all().db, 'default')
+        with ler_da_replica():
+            self.assertEqual(Transaction.objects.all().db, 'replica')
+            Transaction.objects.create(user=usuario, transaction_type='income', amount=Decimal('1.00'), date=date(2024, 1, 1))
+            self.assertEqual(Transaction.objects.all().db, 'default')
+        with ler_da_replica(fixar_apos_escrita=False):
+            Transaction.objects.create(user=usuario, transaction_type='income', amount=Decimal('1.00'), date=date(2024, 1, 1))
+            self.assertEqual(Transaction.objects.all().db, 'replica')
+
+    def test_sessao_e_login_nao_fixam_no_principal(self):
+        usuario = User.objects.create_user('logado')
+        with ler_da_replica():
+            sessao = SessionStore()
+            sessao['usuario'] = usuario.pk
+            sessao.save()
+            user_logged_in.send(sender=User, request=None, user=usuario)
+            self.assertEqual(Transaction.objects.all().db, 'replica')
+            usuario.set_password('nova-senha')
+            usuario.save()
+            self.assertEqual(Transaction.objects.all().db, 'default')
+        usuario.refresh_from_db()
+        self.assertIsNotNone(usuario.last_login)
+
+    def test_leitura_das_proprias_escritas(self):
+        usuario = User.objects.create_user('leitor')
+        self.client.force_login(usuario)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(reverse('transacoes_relatorio')).status_code, 200)
+        self.assertTrue(replica.captured_queries)
+
+        resposta = self.client.post(reverse('transacoes'), {
+            'transaction_type': 'income', 'amount': '10.00', 'date': '2024-01-01', 'user': usuario.pk,
+        })
+        self.assertEqual(resposta.status_code, 201)
+        self.assertIn(REPLICA_COOKIE, resposta.cookies)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            relatorio = self.client.get(reverse('transacoes_relatorio')).json()
+        self.assertEqual(replica.captured_queries, [])
+        self.assertEqual(relatorio['total_receitas'], '10.00')
+
+
+@override_settings(BANCOS_SHARD=['shard1', 'shard2'])
+class ShardsTests(TransactionTestCase):
+    databases = {'default', 'shard1', 'shard2'}
+
+    def transacao(self, usuario, valor):
+        return Transaction.objects.create(
+            user=usuario, transaction_type='income', amount=Decimal(valor), date=date(2024, 1, 10),
+        )
+
+    def test_anel_move_so_uma_parte_dos_usuarios(self):
+        antes, depois = AnelConsistente(['shard1', 'shard2']), AnelConsistente(['shard1', 'shard2', 'shard3'])
+        movidos = [chave for chave in range(3000) if antes.banco_para(chave) != depois.banco_para(chave)]
+        self.assertLess(len(movidos), 1300)
+        self.assertTrue(all(depois.banco_para(chave) == 'shard3' for chave in movidos))
+
+    def test_dados_do_usuario_ficam_no_shard_dele(self):
+        usuarios = [User.objects.create_user(f'fragmentado{i}') for i in range(8)]
+        bancos = {u.pk: AlocacaoShard.objects.get(usuario=u).banco for u in usuarios}
+        self.assertEqual(set(bancos.values()), {'shard1', 'shard2'})
+
+        usuario = usuarios[0]
+        banco, outro = bancos[usuario.pk], ({'shard1', 'shard2'} - {bancos[usuario.pk]}).pop()
+        self.client.force_login(usuario)
+        resposta = self.client.post(reverse('transacoes'), {
+            'transaction_type': 'income', 'amount': '10.00', 'date': '2024-01-10', 'user': usuario.pk,
+        })
+        self.assertEqual(resposta.status_code, 201)
+        self.assertGreaterEqual(resposta.json()['id'], FAIXA_DE_IDS)
+
+        self.assertEqual(Transaction.objects.using(banco).filter(user=usuario).count(), 1)
+        self.assertFalse(Transaction.objects.using(outro).exists())
+        self.assertFalse(Transaction.objects.using('default').exists())
+        self.assertEqual(DashboardSummary.objects.using(banco).get(user=usuario).total_income, Decimal('10.00'))
+        self.assertEqual(self.client.get(reverse('transacoes_relatorio')).json()['total_receitas'], '10.00')
+
+    def test_rebalanceamento_move_os_dados_em_blocos(self):
+        with self.settings(BANCOS_SHARD=[]):
+            usuario = User.objects.create_user('antigo')
+            for valor in ('1.00', '2.00', '3.00'):
+                self.transacao(usuario, valor)
+            Divida.objects.create(
+                usuario=usuario, credor='Banco', valor_total=Decimal('100.00'),
+                data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 31),
+            )
+        self.assertFalse(AlocacaoShard.objects.filter(usuario=usuario).exists())
+
+        saida = io.StringIO()
+        call_command('rebalance_shards', bloco=2, espera=0, stdout=saida)
+        banco = AlocacaoShard.objects.get(usuario=usuario).banco
+        self.assertIn(f"default -> {banco}, 6 linhas copiadas", saida.getvalue())
+        self.assertEqual(Transaction.objects.using(banco).filter(user=usuario).count(), 3)
+        self.assertEqual(Divida.objects.using(banco).filter(usuario=usuario).count(), 1)
+        self.assertFalse(Transaction.objects.using('default').exists())
+        self.assertEqual(DashboardSummary.objects.using(banco).get(user=usuario).total_income, Decimal('6.00'))
+
+        self.transacao(usuario, '4.00')
+        self.assertEqual(DashboardSummary.objects.using(banco).get(user=usuario).total_income, Decimal('10.00'))
+
+    def test_escrita_durante_a_copia_chega_ao_destino(self):
+        with self.settings(BANCOS_SHARD=[]):
+            usuario = User.objects.create_user('em_movimento')
+            self.transacao(usuario, '1.00')
+        shards.sincronizar_referencias()
+        gravar = shards._gravar
+
+        def gravar_e_escrever(modelo, objetos, banco, sobrescrever):
+            gravar(modelo, objetos, banco, sobrescrever)
+            if modelo is DashboardSummary and not sobrescrever:
+                # Escrita depois de o resumo ser copiado e antes do congelamento.
+                self.transacao(usuario, '2.00')
+
+        with mock.patch.object(shards, '_gravar', gravar_e_escrever):
+            mover_usuario(usuario.pk, 'default', 'shard1', espera=0)
+
+        resumo = DashboardSummary.objects.using('shard1').get(user=usuario)
+        self.assertEqual(resumo.total_income, Decimal('3.00'))
+        self.assertEqual(Transaction.objects.using('shard1').filter(user=usuario).count(), 2)
+
+    def test_lote_recusado_e_desfeito_no_shard(self):
+        usuario = User.objects.create_user('fragmentado')
+        banco = AlocacaoShard.objects.get(usuario=usuario).banco
+        with no_shard_do_usuario(usuario.pk):
+            dividas = [
+                Divida.objects.create(
+                    usuario=usuario, credor=credor, valor_total=Decimal('50.00'),
+                    data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 31),
+                )
+                for credor in ('Banco', 'Loja')
+            ]
+            with self.assertRaises(ValidationError):
+                registrar_pagamentos([(dividas[0].pk, '30.00'), (dividas[1].pk, '80.00')])
+
+        self.assertEqual(Divida.objects.using(banco).get(pk=dividas[0].pk).valor_pago, Decimal('0'))
+        self.assertFalse(PagamentoDivida.objects.using(banco).exists())
@@ -0,0 +1,7 @@
+from django.urls import path
+from accounts.views import EstatisticasCacheView, EstatisticasDesempenhoView
+
+urlpatterns = [
+    path('cache/', EstatisticasCacheView.as_view(), name='estatisticas_cache'),
+    path('desempenho/', EstatisticasDesempenhoView.as_view(), name='estatisticas_desempenho'),
+]
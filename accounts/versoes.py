@@ -0,0 +1,88 @@
+"""
+Versão dos dados de cada usuário.
+
+A linha de ``VersaoDados`` é criada junto com o usuário (ou, para usuários
+antigos, na primeira leitura de ``versao_do_usuario``), de modo que todo
+usuário com respostas em cache tem uma linha e ``incrementar_versao`` pode ser
+um único ``UPDATE ... SET versao = versao + 1``.
+O incremento acontece dentro da mesma transação da escrita: quem leu a versão
+antiga continua gravando sob a chave antiga, que não será mais consultada
+depois do commit.
+"""
+from django.contrib.auth.models import User
+from django.db import router
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import VersaoDados
+from annual_planning.models import CategoriaPlanejamento, PlanejamentoAnual
+from debts.models import Divida, PagamentoDivida
+from goals.models import Meta, RegistroMeta
+from transactions.signals import transacoes_movimentadas
+
+
+def versao_do_usuario(user_id):
+    """
+    Versão atual dos dados do usuário. A leitura é um ``SELECT`` simples, que
+    segue o roteamento de leitura; a linha só é criada (no banco de escrita)
+    quando ainda não existe.
+    """
+    versao = VersaoDados.objects.filter(usuario_id=user_id).values_list('versao', flat=True).first()
+    if versao is None:
+        versao = VersaoDados.objects.get_or_create(usuario_id=user_id)[0].versao
+    return versao
+
+
+def incrementar_versao(usuarios):
+    """
+    Incrementa a versão dos usuários informados (lista de IDs ou subconsulta
+    ``values('usuario_id')``).
+    """
+    if isinstance(usuarios, QuerySet) and usuarios.db != router.db_for_write(VersaoDados):
+        # Com shards, a subconsulta é de outro banco: os IDs são lidos antes.
+        usuarios = {valor for linha in usuarios for valor in linha.values()}
+    VersaoDados.objects.filter(usuario_id__in=usuarios).update(versao=F('versao') + 1)
+
+
+@receiver(post_save, sender=User)
+def usuario_criado(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        VersaoDados.objects.get_or_create(usuario=instance)
+
+
+@receiver(transacoes_movimentadas)
+def transacoes_alteradas(sender, movimentos, **kwargs):
+    incrementar_versao({movimento.user_id for movimento in movimentos})
+
+
+@receiver(post_save, sender=Divida)
+@receiver(post_delete, sender=Divida)
+@receiver(post_save, sender=Meta)
+@receiver(post_delete, sender=Meta)
+@receiver(post_save, sender=PlanejamentoAnual)
+@receiver(post_delete, sender=PlanejamentoAnual)
+def dono_alterou(sender, instance, raw=False, **kwargs):
+    if not raw:
+        incrementar_versao([instance.usuario_id])
+
+
+@receiver(post_save, sender=PagamentoDivida)
+@receiver(post_delete, sender=PagamentoDivida)
+def pagamento_alterado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        incrementar_versao(Divida.objects.filter(pk=instance.divida_id).values('usuario_id'))
+
+
+@receiver(post_save, sender=RegistroMeta)
+@receiver(post_delete, sender=RegistroMeta)
+def contribuicao_alterada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        incrementar_versao(Meta.objects.filter(pk=instance.meta_id).values('usuario_id'))
+
+
+@receiver(post_save, sender=CategoriaPlanejamento)
+@receiver(post_delete, sender=CategoriaPlanejamento)
+def categoria_alterada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        incrementar_versao(PlanejamentoAnual.objects.filter(pk=instance.planejamento_id).values('usuario_id'))
@@ -1,3 +1,26 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from rest_framework.permissions import IsAdminUser # type: ignore
+from rest_framework.views import APIView # type: ignore
+from accounts.cache import estatisticas
+from accounts.instrumentacao import estatisticas_por_rota
 
-# Create your views here.
+
+class EstatisticasCacheView(APIView):
+    """
+    View para consultar acertos e falhas do cache de respostas neste processo.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return JsonResponse({"cache": estatisticas()})
+
+
+class EstatisticasDesempenhoView(APIView):
+    """
+    View para consultar, por rota, tempos, consultas SQL e tamanho das
+    respostas das últimas requisições deste processo.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return JsonResponse({"rotas": estatisticas_por_rota()})
@@ -3,14 +3,43 @@ from annual_planning.models import PlanejamentoAnual, CategoriaPlanejamento
 
 @admin.register(PlanejamentoAnual)
 class PlanejamentoAnualAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'ano', 'criado_em', 'atualizado_em')
+    list_display = ('usuario', 'ano', 'planejado', 'gasto', 'saldo', 'criado_em', 'atualizado_em')
     list_filter = ('ano', 'usuario')
+    list_select_related = ('usuario',)
     search_fields = ('usuario__username',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Total Planejado', ordering='planejado_total')
+    def planejado(self, obj):
+        return obj.planejado_total
+
+    @admin.display(description='Total Gasto', ordering='gasto_total')
+    def gasto(self, obj):
+        return obj.gasto_total
+
+    @admin.display(description='Saldo', ordering='saldo_total')
+    def saldo(self, obj):
+        return obj.saldo_total
+
 
 @admin.register(CategoriaPlanejamento)
 class CategoriaPlanejamentoAdmin(admin.ModelAdmin):
-    list_display = ('planejamento', 'nome', 'orcamento_planejado', 'gasto_real', 'saldo')
+    list_display = ('planejamento', 'nome', 'categoria', 'orcamento_planejado', 'gasto_real', 'saldo')
     list_filter = ('planejamento__ano', 'nome')
+    list_select_related = ('planejamento__usuario', 'categoria')
     search_fields = ('nome', 'descricao', 'planejamento__usuario__username')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
+    def get_readonly_fields(self, request, obj=None):
+        # Com categoria vinculada, o gasto real vem das transações.
+        if obj is not None and obj.categoria_id is not None:
+            return ('gasto_real',)
+        return ()
+
+    @admin.display(description='Saldo', ordering='saldo_restante')
+    def saldo(self, obj):
+        return obj.saldo_restante
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AnnualPlanningConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'annual_planning'
+
+    def ready(self):
+        import annual_planning.gastos  # noqa: F401
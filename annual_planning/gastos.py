@@ -0,0 +1,121 @@
+"""
+Gasto real das categorias de planejamento vinculadas a uma ``Category``.
+
+O gasto real de uma ``CategoriaPlanejamento`` vinculada é a soma das despesas
+do usuário naquela categoria ao longo do ano do planejamento. Ele é mantido
+por deltas: cada ``Movimento`` de despesa recebido por
+``transacoes_movimentadas`` vira um ``UPDATE ... SET gasto_real = gasto_real
++ delta`` na categoria correspondente. ``reconstruir_gastos`` recalcula um ano
+inteiro com uma única consulta agrupada sobre as transações.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import receiver
+
+from accounts.shards import bancos_de_usuarios, em_shard, usuarios_por_banco
+from accounts.versoes import incrementar_versao
+from annual_planning.models import CategoriaPlanejamento
+from transactions.arquivo import movimentos_arquivados
+from transactions.models import Transaction
+from transactions.signals import transacoes_movimentadas
+
+
+ZERO = Decimal('0.00')
+
+
+def _despesas_do_ano(ano):
+    return Transaction.objects.filter(
+        transaction_type='expense',
+        date__range=(date(ano, 1, 1), date(ano, 12, 31)),
+    ).order_by()
+
+
+@receiver(transacoes_movimentadas)
+def atualizar_gastos(sender, movimentos, **kwargs):
+    deltas = defaultdict(Decimal)
+    for movimento in movimentos:
+        if movimento.tipo == 'expense' and movimento.categoria_id is not None:
+            deltas[(movimento.user_id, movimento.data.year, movimento.categoria_id)] += movimento.valor
+
+    for (user_id, ano, categoria_id), delta in deltas.items():
+        if delta:
+            CategoriaPlanejamento.objects.filter(
+                planejamento__usuario_id=user_id,
+                planejamento__ano=ano,
+                categoria_id=categoria_id,
+            ).update(gasto_real=F('gasto_real') + delta)
+
+
+def recalcular_categoria(pk):
+    """
+    Recalcula o gasto real de uma categoria de planejamento vinculada e
+    retorna o novo valor. Deve ser chamada dentro de uma transação: a linha
+    fica travada até o fim dela, então nenhum delta concorrente se perde.
+    """
+    categoria = (
+        CategoriaPlanejamento.objects.select_for_update(of=('self',))
+        .select_related('planejamento')
+        .only('categoria_id', 'planejamento__usuario_id', 'planejamento__ano')
+        .get(pk=pk)
+    )
+    total = _despesas_do_ano(categoria.planejamento.ano).filter(
+        user_id=categoria.planejamento.usuario_id,
+        category_id=categoria.categoria_id,
+    ).aggregate(total=Sum('amount'))['total']
+    total = Decimal(total or ZERO) + sum(
+        valor for _, _, tipo, categoria_id, valor
+        in movimentos_arquivados([categoria.planejamento.usuario_id], categoria.planejamento.ano)
+        if tipo == 'expense' and categoria_id == categoria.categoria_id
+    )
+    total = total.quantize(ZERO)
+    CategoriaPlanejamento.objects.filter(pk=pk).update(gasto_real=total)
+    return total
+
+
+def reconstruir_gastos(ano, user_ids=None):
+    """
+    Recalcula o gasto real de todas as categorias vinculadas dos planejamentos
+    de ``ano`` (opcionalmente só dos usuários informados) e retorna quantas
+    categorias foram atualizadas. Com shards, cada banco é recalculado à parte.
+    """
+    bancos = usuarios_por_banco(user_ids) if user_ids else dict.fromkeys(bancos_de_usuarios())
+    atualizadas = 0
+    for banco, ids in bancos.items():
+        with em_shard(banco):
+            atualizadas += _reconstruir_gastos(banco, ano, ids)
+    return atualizadas
+
+
+def _reconstruir_gastos(banco, ano, user_ids):
+    categorias = CategoriaPlanejamento.objects.filter(planejamento__ano=ano, categoria__isnull=False)
+    if user_ids:
+        categorias = categorias.filter(planejamento__usuario_id__in=user_ids)
+
+    with transaction.atomic(using=banco):
+        linhas = list(
+            categorias.select_for_update(of=('self',))
+            .values_list('pk', 'planejamento__usuario_id', 'categoria_id')
+        )
+        usuarios = {usuario_id for _, usuario_id, _ in linhas}
+        totais = defaultdict(Decimal)
+        for linha in (
+            _despesas_do_ano(ano)
+            .filter(user_id__in=usuarios, category__isnull=False)
+            .values('user_id', 'category_id')
+            .annotate(total=Sum('amount'))
+        ):
+            totais[linha['user_id'], linha['category_id']] += Decimal(linha['total'])
+        for user_id, _, tipo, categoria_id, valor in movimentos_arquivados(usuarios, ano):
+            if tipo == 'expense' and categoria_id is not None:
+                totais[user_id, categoria_id] += valor
+        alteradas = [
+            CategoriaPlanejamento(pk=pk, gasto_real=Decimal(totais.get((usuario_id, categoria_id)) or ZERO).quantize(ZERO))
+            for pk, usuario_id, categoria_id in linhas
+        ]
+        CategoriaPlanejamento.objects.bulk_update(alteradas, ['gasto_real'], batch_size=1000)
+        incrementar_versao(usuarios)
+    return len(alteradas)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from annual_planning.gastos import reconstruir_gastos
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o gasto real das categorias de planejamento vinculadas a uma "
+        "categoria de transações, com uma consulta agrupada por ano."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ano', type=int, nargs='*',
+                            help="Anos a recalcular (padrão: o ano atual).")
+        parser.add_argument('--usuarios', type=int, nargs='*',
+                            help="IDs dos usuários a recalcular (padrão: todos).")
+
+    def handle(self, *args, **opcoes):
+        for ano in opcoes['ano'] or [timezone.localdate().year]:
+            atualizadas = reconstruir_gastos(ano, opcoes['usuarios'])
+            self.stdout.write(self.style.SUCCESS(f"{ano}: {atualizadas} categorias recalculadas."))
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('annual_planning', '0001_initial'),
+        ('transactions', '0002_indices_transacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoriaplanejamento',
+            name='categoria',
+            field=models.ForeignKey(blank=True, help_text='Quando informada, o gasto real é calculado a partir das despesas dessa categoria no ano.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='categorias_planejamento', to='transactions.category', verbose_name='Categoria de Transações'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoriaplanejamento',
+            constraint=models.UniqueConstraint(fields=('planejamento', 'categoria'), name='categoria_planejamento_unica_por_categoria'),
+        ),
+    ]
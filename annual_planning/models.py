@@ -1,8 +1,41 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from decimal import Decimal
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+DINHEIRO = DecimalField(max_digits=15, decimal_places=2)
+
+
+def _soma(campo):
+    return Coalesce(Sum(campo), Value(Decimal('0.00')), output_field=DINHEIRO)
+
+
+class PlanejamentoAnualQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Anota ``planejado_total``, ``gasto_total`` e ``saldo_total`` de cada
+        planejamento, somados pelo banco em uma única consulta.
+        """
+        return self.annotate(
+            planejado_total=_soma('categorias__orcamento_planejado'),
+            gasto_total=_soma('categorias__gasto_real'),
+        ).annotate(
+            saldo_total=ExpressionWrapper(F('planejado_total') - F('gasto_total'), output_field=DINHEIRO),
+        )
+
+
+class CategoriaPlanejamentoQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Anota ``saldo_restante`` (orçamento planejado menos gasto real).
+        """
+        return self.annotate(
+            saldo_restante=ExpressionWrapper(F('orcamento_planejado') - F('gasto_real'), output_field=DINHEIRO),
+        )
 
 
 class PlanejamentoAnual(models.Model):
@@ -19,6 +52,8 @@ class PlanejamentoAnual(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
+    objects = PlanejamentoAnualQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Planejamento Anual"
         verbose_name_plural = "Planejamentos Anuais"
@@ -28,17 +63,38 @@ class PlanejamentoAnual(models.Model):
     def __str__(self):
         return f"Planejamento Anual {self.ano} ({self.usuario.username})"
 
+    def _totais(self):
+        """
+        Usa as anotações de ``with_totals()`` quando presentes; caso
+        contrário, soma as categorias no banco.
+        """
+        if hasattr(self, 'planejado_total'):
+            return self.planejado_total, self.gasto_total
+        totais = self.categorias.aggregate(
+            planejado=_soma('orcamento_planejado'),
+            gasto=_soma('gasto_real'),
+        )
+        return totais['planejado'], totais['gasto']
+
     def total_planejado(self):
         """
         Calcula o total planejado para todas as categorias.
+        Para vários planejamentos, use ``PlanejamentoAnual.objects.with_totals()``.
         """
-        return sum(categoria.orcamento_planejado for categoria in self.categorias.all())
+        return self._totais()[0]
 
     def total_gasto(self):
         """
         Calcula o total gasto em todas as categorias.
         """
-        return sum(categoria.gasto_real for categoria in self.categorias.all())
+        return self._totais()[1]
+
+    def saldo(self):
+        """
+        Calcula o saldo restante do planejamento.
+        """
+        planejado, gasto = self._totais()
+        return planejado - gasto
 
 
 class CategoriaPlanejamento(models.Model):
@@ -53,6 +109,15 @@ class CategoriaPlanejamento(models.Model):
     )
     nome = models.CharField(max_length=100, verbose_name="Nome da Categoria")
     descricao = models.TextField(blank=True, null=True, verbose_name="Descrição")
+    categoria = models.ForeignKey(
+        'transactions.Category',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="categorias_planejamento",
+        verbose_name="Categoria de Transações",
+        help_text="Quando informada, o gasto real é calculado a partir das despesas dessa categoria no ano.",
+    )
     orcamento_planejado = models.DecimalField(
         max_digits=15,
         decimal_places=2,
@@ -67,10 +132,18 @@ class CategoriaPlanejamento(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
+    objects = CategoriaPlanejamentoQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Categoria de Planejamento"
         verbose_name_plural = "Categorias de Planejamento"
         unique_together = ('planejamento', 'nome')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['planejamento', 'categoria'],
+                name='categoria_planejamento_unica_por_categoria',
+            ),
+        ]
         ordering = ['nome']
 
     def __str__(self):
@@ -86,11 +159,26 @@ class CategoriaPlanejamento(models.Model):
         """
         Regras de validação:
         - O orçamento planejado deve ser maior que zero.
-        - O gasto real não pode ser maior que o orçamento planejado.
+        - O gasto real informado manualmente não pode ser maior que o orçamento
+          planejado (quando há categoria vinculada, ele vem das transações e
+          pode ultrapassar o orçamento).
         """
         if self.orcamento_planejado <= 0:
             raise ValidationError(_("O orçamento planejado deve ser maior que zero."))
 
-        if self.gasto_real > self.orcamento_planejado:
+        if self.categoria_id is None and self.gasto_real > self.orcamento_planejado:
             raise ValidationError(_("O gasto real não pode exceder o orçamento planejado."))
 
+    def save(self, *args, **kwargs):
+        """
+        Com categoria vinculada, recalcula o gasto real a partir das
+        transações logo após salvar; daí em diante ele é mantido pelos deltas
+        de ``annual_planning.gastos``.
+        """
+        from annual_planning.gastos import recalcular_categoria
+
+        with transaction.atomic(using=router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+            if self.categoria_id is not None:
+                self.gasto_real = recalcular_categoria(self.pk)
+
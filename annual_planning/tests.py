@@ -1,3 +1,144 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from annual_planning.gastos import reconstruir_gastos
+from annual_planning.models import CategoriaPlanejamento, PlanejamentoAnual
+from transactions.models import Category, Transaction
+
+
+class TotaisPlanejamentoTests(TestCase):
+    """
+    Os totais de planejamento são calculados pelo banco: a listagem da API e a
+    do admin fazem o mesmo número de consultas para 1 ou para muitos
+    planejamentos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='senha')
+        cls.usuario = User.objects.create_user('planejador', password='senha')
+
+    def criar_planejamentos(self, usuario, anos):
+        for ano in anos:
+            planejamento = PlanejamentoAnual.objects.create(usuario=usuario, ano=ano)
+            CategoriaPlanejamento.objects.bulk_create([
+                CategoriaPlanejamento(
+                    planejamento=planejamento, nome=f"Categoria {i}",
+                    orcamento_planejado=Decimal('100.00') * i, gasto_real=Decimal('12.50') * i,
+                )
+                for i in range(1, 4)
+            ])
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas), resposta
+
+    def test_totais_anotados(self):
+        self.criar_planejamentos(self.usuario, [2024])
+        PlanejamentoAnual.objects.create(usuario=self.usuario, ano=2025)
+
+        totais = {p.ano: (p.planejado_total, p.gasto_total, p.saldo_total) for p in PlanejamentoAnual.objects.with_totals()}
+        self.assertEqual(totais[2024], (Decimal('600.00'), Decimal('75.00'), Decimal('525.00')))
+        self.assertEqual(totais[2025], (Decimal('0.00'), Decimal('0.00'), Decimal('0.00')))
+
+        planejamento = PlanejamentoAnual.objects.get(ano=2024)
+        self.assertEqual((planejamento.total_planejado(), planejamento.total_gasto()), totais[2024][:2])
+
+    def test_api_com_numero_constante_de_consultas(self):
+        self.client.force_login(self.usuario)
+        url = reverse('planejamentos_anuais')
+        self.criar_planejamentos(self.usuario, [2020])
+        poucas, _ = self.contar_consultas(url)
+        self.criar_planejamentos(self.usuario, range(2021, 2030))
+        muitas, resposta = self.contar_consultas(url)
+
+        self.assertEqual(poucas, muitas)
+        dados = resposta.json()['planejamentos']
+        self.assertEqual(len(dados), 10)
+        self.assertEqual(
+            [Decimal(dados[0][chave]) for chave in ('total_planejado', 'total_gasto', 'saldo')],
+            [Decimal('600.00'), Decimal('75.00'), Decimal('525.00')],
+        )
+        self.assertEqual(Decimal(dados[0]['categorias'][0]['saldo']), Decimal('87.50'))
+        self.assertEqual(len(dados[0]['categorias']), 3)
+
+    def test_admin_com_numero_constante_de_consultas(self):
+        self.client.force_login(self.admin)
+        planejamentos = reverse('admin:annual_planning_planejamentoanual_changelist')
+        categorias = reverse('admin:annual_planning_categoriaplanejamento_changelist')
+        self.criar_planejamentos(self.usuario, [2020])
+        antes = [self.contar_consultas(planejamentos)[0], self.contar_consultas(categorias)[0]]
+        for i in range(5):
+            self.criar_planejamentos(User.objects.create_user(f"outro{i}"), range(2021, 2025))
+        depois = [self.contar_consultas(planejamentos)[0], self.contar_consultas(categorias)[0]]
+        self.assertEqual(antes, depois)
+
+
+class GastoRealTests(TestCase):
+    """
+    O gasto real de categorias vinculadas acompanha as despesas do ano.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gastador')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+        cls.lazer = Category.objects.create(name='Lazer', type='expense')
+
+    def criar_categoria(self, ano=2024, categoria=None):
+        planejamento, _ = PlanejamentoAnual.objects.get_or_create(usuario=self.usuario, ano=ano)
+        return CategoriaPlanejamento.objects.create(
+            planejamento=planejamento, nome=f"Mercado {ano}",
+            orcamento_planejado=Decimal('1000.00'), categoria=categoria or self.mercado,
+        )
+
+    def despesa(self, valor, dia, categoria=None, **extra):
+        return Transaction.objects.create(
+            user=self.usuario, transaction_type='expense', category=categoria or self.mercado,
+            amount=Decimal(valor), date=dia, **extra,
+        )
+
+    def gasto(self, categoria):
+        categoria.refresh_from_db()
+        return categoria.gasto_real
+
+    def test_vinculo_calcula_gasto_existente(self):
+        self.despesa('10.00', date(2024, 3, 1))
+        self.despesa('99.00', date(2023, 3, 1))
+        self.assertEqual(self.gasto(self.criar_categoria()), Decimal('10.00'))
+
+    def test_deltas_de_inclusao_alteracao_e_remocao(self):
+        categoria = self.criar_categoria()
+        outra = self.criar_categoria(2025)
+        transacao = self.despesa('40.00', date(2024, 5, 10))
+        self.despesa('5.00', date(2024, 5, 10), categoria=self.lazer)
+        self.assertEqual(self.gasto(categoria), Decimal('40.00'))
+
+        transacao.amount = Decimal('25.50')
+        transacao.save()
+        self.assertEqual(self.gasto(categoria), Decimal('25.50'))
+
+        transacao.date = date(2025, 1, 2)
+        transacao.save()
+        self.assertEqual((self.gasto(categoria), self.gasto(outra)), (Decimal('0.00'), Decimal('25.50')))
+
+        transacao.delete()
+        self.assertEqual(self.gasto(outra), Decimal('0.00'))
+
+    def test_reconstrucao_do_ano(self):
+        categoria = self.criar_categoria()
+        self.despesa('12.00', date(2024, 1, 1))
+        self.despesa('8.00', date(2024, 12, 31))
+        CategoriaPlanejamento.objects.filter(pk=categoria.pk).update(gasto_real=Decimal('0.00'))
 
-# Create your tests here.
+        with self.assertNumQueries(7):  # categorias, totais, arquivo, UPDATE e versão, entre SAVEPOINT e RELEASE
+            self.assertEqual(reconstruir_gastos(2024), 1)
+        self.assertEqual(self.gasto(categoria), Decimal('20.00'))
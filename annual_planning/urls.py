@@ -0,0 +1,6 @@
+from django.urls import path
+from annual_planning.views import PlanejamentosAnuaisView
+
+urlpatterns = [
+    path('', PlanejamentosAnuaisView.as_view(), name='planejamentos_anuais'),
+]
@@ -1,3 +1,62 @@
-from django.shortcuts import render
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from rest_framework.permissions import IsAuthenticated # type: ignore
+from rest_framework.views import APIView # type: ignore
+from annual_planning.models import PlanejamentoAnual, CategoriaPlanejamento
+from accounts.cache import em_cache
+from accounts.replicas import LeituraEmReplicaMixin
 
-# Create your views here.
+
+class PlanejamentosAnuaisView(LeituraEmReplicaMixin, APIView):
+    """
+    View para listar os planejamentos anuais do usuário com os totais
+    planejado, gasto e restante, por planejamento e por categoria.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Duas consultas, qualquer que seja o número de planejamentos: uma para
+        os planejamentos com os totais e outra para as categorias.
+        """
+        ano = request.query_params.get('ano')
+        if ano and not ano.isdigit():
+            return JsonResponse({"erro": "O ano deve ser um número."}, status=400)
+
+        dados, acertou = em_cache('planejamentos', request.user.pk, request.query_params,
+                                  lambda: self._listar(request.user, ano))
+        resposta = JsonResponse(dados)
+        resposta['X-Cache'] = 'HIT' if acertou else 'MISS'
+        return resposta
+
+    def _listar(self, usuario, ano):
+        planejamentos = (
+            PlanejamentoAnual.objects.filter(usuario=usuario)
+            .with_totals()
+            .prefetch_related(Prefetch('categorias', queryset=CategoriaPlanejamento.objects.with_totals()))
+        )
+        if ano:
+            planejamentos = planejamentos.filter(ano=int(ano))
+
+        return {
+            "planejamentos": [
+                {
+                    "id": planejamento.pk,
+                    "ano": planejamento.ano,
+                    "total_planejado": planejamento.planejado_total,
+                    "total_gasto": planejamento.gasto_total,
+                    "saldo": planejamento.saldo_total,
+                    "categorias": [
+                        {
+                            "id": categoria.pk,
+                            "nome": categoria.nome,
+                            "orcamento_planejado": categoria.orcamento_planejado,
+                            "gasto_real": categoria.gasto_real,
+                            "saldo": categoria.saldo_restante,
+                        }
+                        for categoria in planejamento.categorias.all()
+                    ],
+                }
+                for planejamento in planejamentos
+            ],
+        }
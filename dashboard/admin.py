@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DashboardSummary, DashboardChart, DashboardNotification
+from .models import DashboardSummary, DashboardChart, DashboardNotification, MonthlyCategoryTotal
 
 @admin.register(DashboardSummary)
 class DashboardSummaryAdmin(admin.ModelAdmin):
@@ -15,3 +15,9 @@ class DashboardChartAdmin(admin.ModelAdmin):
 class DashboardNotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'message', 'is_read', 'created_at')
     list_filter = ('is_read', 'created_at')
+
+@admin.register(MonthlyCategoryTotal)
+class MonthlyCategoryTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'category', 'transaction_type', 'total', 'count')
+    list_filter = ('transaction_type', 'month')
+    list_select_related = ('user', 'category')
@@ -0,0 +1,182 @@
+"""
+Motor de alertas: regras que geram ``DashboardNotification`` em lote.
+
+Cada regra é uma função registrada em ``REGRAS`` que recebe a data de
+referência e devolve as notificações (não salvas) de todos os usuários,
+calculadas com uma única consulta. Cada notificação tem uma ``key`` que
+identifica o alerta (por exemplo ``divida_vencida:<id>:<vencimento>``); o
+motor descarta as chaves já existentes e grava o restante com um
+``bulk_create``, de modo que executar as regras de novo não repete alertas.
+
+As notificações gravadas aqui não passam pelo canal em memória do
+``dashboard.notificacoes``; as conexões SSE as recebem pela consulta de
+reserva.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.shards import bancos_de_usuarios, em_shard
+from dashboard.models import DashboardNotification
+
+
+LIMIAR_ORCAMENTO = Decimal('0.90')
+DIAS_PRAZO_META = 7
+TAMANHO_LOTE = 500
+
+REGRAS = {}
+
+
+def regra(nome):
+    """
+    Registra a função como regra de alerta com o nome informado.
+    """
+    def registrar(funcao):
+        REGRAS[nome] = funcao
+        return funcao
+    return registrar
+
+
+def _moeda(valor):
+    return f"R$ {valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+@regra('orcamento_excedido')
+def orcamento_excedido(hoje):
+    """
+    Categorias de planejamento do ano corrente com gasto real acima de 90% do
+    orçamento planejado.
+    """
+    from annual_planning.models import CategoriaPlanejamento
+
+    categorias = (
+        CategoriaPlanejamento.objects
+        .filter(
+            planejamento__ano=hoje.year,
+            orcamento_planejado__gt=0,
+            gasto_real__gte=F('orcamento_planejado') * LIMIAR_ORCAMENTO,
+        )
+        .order_by()
+        .values_list('pk', 'planejamento__usuario_id', 'nome', 'gasto_real', 'orcamento_planejado')
+    )
+    for pk, usuario_id, nome, gasto, orcamento in categorias:
+        percentual = int(gasto / orcamento * 100)
+        yield DashboardNotification(
+            user_id=usuario_id,
+            key=f"orcamento_excedido:{pk}:{hoje.year}",
+            message=(
+                f"A categoria '{nome}' já consumiu {percentual}% do orçamento de {hoje.year} "
+                f"({_moeda(gasto)} de {_moeda(orcamento)})."
+            ),
+        )
+
+
+@regra('divida_vencida')
+def divida_vencida(hoje):
+    """
+    Dívidas não liquidadas com vencimento anterior a hoje.
+    """
+    from debts.models import Divida
+
+    dividas = (
+        Divida.objects.exclude(status='liquidada')
+        .filter(data_vencimento__lt=hoje)
+        .order_by()
+        .values_list('pk', 'usuario_id', 'credor', 'data_vencimento', 'valor_total', 'valor_pago')
+    )
+    for pk, usuario_id, credor, vencimento, total, pago in dividas:
+        yield DashboardNotification(
+            user_id=usuario_id,
+            key=f"divida_vencida:{pk}:{vencimento.isoformat()}",
+            message=(
+                f"A dívida com {credor} venceu em {vencimento:%d/%m/%Y} "
+                f"e ainda tem {_moeda(total - pago)} em aberto."
+            ),
+        )
+
+
+@regra('prazo_da_meta')
+def prazo_da_meta(hoje):
+    """
+    Metas em progresso que terminam nos próximos 7 dias.
+    """
+    from goals.models import Meta
+
+    metas = (
+        Meta.objects.filter(status='em_progresso', data_fim__range=(hoje, hoje + timedelta(days=DIAS_PRAZO_META)))
+        .order_by()
+        .values_list('pk', 'usuario_id', 'titulo', 'data_fim', 'valor_alvo', 'progresso')
+    )
+    for pk, usuario_id, titulo, fim, alvo, progresso in metas:
+        dias = (fim - hoje).days
+        prazo = 'termina hoje' if dias == 0 else f"termina em {dias} dia{'s' if dias > 1 else ''}"
+        yield DashboardNotification(
+            user_id=usuario_id,
+            key=f"prazo_da_meta:{pk}:{fim.isoformat()}",
+            message=f"A meta '{titulo}' {prazo} e faltam {_moeda(alvo - progresso)}.",
+        )
+
+
+@dataclass
+class ResultadoRegra:
+    regra: str
+    encontrados: int
+    tentadas: int
+    segundos: float
+
+    def como_dict(self):
+        return {
+            'regra': self.regra,
+            'encontrados': self.encontrados,
+            'tentadas': self.tentadas,
+            'segundos': round(self.segundos, 4),
+        }
+
+
+def _gravar(notificacoes):
+    """
+    Grava as notificações cujas chaves ainda não existem e retorna quantas
+    inserções foram tentadas. ``ignore_conflicts`` cobre uma execução
+    simultânea, cujas linhas o banco descarta sem avisar: o número é um
+    limite superior das criadas.
+    """
+    tentadas = 0
+    for inicio in range(0, len(notificacoes), TAMANHO_LOTE):
+        lote = notificacoes[inicio:inicio + TAMANHO_LOTE]
+        existentes = set(
+            DashboardNotification.objects.filter(key__in=[n.key for n in lote]).values_list('user_id', 'key')
+        )
+        novas = [n for n in lote if (n.user_id, n.key) not in existentes]
+        DashboardNotification.objects.bulk_create(novas, ignore_conflicts=True)
+        tentadas += len(novas)
+    return tentadas
+
+
+def avaliar_regras(nomes=None, hoje=None):
+    """
+    Avalia as regras informadas (padrão: todas) e retorna um
+    ``ResultadoRegra`` por regra, com o tempo gasto em cada uma.
+    """
+    hoje = hoje or timezone.localdate()
+    desconhecidas = set(nomes or ()) - set(REGRAS)
+    if desconhecidas:
+        raise ValueError(f"Regras desconhecidas: {', '.join(sorted(desconhecidas))}.")
+
+    resultados = []
+    for nome in nomes or REGRAS:
+        inicio = time.perf_counter()
+        encontrados = tentadas = 0
+        # Com shards, cada regra roda uma vez em cada banco com usuários.
+        for banco in bancos_de_usuarios():
+            with em_shard(banco):
+                notificacoes = list(REGRAS[nome](hoje))
+                with transaction.atomic(using=banco):
+                    tentadas += _gravar(notificacoes)
+            encontrados += len(notificacoes)
+        resultados.append(ResultadoRegra(nome, encontrados, tentadas, time.perf_counter() - inicio))
+    return resultados
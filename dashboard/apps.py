@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        import dashboard.rollups  # noqa: F401
+        import dashboard.notificacoes  # noqa: F401
+        import dashboard.series  # noqa: F401
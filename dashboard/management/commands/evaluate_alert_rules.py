@@ -0,0 +1,39 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.alertas import REGRAS, avaliar_regras
+
+
+class Command(BaseCommand):
+    help = (
+        "Avalia as regras de alerta para todos os usuários e grava as novas "
+        "notificações do dashboard. Feito para rodar periodicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regras', nargs='*', choices=sorted(REGRAS),
+                            help="Regras a avaliar (padrão: todas).")
+        parser.add_argument('--data', type=date.fromisoformat,
+                            help="Data de referência, AAAA-MM-DD (padrão: hoje).")
+        parser.add_argument('--json', action='store_true',
+                            help="Imprime o resultado em JSON.")
+
+    def handle(self, *args, **opcoes):
+        try:
+            resultados = avaliar_regras(opcoes['regras'], opcoes['data'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if opcoes['json']:
+            self.stdout.write(json.dumps([r.como_dict() for r in resultados], indent=2))
+            return
+        for resultado in resultados:
+            self.stdout.write(
+                f"{resultado.regra}: {resultado.encontrados} encontrados, "
+                f"{resultado.tentadas} inserções tentadas em {resultado.segundos * 1000:.1f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(r.tentadas for r in resultados)} notificações novas enviadas ao banco."
+        ))
@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from dashboard.series import reconstruir_series
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói do zero a série mensal por categoria usada pelos gráficos do "
+        "dashboard, em blocos de usuários."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, nargs='*',
+                            help="IDs dos usuários a reconstruir (padrão: todos).")
+        parser.add_argument('--bloco', type=int, default=500,
+                            help="Quantidade de usuários por bloco.")
+
+    def handle(self, *args, **opcoes):
+        # Todos os usuários, para limpar também a série de quem não tem mais transações.
+        user_ids = opcoes['usuarios'] or list(User.objects.order_by('pk').values_list('pk', flat=True))
+        bloco = opcoes['bloco']
+        total = 0
+        for inicio in range(0, len(user_ids), bloco):
+            criadas = reconstruir_series(user_ids[inicio:inicio + bloco])
+            total += criadas
+            self.stdout.write(f"Usuários {inicio + 1}-{min(inicio + bloco, len(user_ids))}: {criadas} linhas.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} linhas da série reconstruídas para {len(user_ids)} usuários."
+        ))
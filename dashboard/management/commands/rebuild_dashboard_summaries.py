@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.shards import bancos_de_usuarios
+from dashboard.rollups import reconstruir_resumos
+
+
+def _reconstruir_bloco(user_ids):
+    try:
+        return reconstruir_resumos(user_ids)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói do zero os resumos mensais do dashboard a partir das transações, "
+        "em blocos de usuários processados em paralelo (em sequência no SQLite)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, nargs='*',
+                            help="IDs dos usuários a reconstruir (padrão: todos).")
+        parser.add_argument('--bloco', type=int, default=500,
+                            help="Quantidade de usuários por bloco.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Blocos processados simultaneamente (ignorado no SQLite).")
+
+    def handle(self, *args, **opcoes):
+        # Todos os usuários, para limpar também os resumos de quem não tem mais transações.
+        user_ids = opcoes['usuarios'] or list(User.objects.order_by('pk').values_list('pk', flat=True))
+        bloco = opcoes['bloco']
+        blocos = [user_ids[i:i + bloco] for i in range(0, len(user_ids), bloco)]
+
+        # O SQLite serializa as escritas: blocos em paralelo só disputariam a
+        # trava do banco (e falhariam com "database is locked").
+        if any(connections[banco].vendor == 'sqlite' for banco in bancos_de_usuarios()):
+            resultados = map(reconstruir_resumos, blocos)
+            executor = None
+        else:
+            executor = ThreadPoolExecutor(max_workers=opcoes['workers'])
+            resultados = executor.map(_reconstruir_bloco, blocos)
+
+        total = 0
+        try:
+            for indice, criados in enumerate(resultados, start=1):
+                total += criados
+                self.stdout.write(f"Bloco {indice}/{len(blocos)}: {criados} resumos.")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} resumos reconstruídos para {len(user_ids)} usuários."
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='dashboardsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'period_start', 'period_end'), name='dashboard_summary_unico_por_periodo'),
+        ),
+    ]
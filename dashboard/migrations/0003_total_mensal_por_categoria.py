@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:56
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_resumo_unico_por_periodo'),
+        ('transactions', '0004_segmento_arquivado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mês')),
+                ('transaction_type', models.CharField(max_length=10, verbose_name='Tipo de Transação')),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Total')),
+                ('count', models.IntegerField(default=0, verbose_name='Quantidade')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_totals', to='transactions.category', verbose_name='Categoria')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_category_totals', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Total Mensal por Categoria',
+                'verbose_name_plural': 'Totais Mensais por Categoria',
+                'ordering': ['month'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('user', 'month', 'category', 'transaction_type'), name='total_mensal_unico_por_categoria'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'month', 'transaction_type'), name='total_mensal_unico_sem_categoria')],
+            },
+        ),
+    ]
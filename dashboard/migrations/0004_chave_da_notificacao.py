@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_total_mensal_por_categoria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardnotification',
+            name='key',
+            field=models.CharField(blank=True, help_text='Identifica o alerta que gerou a notificação, para não repeti-lo.', max_length=100, null=True, verbose_name='Chave'),
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardnotification',
+            constraint=models.UniqueConstraint(condition=models.Q(('key__isnull', False)), fields=('user', 'key'), name='notificacao_unica_por_chave'),
+        ),
+    ]
@@ -42,6 +42,12 @@ class DashboardSummary(models.Model):
         verbose_name = "Resumo do Dashboard"
         verbose_name_plural = "Resumos do Dashboard"
         ordering = ['-period_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period_start', 'period_end'],
+                name='dashboard_summary_unico_por_periodo',
+            ),
+        ]
 
     def __str__(self):
         return f"Resumo de {self.period_start} a {self.period_end} para {self.user.username}"
@@ -131,6 +137,13 @@ class DashboardNotification(models.Model):
     )
     message = models.TextField(verbose_name="Mensagem")
     is_read = models.BooleanField(default=False, verbose_name="Lida")
+    key = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        verbose_name="Chave",
+        help_text="Identifica o alerta que gerou a notificação, para não repeti-lo."
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
@@ -138,6 +151,66 @@ class DashboardNotification(models.Model):
         verbose_name = "Notificação do Dashboard"
         verbose_name_plural = "Notificações do Dashboard"
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                condition=models.Q(key__isnull=False),
+                name='notificacao_unica_por_chave',
+            ),
+        ]
 
     def __str__(self):
         return f"Notificação para {self.user.username}: {self.message[:30]}{'...' if len(self.message) > 30 else ''}"
+
+
+class MonthlyCategoryTotal(models.Model):
+    """
+    Série mensal materializada por categoria: soma e quantidade das transações
+    do usuário em cada (mês, categoria, tipo). Mantida por deltas a partir das
+    escritas de transações (ver ``dashboard.series``) e usada pelos gráficos.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Usuário",
+        related_name="monthly_category_totals"
+    )
+    month = models.DateField(verbose_name="Mês")
+    category = models.ForeignKey(
+        'transactions.Category',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="monthly_totals",
+        verbose_name="Categoria"
+    )
+    transaction_type = models.CharField(max_length=10, verbose_name="Tipo de Transação")
+    total = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Total"
+    )
+    count = models.IntegerField(default=0, verbose_name="Quantidade")
+
+    class Meta:
+        verbose_name = "Total Mensal por Categoria"
+        verbose_name_plural = "Totais Mensais por Categoria"
+        ordering = ['month']
+        constraints = [
+            # Dois índices parciais porque NULL não colide em UNIQUE: as
+            # transações sem categoria também têm uma única linha por mês e tipo.
+            models.UniqueConstraint(
+                fields=['user', 'month', 'category', 'transaction_type'],
+                condition=models.Q(category__isnull=False),
+                name='total_mensal_unico_por_categoria',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'month', 'transaction_type'],
+                condition=models.Q(category__isnull=True),
+                name='total_mensal_unico_sem_categoria',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y} {self.category or 'Sem categoria'}: {self.total} ({self.user.username})"
@@ -0,0 +1,163 @@
+"""
+Entrega de notificações do dashboard por Server-Sent Events.
+
+Cada conexão SSE é uma corrotina (servida pelo ASGI de ``setup/asgi.py``)
+esperando em uma ``asyncio.Queue``: uma conexão ociosa custa uma fila e um
+pouco de memória, sem thread nem consulta ao banco. Quando uma
+``DashboardNotification`` é criada, ``publicar`` a entrega, depois do commit,
+às filas das conexões do usuário neste processo.
+
+Notificações criadas em outro processo (outro worker, um comando de gestão)
+não passam pelo canal em memória; para elas, cada conexão consulta o banco
+quando fica ``NOTIFICACOES_INTERVALO_CONSULTA`` segundos sem receber nada,
+buscando só as notificações com id acima do último visto. A mesma consulta
+serve de batimento para manter a conexão aberta.
+
+O gerador é percorrido pelo handler ASGI depois que a view (e o
+``ShardMiddleware``) já retornaram, fora do contexto de shard da requisição:
+por isso a view resolve o banco do usuário e o passa em ``banco``.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from dashboard.models import DashboardNotification
+
+
+TAMANHO_FILA = 100
+LIMITE_PENDENTES = 50
+
+_trava = threading.Lock()
+_assinantes = defaultdict(set)  # user_id -> {(loop, fila)}
+
+
+def como_dict(notificacao):
+    return {
+        'id': notificacao.pk,
+        'message': notificacao.message,
+        'is_read': notificacao.is_read,
+        'created_at': notificacao.created_at.isoformat(),
+    }
+
+
+def evento(dados):
+    """
+    Formata um evento SSE ``notificacao`` com o id da notificação, que o
+    navegador devolve em ``Last-Event-ID`` ao reconectar.
+    """
+    return f"id: {dados['id']}\nevent: notificacao\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+def _entregar(fila, dados):
+    try:
+        fila.put_nowait(dados)
+    except asyncio.QueueFull:
+        # Cliente lento: a consulta de reserva recupera o que ficou de fora.
+        pass
+
+
+def publicar(user_id, dados):
+    """
+    Entrega ``dados`` a todas as conexões do usuário neste processo. Pode ser
+    chamada de qualquer thread.
+    """
+    with _trava:
+        assinantes = list(_assinantes.get(user_id, ()))
+    for loop, fila in assinantes:
+        loop.call_soon_threadsafe(_entregar, fila, dados)
+
+
+def conexoes_abertas():
+    with _trava:
+        return sum(len(filas) for filas in _assinantes.values())
+
+
+@receiver(post_save, sender=DashboardNotification)
+def notificacao_criada(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        dados = como_dict(instance)
+        transaction.on_commit(lambda: publicar(instance.user_id, dados))
+
+
+async def _novas(user_id, apos_id, limite=None, banco=None):
+    notificacoes = DashboardNotification.objects.using(banco).filter(user_id=user_id, pk__gt=apos_id).order_by('pk')
+    if limite:
+        notificacoes = notificacoes[:limite]
+    return [como_dict(n) async for n in notificacoes]
+
+
+async def fluxo_de_notificacoes(user_id, ultimo_id=None, banco=None):
+    """
+    Gera os eventos SSE do usuário: primeiro as notificações pendentes (as
+    posteriores a ``ultimo_id`` ou, sem ele, as não lidas mais recentes),
+    depois as novas, conforme chegam. As consultas vão para ``banco``.
+    """
+    notificacoes = DashboardNotification.objects.using(banco).filter(user_id=user_id)
+    loop = asyncio.get_running_loop()
+    fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+    assinatura = (loop, fila)
+    # Assina antes de ler as pendentes para não perder o que for criado entre
+    # a consulta e o início da espera.
+    with _trava:
+        _assinantes[user_id].add(assinatura)
+    try:
+        if ultimo_id is None:
+            pendentes = [
+                como_dict(n) async for n in
+                notificacoes.filter(is_read=False).order_by('-pk')[:LIMITE_PENDENTES]
+            ][::-1]
+            maior = await notificacoes.aaggregate(maior=Max('pk'))
+            ultimo_id = maior['maior'] or 0
+        else:
+            pendentes = await _novas(user_id, ultimo_id, LIMITE_PENDENTES, banco)
+
+        enviados = set()
+        yield 'retry: 5000\n\n'
+        for dados in pendentes:
+            enviados.add(dados['id'])
+            ultimo_id = max(ultimo_id, dados['id'])
+            yield evento(dados)
+
+        intervalo = settings.NOTIFICACOES_INTERVALO_CONSULTA
+        while True:
+            consultou = False
+            try:
+                novas = [await asyncio.wait_for(fila.get(), timeout=intervalo)]
+            except TimeoutError:
+                novas = await _novas(user_id, ultimo_id, banco=banco)
+                consultou = True
+                if not novas:
+                    yield ': ping\n\n'
+            for dados in novas:
+                if dados['id'] not in enviados:
+                    enviados.add(dados['id'])
+                    yield evento(dados)
+            if consultou and novas:
+                # Tudo até o maior id consultado já foi enviado: as entregas em
+                # memória anteriores a ele não precisam mais ser lembradas.
+                ultimo_id = novas[-1]['id']
+                enviados = {pk for pk in enviados if pk > ultimo_id}
+    finally:
+        with _trava:
+            _assinantes[user_id].discard(assinatura)
+            if not _assinantes[user_id]:
+                del _assinantes[user_id]
+
+
+def marcar_como_lidas(user_id, ids=None):
+    """
+    Marca como lidas, em um único ``UPDATE``, as notificações não lidas do
+    usuário (todas, ou só as de ``ids``). Retorna quantas foram marcadas.
+    """
+    notificacoes = DashboardNotification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        notificacoes = notificacoes.filter(pk__in=ids)
+    return notificacoes.update(is_read=True, updated_at=timezone.now())
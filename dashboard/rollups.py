@@ -0,0 +1,142 @@
+"""
+Manutenção incremental dos resumos mensais (``DashboardSummary``).
+
+Cada escrita em ``Transaction`` chega aqui como ``Movimento``s; os deltas são
+somados por usuário e mês e aplicados com ``UPDATE ... SET campo = campo + delta``
+(expressões ``F()``), que trava apenas a linha afetada. A leitura do painel
+passa a custar O(períodos) em vez de O(transações).
+"""
+import calendar
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Now, TruncMonth
+from django.dispatch import receiver
+
+from accounts.shards import atomico_do_usuario, em_shard, usuarios_por_banco
+from accounts.versoes import incrementar_versao
+from dashboard.models import DashboardSummary
+from transactions.arquivo import movimentos_arquivados
+from transactions.models import Transaction
+from transactions.signals import transacoes_movimentadas
+
+
+ZERO = Decimal('0.00')
+
+
+def periodo_do_mes(dia):
+    """
+    Retorna ``(primeiro_dia, ultimo_dia)`` do mês de ``dia``.
+    """
+    ultimo = calendar.monthrange(dia.year, dia.month)[1]
+    return date(dia.year, dia.month, 1), date(dia.year, dia.month, ultimo)
+
+
+def agrupar_deltas(movimentos):
+    """
+    Soma os movimentos por ``(usuário, início do período)`` em
+    ``[delta_receitas, delta_despesas, inclusoes]``.
+    """
+    deltas = defaultdict(lambda: [ZERO, ZERO, 0])
+    for movimento in movimentos:
+        chave = (movimento.user_id, periodo_do_mes(movimento.data))
+        indice = 0 if movimento.tipo == 'income' else 1
+        deltas[chave][indice] += movimento.valor
+        if movimento.quantidade > 0:
+            deltas[chave][2] += 1
+    return deltas
+
+
+def aplicar_delta(user_id, periodo, receitas, despesas, pode_criar=True):
+    """
+    Aplica o delta ao resumo do período, criando a linha se ainda não existir.
+
+    ``pode_criar`` é falso quando o delta vem só de remoções: nesse caso uma
+    linha ausente significa que não há o que decrementar (por exemplo, quando o
+    próprio usuário está sendo removido em cascata).
+    """
+    inicio, fim = periodo
+    resumos = DashboardSummary.objects.filter(user_id=user_id, period_start=inicio, period_end=fim)
+    alteracao = {
+        'total_income': F('total_income') + receitas,
+        'total_expense': F('total_expense') + despesas,
+        'balance': F('balance') + (receitas - despesas),
+        # O UPDATE não passa pelo auto_now; sem isso, mover_usuario não
+        # recopiaria o resumo alterado durante a cópia.
+        'updated_at': Now(),
+    }
+    with atomico_do_usuario(user_id) as banco:
+        if resumos.update(**alteracao) or not pode_criar:
+            return
+        try:
+            with transaction.atomic(using=banco):
+                DashboardSummary.objects.create(
+                    user_id=user_id,
+                    period_start=inicio,
+                    period_end=fim,
+                    total_income=receitas,
+                    total_expense=despesas,
+                )
+        except IntegrityError:
+            # Outra requisição criou a linha entre o UPDATE e o INSERT.
+            resumos.update(**alteracao)
+
+
+@receiver(transacoes_movimentadas)
+def atualizar_resumos(sender, movimentos, **kwargs):
+    for (user_id, periodo), (receitas, despesas, inclusoes) in agrupar_deltas(movimentos).items():
+        if receitas or despesas:
+            aplicar_delta(user_id, periodo, receitas, despesas, pode_criar=inclusoes > 0)
+
+
+def reconstruir_resumos(user_ids):
+    """
+    Recalcula do zero os resumos mensais dos usuários informados, com uma
+    única consulta agrupada sobre as transações deles em cada banco.
+    """
+    total = 0
+    for banco, ids in usuarios_por_banco(user_ids).items():
+        with em_shard(banco):
+            total += _reconstruir_resumos(banco, ids)
+    return total
+
+
+def _reconstruir_resumos(banco, user_ids):
+    linhas = (
+        Transaction.objects.filter(user_id__in=user_ids)
+        .order_by()
+        .annotate(mes=TruncMonth('date'))
+        .values('user_id', 'mes')
+        .annotate(
+            receitas=Sum('amount', filter=Q(transaction_type='income')),
+            despesas=Sum('amount', filter=Q(transaction_type='expense')),
+        )
+    )
+    totais = defaultdict(lambda: [ZERO, ZERO])
+    for linha in linhas:
+        total = totais[linha['user_id'], linha['mes']]
+        total[0] += Decimal(linha['receitas'] or ZERO)
+        total[1] += Decimal(linha['despesas'] or ZERO)
+    # Os anos arquivados continuam contando nos resumos.
+    for user_id, data, tipo, _, valor in movimentos_arquivados(user_ids):
+        totais[user_id, data.replace(day=1)][0 if tipo == 'income' else 1] += valor
+    resumos = []
+    for (user_id, mes), (receitas, despesas) in totais.items():
+        receitas, despesas = receitas.quantize(ZERO), despesas.quantize(ZERO)
+        inicio, fim = periodo_do_mes(mes)
+        resumos.append(DashboardSummary(
+            user_id=user_id,
+            period_start=inicio,
+            period_end=fim,
+            total_income=receitas,
+            total_expense=despesas,
+            balance=receitas - despesas,
+        ))
+    with transaction.atomic(using=banco):
+        DashboardSummary.objects.filter(user_id__in=user_ids).delete()
+        DashboardSummary.objects.bulk_create(resumos)
+        incrementar_versao(user_ids)
+    return len(resumos)
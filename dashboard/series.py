@@ -0,0 +1,225 @@
+"""
+Série mensal por categoria (``MonthlyCategoryTotal``) para os gráficos do painel.
+
+Assim como os resumos mensais (``dashboard.rollups``), a série é mantida por
+deltas: os ``Movimento``s de cada escrita são somados por (usuário, mês,
+categoria, tipo) e aplicados com ``UPDATE ... SET total = total + delta``.
+Os gráficos leem apenas a série, então custam O(meses × categorias) em vez
+de O(transações).
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from accounts.shards import atomico_do_usuario, em_shard, usuarios_por_banco
+from accounts.versoes import incrementar_versao
+from dashboard.models import MonthlyCategoryTotal
+from transactions.arquivo import movimentos_arquivados
+from transactions.models import Category, Transaction
+from transactions.signals import transacoes_movimentadas
+
+
+ZERO = Decimal('0.00')
+TIPOS_DE_GRAFICO = ('line', 'bar', 'pie')
+LIMITE_MESES = 240
+NOMES_DOS_TIPOS = dict(Transaction.TRANSACTION_TYPE)
+
+
+def agrupar_deltas(movimentos):
+    """
+    Soma os movimentos por ``(usuário, mês, categoria, tipo)`` em
+    ``[delta_total, delta_quantidade]``.
+    """
+    deltas = defaultdict(lambda: [ZERO, 0])
+    for movimento in movimentos:
+        chave = (movimento.user_id, movimento.data.replace(day=1), movimento.categoria_id, movimento.tipo)
+        deltas[chave][0] += movimento.valor
+        deltas[chave][1] += movimento.quantidade
+    return deltas
+
+
+def aplicar_delta(user_id, mes, categoria_id, tipo, total, quantidade):
+    """
+    Aplica o delta à linha da série, criando-a se ainda não existir. Um delta
+    sem inclusões líquidas nunca cria linha (não há o que decrementar).
+    """
+    linhas = MonthlyCategoryTotal.objects.filter(
+        user_id=user_id, month=mes, category_id=categoria_id, transaction_type=tipo,
+    )
+    alteracao = {'total': F('total') + total, 'count': F('count') + quantidade}
+    with atomico_do_usuario(user_id) as banco:
+        if linhas.update(**alteracao) or quantidade <= 0:
+            return
+        try:
+            with transaction.atomic(using=banco):
+                MonthlyCategoryTotal.objects.create(
+                    user_id=user_id, month=mes, category_id=categoria_id,
+                    transaction_type=tipo, total=total, count=quantidade,
+                )
+        except IntegrityError:
+            # Outra requisição criou a linha entre o UPDATE e o INSERT.
+            linhas.update(**alteracao)
+
+
+@receiver(transacoes_movimentadas)
+def atualizar_series(sender, movimentos, **kwargs):
+    for (user_id, mes, categoria_id, tipo), (total, quantidade) in agrupar_deltas(movimentos).items():
+        if total or quantidade:
+            aplicar_delta(user_id, mes, categoria_id, tipo, total, quantidade)
+
+
+@receiver(pre_delete, sender=Category)
+def categoria_removida(sender, instance, **kwargs):
+    """
+    As transações de uma categoria removida ficam sem categoria (``SET_NULL``,
+    sem sinais por linha); a série acompanha somando as linhas da categoria às
+    linhas sem categoria antes que a cascata as remova.
+    """
+    linhas = list(
+        MonthlyCategoryTotal.objects.filter(category=instance)
+        .values_list('user_id', 'month', 'transaction_type', 'total', 'count')
+    )
+    for user_id, mes, tipo, total, quantidade in linhas:
+        aplicar_delta(user_id, mes, None, tipo, total, quantidade)
+    if linhas:
+        incrementar_versao({linha[0] for linha in linhas})
+
+
+def reconstruir_series(user_ids):
+    """
+    Recalcula do zero a série dos usuários informados, com uma única consulta
+    agrupada sobre as transações (mais as arquivadas) em cada banco.
+    """
+    total = 0
+    for banco, ids in usuarios_por_banco(user_ids).items():
+        with em_shard(banco):
+            total += _reconstruir_series(banco, ids)
+    return total
+
+
+def _reconstruir_series(banco, user_ids):
+    totais = defaultdict(lambda: [ZERO, 0])
+    linhas = (
+        Transaction.objects.filter(user_id__in=user_ids)
+        .order_by()
+        .annotate(mes=TruncMonth('date'))
+        .values('user_id', 'mes', 'category_id', 'transaction_type')
+        .annotate(soma=Sum('amount'), quantidade=Count('pk'))
+    )
+    for linha in linhas:
+        total = totais[linha['user_id'], linha['mes'], linha['category_id'], linha['transaction_type']]
+        total[0] += Decimal(linha['soma'])
+        total[1] += linha['quantidade']
+
+    arquivados = list(movimentos_arquivados(user_ids))
+    # O arquivo guarda o id da categoria da época; se ela foi removida depois,
+    # a transação conta como sem categoria, assim como na tabela principal.
+    existentes = set(
+        Category.objects.filter(pk__in={categoria_id for _, _, _, categoria_id, _ in arquivados})
+        .values_list('pk', flat=True)
+    ) if arquivados else set()
+    for user_id, data, tipo, categoria_id, valor in arquivados:
+        categoria_id = categoria_id if categoria_id in existentes else None
+        total = totais[user_id, data.replace(day=1), categoria_id, tipo]
+        total[0] += valor
+        total[1] += 1
+
+    series = [
+        MonthlyCategoryTotal(
+            user_id=user_id, month=mes, category_id=categoria_id, transaction_type=tipo,
+            total=total.quantize(ZERO), count=quantidade,
+        )
+        for (user_id, mes, categoria_id, tipo), (total, quantidade) in totais.items()
+    ]
+    with transaction.atomic(using=banco):
+        MonthlyCategoryTotal.objects.filter(user_id__in=user_ids).delete()
+        MonthlyCategoryTotal.objects.bulk_create(series, batch_size=1000)
+        incrementar_versao(user_ids)
+    return len(series)
+
+
+def somar_meses(mes, quantidade):
+    """
+    Primeiro dia do mês ``quantidade`` meses depois (ou antes) de ``mes``.
+    """
+    indice = mes.year * 12 + mes.month - 1 + quantidade
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def meses_entre(inicio, fim):
+    """
+    Primeiros dias dos meses de ``inicio`` a ``fim``, inclusive.
+    """
+    primeiro = inicio.replace(day=1)
+    quantidade = (fim.year - primeiro.year) * 12 + fim.month - primeiro.month + 1
+    return [somar_meses(primeiro, i) for i in range(quantidade)]
+
+
+def dados_do_grafico(user_id, tipo_grafico, inicio, fim, tipo='expense'):
+    """
+    Monta o payload de um gráfico a partir da série, para os meses de
+    ``inicio`` a ``fim``:
+
+    - ``line``: uma série por categoria de ``tipo``, com um valor por mês;
+    - ``bar``: receitas e despesas por mês;
+    - ``pie``: total de cada categoria de ``tipo`` no intervalo.
+    """
+    if tipo_grafico not in TIPOS_DE_GRAFICO:
+        raise ValueError(f"Tipo de gráfico inválido. Opções: {', '.join(TIPOS_DE_GRAFICO)}.")
+    if tipo not in NOMES_DOS_TIPOS:
+        raise ValueError(f"Tipo de transação inválido. Opções: {', '.join(NOMES_DOS_TIPOS)}.")
+    if inicio > fim:
+        raise ValueError("O início não pode ser posterior ao fim.")
+
+    meses = meses_entre(inicio, fim)
+    if len(meses) > LIMITE_MESES:
+        raise ValueError(f"O intervalo não pode passar de {LIMITE_MESES} meses.")
+    posicao = {mes: indice for indice, mes in enumerate(meses)}
+    linhas = (
+        MonthlyCategoryTotal.objects.filter(user_id=user_id, month__range=(meses[0], meses[-1]))
+        .exclude(count=0)
+        .values_list('month', 'category_id', 'category__name', 'transaction_type', 'total', 'count')
+    )
+    if tipo_grafico != 'bar':
+        linhas = linhas.filter(transaction_type=tipo)
+
+    dados = {'tipo': tipo_grafico, 'rotulos': [mes.strftime('%Y-%m') for mes in meses]}
+    if tipo_grafico == 'bar':
+        series = {t: [ZERO] * len(meses) for t in NOMES_DOS_TIPOS}
+        for mes, _, _, tipo_linha, total, _ in linhas:
+            series[tipo_linha][posicao[mes]] += total
+        dados['series'] = [
+            {'tipo': t, 'nome': NOMES_DOS_TIPOS[t], 'valores': valores} for t, valores in series.items()
+        ]
+        return dados
+
+    categorias = {}
+    for mes, categoria_id, nome, _, total, quantidade in linhas:
+        categoria = categorias.setdefault(categoria_id, {
+            'categoria_id': categoria_id,
+            'nome': nome or 'Sem categoria',
+            'valores': [ZERO] * len(meses),
+            'total': ZERO,
+            'quantidade': 0,
+        })
+        categoria['valores'][posicao[mes]] += total
+        categoria['total'] += total
+        categoria['quantidade'] += quantidade
+
+    if tipo_grafico == 'line':
+        dados['series'] = [
+            {chave: categoria[chave] for chave in ('categoria_id', 'nome', 'valores')}
+            for categoria in sorted(categorias.values(), key=lambda c: c['nome'])
+        ]
+    else:
+        dados['fatias'] = [
+            {chave: categoria[chave] for chave in ('categoria_id', 'nome', 'total', 'quantidade')}
+            for categoria in sorted(categorias.values(), key=lambda c: -c['total'])
+        ]
+    return dados
@@ -1,3 +1,304 @@
-from django.test import TestCase
+import asyncio
+import io
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import AlocacaoShard
+from annual_planning.models import CategoriaPlanejamento, PlanejamentoAnual
+from dashboard.alertas import avaliar_regras
+from dashboard.models import DashboardChart, DashboardNotification, DashboardSummary, MonthlyCategoryTotal
+from dashboard.notificacoes import conexoes_abertas
+from dashboard.rollups import reconstruir_resumos
+from dashboard.series import reconstruir_series
+from debts.models import Divida
+from goals.models import Meta
+from transactions.models import Category, Transaction
+from transactions.signals import Movimento, emitir_movimentos
+
+
+class SerieMensalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('graficos')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+        cls.lazer = Category.objects.create(name='Lazer', type='expense')
+        cls.salario = Category.objects.create(name='Salário', type='income')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def criar(self, categoria, valor, dia):
+        return Transaction.objects.create(
+            user=self.usuario, category=categoria, transaction_type=categoria.type,
+            amount=Decimal(valor), date=dia,
+        )
+
+    def serie(self):
+        return sorted(
+            MonthlyCategoryTotal.objects.filter(user=self.usuario)
+            .values_list('month', 'category_id', 'transaction_type', 'total', 'count')
+        )
+
+    def test_deltas_acompanham_as_escritas_e_batem_com_a_reconstrucao(self):
+        compra = self.criar(self.mercado, '50.00', date(2024, 1, 10))
+        self.criar(self.mercado, '30.00', date(2024, 1, 20))
+        self.criar(self.lazer, '20.00', date(2024, 2, 5))
+        self.criar(self.salario, '1000.00', date(2024, 2, 1))
+        compra.amount, compra.category = Decimal('70.00'), self.lazer
+        compra.save()
+        Transaction.objects.filter(amount=Decimal('30.00')).get().delete()
+
+        incremental = [linha for linha in self.serie() if linha[4]]
+        reconstruir_series([self.usuario.pk])
+        self.assertEqual(self.serie(), incremental)
+        self.assertEqual(incremental, [
+            (date(2024, 1, 1), self.lazer.pk, 'expense', Decimal('70.00'), 1),
+            (date(2024, 2, 1), self.lazer.pk, 'expense', Decimal('20.00'), 1),
+            (date(2024, 2, 1), self.salario.pk, 'income', Decimal('1000.00'), 1),
+        ])
+
+    def test_graficos_leem_apenas_a_serie(self):
+        for mes in range(1, 4):
+            self.criar(self.mercado, '10.00', date(2024, mes, 1))
+            self.criar(self.mercado, '5.00', date(2024, mes, 15))
+        self.criar(self.lazer, '40.00', date(2024, 2, 3))
+        self.criar(self.salario, '900.00', date(2024, 3, 5))
+
+        with self.assertNumQueries(4):  # sessão, usuário, versão e série
+            linha = self.client.get('/api/dashboard/graficos/line/?inicio=2024-01&fim=2024-04').json()
+        self.assertEqual(linha['rotulos'], ['2024-01', '2024-02', '2024-03', '2024-04'])
+        self.assertEqual(linha['series'], [
+            {'categoria_id': self.lazer.pk, 'nome': 'Lazer', 'valores': ['0.00', '40.00', '0.00', '0.00']},
+            {'categoria_id': self.mercado.pk, 'nome': 'Mercado', 'valores': ['15.00', '15.00', '15.00', '0.00']},
+        ])
+
+        barras = self.client.get('/api/dashboard/graficos/bar/?inicio=2024-03&fim=2024-03').json()
+        self.assertEqual([s['valores'] for s in barras['series']], [['900.00'], ['15.00']])
+
+        grafico = DashboardChart.objects.create(
+            user=self.usuario, chart_type='pie', title='Despesas do 1º trimestre',
+            data={'inicio': '2024-01', 'fim': '2024-03'},
+        )
+        pizza = self.client.get(f'/api/dashboard/graficos/{grafico.pk}/').json()
+        self.assertEqual(
+            [(f['nome'], f['total'], f['quantidade']) for f in pizza['fatias']],
+            [('Mercado', '45.00', 6), ('Lazer', '40.00', 1)],
+        )
+
+        self.lazer.delete()
+        pizza = self.client.get(f'/api/dashboard/graficos/{grafico.pk}/').json()
+        self.assertEqual(
+            [(f['nome'], f['total']) for f in pizza['fatias']],
+            [('Mercado', '45.00'), ('Sem categoria', '40.00')],
+        )
+        self.assertEqual(self.client.get('/api/dashboard/graficos/area/').status_code, 400)
+
+
+class ResumosMensaisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('resumido')
+
+    def criar(self, tipo, valor, dia):
+        return Transaction.objects.create(user=self.usuario, transaction_type=tipo, amount=Decimal(valor), date=dia)
+
+    def resumos(self, usuario=None):
+        return list(
+            DashboardSummary.objects.filter(user=usuario or self.usuario).order_by('period_start')
+            .values_list('period_start', 'period_end', 'total_income', 'total_expense', 'balance')
+        )
+
+    def test_deltas_por_update_com_f(self):
+        self.criar('income', '1000.00', date(2024, 1, 5))
+        aluguel = self.criar('expense', '600.00', date(2024, 1, 10))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.criar('expense', '50.00', date(2024, 1, 20))
+        atualizacoes = [q['sql'] for q in consultas if q['sql'].startswith('UPDATE "dashboard_dashboardsummary"')]
+        self.assertEqual(len(atualizacoes), 1)
+        self.assertIn('"dashboard_dashboardsummary"."total_expense" + ', atualizacoes[0])
+
+        aluguel.amount, aluguel.date = Decimal('700.00'), date(2024, 2, 1)
+        aluguel.save()
+        self.assertEqual(self.resumos(), [
+            (date(2024, 1, 1), date(2024, 1, 31), Decimal('1000.00'), Decimal('50.00'), Decimal('950.00')),
+            (date(2024, 2, 1), date(2024, 2, 29), Decimal('0.00'), Decimal('700.00'), Decimal('-700.00')),
+        ])
+
+        aluguel.delete()
+        incremental = self.resumos()
+        self.assertEqual(incremental[1][2:], (Decimal('0.00'), Decimal('0.00'), Decimal('0.00')))
+        reconstruir_resumos([self.usuario.pk])
+        self.assertEqual(self.resumos(), incremental[:1])
+
+    def test_remocao_sem_resumo_nao_cria_linha(self):
+        emitir_movimentos([Movimento(self.usuario.pk, date(2024, 3, 3), 'expense', None, Decimal('-10.00'), -1)])
+        self.assertEqual(self.resumos(), [])
+
+    def test_comando_reconstroi_e_limpa_usuarios_sem_transacoes(self):
+        self.criar('income', '100.00', date(2024, 1, 5))
+        self.criar('expense', '40.00', date(2024, 1, 6))
+        esperado = self.resumos()
+        DashboardSummary.objects.filter(user=self.usuario).update(total_income=Decimal('1.00'))
+
+        sem_transacoes = User.objects.create_user('esvaziado')
+        DashboardSummary.objects.create(
+            user=sem_transacoes, period_start=date(2023, 5, 1), period_end=date(2023, 5, 31),
+            total_income=Decimal('10.00'), total_expense=Decimal('0.00'),
+        )
+
+        saida = io.StringIO()
+        call_command('rebuild_dashboard_summaries', bloco=1, stdout=saida)
+        self.assertEqual(self.resumos(), esperado)
+        self.assertEqual(self.resumos(sem_transacoes), [])
+        self.assertIn("1 resumos reconstruídos para 2 usuários.", saida.getvalue())
+
+
+class NotificacoesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('notificado')
+        cls.lida = DashboardNotification.objects.create(user=cls.usuario, message='Antiga', is_read=True)
+        cls.pendente = DashboardNotification.objects.create(user=cls.usuario, message='Fatura vence amanhã')
+
+    def criar(self, mensagem):
+        with self.captureOnCommitCallbacks(execute=True):
+            return DashboardNotification.objects.create(user=self.usuario, message=mensagem)
+
+    @override_settings(NOTIFICACOES_INTERVALO_CONSULTA=0.05)
+    async def test_fluxo_entrega_pendentes_novas_e_as_de_outro_processo(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get('/api/dashboard/notificacoes/fluxo/')
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        fluxo = aiter(resposta.streaming_content)
+
+        async def proximo_evento():
+            while True:
+                bloco = await asyncio.wait_for(anext(fluxo), timeout=5)
+                bloco = bloco.decode() if isinstance(bloco, bytes) else bloco
+                if bloco.startswith('id:'):
+                    return bloco
+
+        self.assertIn('Fatura vence amanhã', await proximo_evento())
+        self.assertEqual(conexoes_abertas(), 1)
+
+        nova = await sync_to_async(self.criar)('Meta alcançada')
+        self.assertTrue((await proximo_evento()).startswith(f'id: {nova.pk}\n'))
+
+        # Sem passar pelo canal em memória, como se viesse de outro processo.
+        with self.captureOnCommitCallbacks(execute=False):
+            externa = await DashboardNotification.objects.acreate(user=self.usuario, message='Orçamento estourado')
+        self.assertTrue((await proximo_evento()).startswith(f'id: {externa.pk}\n'))
+
+        # O handler ASGI cancela a resposta quando o cliente desconecta.
+        espera = asyncio.ensure_future(proximo_evento())
+        await asyncio.sleep(0.01)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(conexoes_abertas(), 0)
+
+    def test_marcar_como_lidas_em_um_update(self):
+        outra = DashboardNotification.objects.create(user=self.usuario, message='Outra')
+        self.client.force_login(self.usuario)
+        with self.assertNumQueries(3):  # sessão, usuário e o UPDATE
+            resposta = self.client.post('/api/dashboard/notificacoes/lidas/', {'ids': [self.pendente.pk, self.lida.pk]},
+                                        content_type='application/json')
+        self.assertEqual(resposta.json(), {'marcadas': 1})
+        resposta = self.client.post('/api/dashboard/notificacoes/lidas/', {'todas': True}, content_type='application/json')
+        self.assertEqual(resposta.json(), {'marcadas': 1})
+        outra.refresh_from_db()
+        self.assertTrue(outra.is_read)
+        resposta = self.client.post('/api/dashboard/notificacoes/lidas/', {'ids': 'x'}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+
+@override_settings(BANCOS_SHARD=['shard1', 'shard2'], NOTIFICACOES_INTERVALO_CONSULTA=0.05)
+class NotificacoesEmShardTests(TestCase):
+    databases = {'default', 'shard1', 'shard2'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('fragmentado')
+        cls.banco = AlocacaoShard.objects.get(usuario=cls.usuario).banco
+        cls.pendente = DashboardNotification.objects.using(cls.banco).create(user=cls.usuario, message='Fatura')
+
+    async def test_fluxo_le_do_shard_do_usuario(self):
+        await self.async_client.aforce_login(self.usuario)
+        resposta = await self.async_client.get('/api/dashboard/notificacoes/fluxo/')
+        fluxo = aiter(resposta.streaming_content)
+
+        async def proximo_evento():
+            # Limite para o evento, não para cada bloco: os pings não contam.
+            async with asyncio.timeout(5):
+                async for bloco in fluxo:
+                    bloco = bloco.decode() if isinstance(bloco, bytes) else bloco
+                    if bloco.startswith('id:'):
+                        return bloco
+
+        try:
+            self.assertTrue((await proximo_evento()).startswith(f'id: {self.pendente.pk}\n'))
+
+            # Criada em outro processo (sem o canal em memória): só a consulta de
+            # reserva, no shard, a encontra.
+            with self.captureOnCommitCallbacks(using=self.banco, execute=False):
+                externa = await DashboardNotification.objects.using(self.banco).acreate(user=self.usuario, message='Alerta')
+            self.assertTrue((await proximo_evento()).startswith(f'id: {externa.pk}\n'))
+        finally:
+            await resposta.streaming_content.aclose()
+
+
+class AlertasTests(TestCase):
+    HOJE = date(2024, 6, 10)
+
+    def criar_dados(self, usuario):
+        planejamento = PlanejamentoAnual.objects.create(usuario=usuario, ano=2024)
+        CategoriaPlanejamento.objects.bulk_create([
+            CategoriaPlanejamento(planejamento=planejamento, nome='Mercado',
+                                  orcamento_planejado=Decimal('1000.00'), gasto_real=Decimal('950.00')),
+            CategoriaPlanejamento(planejamento=planejamento, nome='Lazer',
+                                  orcamento_planejado=Decimal('1000.00'), gasto_real=Decimal('100.00')),
+        ])
+        Divida.objects.create(usuario=usuario, credor='Banco', valor_total=Decimal('500.00'),
+                              data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 6, 1))
+        Divida.objects.create(usuario=usuario, credor='Loja', valor_total=Decimal('500.00'),
+                              data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 1))
+        Meta.objects.bulk_create([
+            Meta(usuario=usuario, titulo='Viagem', valor_alvo=Decimal('300.00'), progresso=Decimal('100.00'),
+                 data_inicio=date(2024, 1, 1), data_fim=date(2024, 6, 13)),
+            Meta(usuario=usuario, titulo='Carro', valor_alvo=Decimal('300.00'),
+                 data_inicio=date(2024, 1, 1), data_fim=date(2025, 1, 1)),
+        ])
+
+    def test_uma_consulta_por_regra_e_sem_repeticao(self):
+        usuarios = [User.objects.create_user(f'alertado{i}') for i in range(3)]
+        for usuario in usuarios:
+            self.criar_dados(usuario)
+
+        # Por regra: a consulta da regra, as chaves existentes e o INSERT, entre SAVEPOINT e RELEASE.
+        with self.assertNumQueries(15):
+            resultados = avaliar_regras(hoje=self.HOJE)
+        self.assertEqual([(r.regra, r.encontrados, r.tentadas) for r in resultados], [
+            ('orcamento_excedido', 3, 3), ('divida_vencida', 3, 3), ('prazo_da_meta', 3, 3),
+        ])
+        self.assertEqual(
+            sorted(DashboardNotification.objects.filter(user=usuarios[0]).values_list('message', flat=True)),
+            [
+                "A categoria 'Mercado' já consumiu 95% do orçamento de 2024 (R$ 950,00 de R$ 1.000,00).",
+                "A dívida com Banco venceu em 01/06/2024 e ainda tem R$ 500,00 em aberto.",
+                "A meta 'Viagem' termina em 3 dias e faltam R$ 200,00.",
+            ],
+        )
+
+        resultados = avaliar_regras(hoje=self.HOJE)
+        self.assertEqual([r.tentadas for r in resultados], [0, 0, 0])
+        self.assertEqual(DashboardNotification.objects.count(), 9)
+        with self.assertRaises(ValueError):
+            avaliar_regras(['inexistente'])
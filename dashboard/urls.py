@@ -0,0 +1,9 @@
+from django.urls import path
+from dashboard.views import GraficoSalvoView, GraficoView, MarcarNotificacoesLidasView, fluxo_notificacoes
+
+urlpatterns = [
+    path('graficos/<int:pk>/', GraficoSalvoView.as_view(), name='grafico_salvo'),
+    path('graficos/<str:tipo_grafico>/', GraficoView.as_view(), name='grafico'),
+    path('notificacoes/fluxo/', fluxo_notificacoes, name='notificacoes_fluxo'),
+    path('notificacoes/lidas/', MarcarNotificacoesLidasView.as_view(), name='notificacoes_lidas'),
+]
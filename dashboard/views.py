@@ -1,3 +1,108 @@
-from django.shortcuts import render
+from datetime import datetime
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.permissions import IsAuthenticated # type: ignore
+from rest_framework.views import APIView # type: ignore
+from accounts.cache import em_cache
+from accounts.replicas import LeituraEmReplicaMixin
+from accounts.shards import banco_do_usuario
+from dashboard.models import DashboardChart
+from dashboard.notificacoes import fluxo_de_notificacoes, marcar_como_lidas
+from dashboard.series import dados_do_grafico, somar_meses
+
+
+class GraficoView(LeituraEmReplicaMixin, APIView):
+    """
+    View para montar os dados de um gráfico (linha, barras ou pizza) a partir
+    da série mensal por categoria.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, tipo_grafico):
+        """
+        Parâmetros opcionais:
+        - ``inicio`` e ``fim`` (AAAA-MM): meses do gráfico (padrão: os últimos 12).
+        - ``tipo``: ``expense`` (padrão) ou ``income``, para linha e pizza.
+        """
+        return self._responder(request, tipo_grafico, {})
+
+    def _responder(self, request, tipo_grafico, padroes):
+        parametros = {**padroes, **request.query_params.dict()}
+        try:
+            fim = self._mes(parametros.get('fim')) or timezone.localdate().replace(day=1)
+            inicio = self._mes(parametros.get('inicio')) or somar_meses(fim, -11)
+            dados, acertou = em_cache(
+                f'grafico_{tipo_grafico}', request.user.pk, {**parametros, 'inicio': inicio, 'fim': fim},
+                lambda: dados_do_grafico(request.user.pk, tipo_grafico, inicio, fim, parametros.get('tipo', 'expense')),
+            )
+        except ValueError as e:
+            return JsonResponse({"erro": str(e)}, status=400)
+        resposta = JsonResponse(dados)
+        resposta['X-Cache'] = 'HIT' if acertou else 'MISS'
+        return resposta
+
+    @staticmethod
+    def _mes(valor):
+        if not valor:
+            return None
+        try:
+            return datetime.strptime(valor, '%Y-%m').date()
+        except ValueError:
+            raise ValueError(f"Mês inválido: '{valor}'. Use o formato AAAA-MM.")
+
+
+class GraficoSalvoView(GraficoView):
+    """
+    View para montar os dados de um ``DashboardChart`` do usuário: o tipo vem
+    do gráfico salvo e ``data`` pode guardar ``inicio``, ``fim`` e ``tipo``,
+    que os parâmetros da requisição sobrepõem.
+    """
+    def get(self, request, pk):
+        grafico = get_object_or_404(DashboardChart, pk=pk, user=request.user)
+        padroes = {chave: grafico.data[chave] for chave in ('inicio', 'fim', 'tipo') if chave in grafico.data}
+        return self._responder(request, grafico.chart_type, padroes)
+
+
+async def fluxo_notificacoes(request):
+    """
+    Fluxo Server-Sent Events com as notificações do usuário autenticado
+    (``Last-Event-ID`` retoma a partir da última recebida). Deve ser servido
+    pelo ASGI: cada conexão aberta é só uma corrotina esperando.
+    """
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return JsonResponse({"erro": "Autenticação necessária."}, status=401)
+    ultimo_id = request.headers.get('Last-Event-ID')
+    if ultimo_id is not None and not ultimo_id.isdigit():
+        return JsonResponse({"erro": "Last-Event-ID inválido."}, status=400)
+
+    # O fluxo é percorrido fora do contexto de shard da requisição.
+    banco = await sync_to_async(banco_do_usuario)(usuario.pk)
+    resposta = StreamingHttpResponse(
+        fluxo_de_notificacoes(usuario.pk, int(ultimo_id) if ultimo_id else None, banco),
+        content_type='text/event-stream',
+    )
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
+class MarcarNotificacoesLidasView(APIView):
+    """
+    View para marcar notificações como lidas em um único UPDATE.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Corpo: ``{"ids": [1, 2, 3]}`` ou ``{"todas": true}``.
+        """
+        ids = request.data.get('ids')
+        if request.data.get('todas') is True:
+            ids = None
+        elif not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return JsonResponse({"erro": "Informe 'ids' (lista de inteiros) ou 'todas': true."}, status=400)
+        return JsonResponse({"marcadas": marcar_como_lidas(request.user.pk, ids)})
@@ -3,10 +3,17 @@ from debts.models import Divida, PagamentoDivida
 
 @admin.register(Divida)
 class DividaAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'credor', 'valor_total', 'valor_pago', 'status', 'data_vencimento')
+    list_display = ('usuario', 'credor', 'valor_total', 'valor_pago', 'juros', 'status', 'data_vencimento')
     list_filter = ('usuario', 'status', 'data_vencimento')
     search_fields = ('credor', 'descricao', 'usuario__username')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).com_juros()
+
+    @admin.display(description='Juros Acumulados', ordering='juros')
+    def juros(self, obj):
+        return obj.juros
+
 @admin.register(PagamentoDivida)
 class PagamentoDividaAdmin(admin.ModelAdmin):
     list_display = ('divida', 'valor', 'data', 'descricao')
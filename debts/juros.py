@@ -0,0 +1,124 @@
+"""
+Cálculo de juros simples de dívidas em lote.
+
+Há dois caminhos, ambos em uma única consulta:
+
+- ``anotar_juros``: anotações calculadas pelo próprio banco (dias de atraso,
+  juros, saldo e valor para quitação), úteis para filtrar e ordenar. Os juros
+  são exatos e arredondados ao centavo como em ``Divida.calcular_juros`` (ver
+  ``JurosSimples``).
+- ``juros_em_lote``: lê apenas as colunas necessárias com ``values_list`` e
+  calcula em ``Decimal``, com o mesmo arredondamento de
+  ``Divida.calcular_juros``.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple
+
+from django.db.models import DateField, DecimalField, ExpressionWrapper, F, Func, IntegerField, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+CENTAVO = Decimal('0.01')
+DIAS_NO_ANO = 365
+
+
+class DiasEntre(Func):
+    """
+    Diferença em dias entre duas datas (``fim - inicio``).
+    """
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+    output_field = IntegerField()
+
+    def __init__(self, fim, inicio, **extra):
+        super().__init__(fim, inicio, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra,
+        )
+
+    def as_mysql(self, compiler, connection, **extra):
+        return self.as_sql(compiler, connection, function='DATEDIFF', template='%(function)s(%(expressions)s)', arg_joiner=', ', **extra)
+
+
+class JurosSimples(Func):
+    """
+    ``valor * taxa / 100 * dias / 365`` arredondado ao centavo, com metade
+    para cima, como ``calcular_juros_simples``. Nos bancos com tipo decimal a
+    conta é feita nele; o SQLite guarda decimais como inteiros ou ponto
+    flutuante, então lá a conta é feita em inteiros de centavos.
+    """
+    output_field = DecimalField(max_digits=20, decimal_places=2)
+
+    def __init__(self, valor, taxa, dias, **extra):
+        super().__init__(valor, taxa, dias, **extra)
+
+    def _compilar(self, compiler):
+        partes = [compiler.compile(expressao) for expressao in self.get_source_expressions()]
+        return [sql for sql, _ in partes], [param for _, params in partes for param in params]
+
+    def as_sql(self, compiler, connection, **extra):
+        (valor, taxa, dias), params = self._compilar(compiler)
+        return f"ROUND(({valor}) * ({taxa}) * ({dias}) / {100 * DIAS_NO_ANO}.0, 2)", params
+
+    def as_sqlite(self, compiler, connection, **extra):
+        (valor, taxa, dias), params = self._compilar(compiler)
+        # Juros em centavos = V * T * dias / divisor, com V e T em centésimos;
+        # somar meio divisor antes da divisão inteira arredonda para cima.
+        divisor = 100 * 100 * DIAS_NO_ANO
+        produto = f"CAST(ROUND(({valor}) * 100) AS INTEGER) * CAST(ROUND(({taxa}) * 100) AS INTEGER) * ({dias})"
+        return f"((2 * {produto} + {divisor}) / {2 * divisor}) / 100.0", params
+
+
+class JurosDivida(NamedTuple):
+    dias_atraso: int
+    juros: Decimal
+    saldo_devedor: Decimal
+    valor_quitacao: Decimal
+
+
+def calcular_juros_simples(valor_total, taxa_juros, dias_atraso):
+    """
+    Juros simples anuais pró-rata por dia de atraso, arredondados ao centavo.
+    """
+    if dias_atraso <= 0 or taxa_juros <= 0:
+        return Decimal('0.00')
+    juros = valor_total * (taxa_juros / 100) * dias_atraso / DIAS_NO_ANO
+    return juros.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def anotar_juros(queryset, hoje=None):
+    """
+    Anota ``dias_atraso``, ``juros``, ``saldo_devedor`` e ``valor_quitacao``
+    em cada dívida do queryset, calculados no banco.
+    """
+    hoje = hoje or timezone.localdate()
+    dinheiro = DecimalField(max_digits=20, decimal_places=2)
+    dias = Greatest(DiasEntre(Value(hoje, output_field=DateField()), F('data_vencimento')), Value(0))
+    return queryset.annotate(
+        dias_atraso=dias,
+        juros=JurosSimples('valor_total', 'taxa_juros', 'dias_atraso'),
+        saldo_devedor=ExpressionWrapper(F('valor_total') - F('valor_pago'), output_field=dinheiro),
+        valor_quitacao=ExpressionWrapper(F('saldo_devedor') + F('juros'), output_field=dinheiro),
+    )
+
+
+def juros_em_lote(queryset, hoje=None):
+    """
+    Retorna ``{pk: JurosDivida}`` para todas as dívidas do queryset, com
+    aritmética ``Decimal`` exata, sem instanciar os modelos.
+    """
+    hoje = hoje or timezone.localdate()
+    resultado = {}
+    linhas = queryset.order_by().values_list('pk', 'valor_total', 'valor_pago', 'taxa_juros', 'data_vencimento')
+    for pk, valor_total, valor_pago, taxa_juros, vencimento in linhas.iterator(chunk_size=5000):
+        dias = max((hoje - vencimento).days, 0)
+        juros = calcular_juros_simples(valor_total, taxa_juros, dias)
+        saldo = valor_total - valor_pago
+        resultado[pk] = JurosDivida(dias, juros, saldo, saldo + juros)
+    return resultado
@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from debts.models import Divida
+from transactions.bench import banco_descartavel, semear_dividas
+
+
+class Command(BaseCommand):
+    help = "Compara o cálculo de juros objeto a objeto com os caminhos em lote."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dividas', type=int, default=100_000)
+        parser.add_argument('--usuarios', type=int, default=100)
+
+    def handle(self, *args, **opcoes):
+        hoje = timezone.localdate()
+        with banco_descartavel():
+            usuarios = User.objects.bulk_create(
+                User(username=f'benchmark{i}') for i in range(opcoes['usuarios'])
+            )
+            semear_dividas(usuarios, opcoes['dividas'])
+
+            inicio = time.perf_counter()
+            por_objeto = {divida.pk: divida.calcular_juros(hoje) for divida in Divida.objects.all()}
+            tempo_por_objeto = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            em_lote = Divida.objects.juros_em_lote(hoje)
+            tempo_em_lote = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            anotadas = list(Divida.objects.com_juros(hoje).values_list('pk', 'juros', 'valor_quitacao'))
+            tempo_anotacoes = time.perf_counter() - inicio
+
+        divergentes = sum(1 for pk, juros in por_objeto.items() if em_lote[pk].juros != juros)
+        if divergentes:
+            raise CommandError(f"{divergentes} dívidas com juros diferentes entre o loop e o lote.")
+
+        self.stdout.write(json.dumps({
+            'dividas': opcoes['dividas'],
+            'por_objeto_segundos': round(tempo_por_objeto, 3),
+            'em_lote_decimal_segundos': round(tempo_em_lote, 3),
+            'anotacoes_no_banco_segundos': round(tempo_anotacoes, 3),
+            'aceleracao_em_lote': round(tempo_por_objeto / tempo_em_lote, 1),
+            'aceleracao_anotacoes': round(tempo_por_objeto / tempo_anotacoes, 1),
+            'linhas_anotadas': len(anotadas),
+        }, indent=2))
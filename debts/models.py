@@ -1,8 +1,28 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from decimal import Decimal
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from debts.juros import anotar_juros, calcular_juros_simples, juros_em_lote
+from debts.pagamentos import abater_da_divida, ajustar_divida
+
+
+class DividaQuerySet(models.QuerySet):
+    def com_juros(self, hoje=None):
+        """
+        Anota dias de atraso, juros, saldo devedor e valor para quitação,
+        calculados pelo banco.
+        """
+        return anotar_juros(self, hoje)
+
+    def juros_em_lote(self, hoje=None):
+        """
+        Calcula os juros de todas as dívidas do queryset em uma só consulta,
+        com o mesmo resultado de ``Divida.calcular_juros``.
+        """
+        return juros_em_lote(self, hoje)
 
 
 class Divida(models.Model):
@@ -51,6 +71,8 @@ class Divida(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
+    objects = DividaQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Dívida"
         verbose_name_plural = "Dívidas"
@@ -59,14 +81,13 @@ class Divida(models.Model):
     def __str__(self):
         return f"Dívida com {self.credor} ({self.usuario.username})"
 
-    def calcular_juros(self):
+    def calcular_juros(self, hoje=None):
         """
         Calcula os juros acumulados com base na taxa de juros.
+        Para muitas dívidas de uma vez, use ``Divida.objects.juros_em_lote()``.
         """
-        dias_atraso = (models.DateField.today() - self.data_vencimento).days
-        if dias_atraso > 0 and self.taxa_juros > 0:
-            return self.valor_total * (self.taxa_juros / 100) * dias_atraso / 365
-        return Decimal('0.00')
+        dias_atraso = ((hoje or timezone.localdate()) - self.data_vencimento).days
+        return calcular_juros_simples(self.valor_total, self.taxa_juros, dias_atraso)
 
     def clean(self):
         """
@@ -134,19 +155,43 @@ class PagamentoDivida(models.Model):
         if self.valor <= 0:
             raise ValidationError(_("O valor pago deve ser maior que zero."))
 
+        # Ao alterar um pagamento, o valor anterior volta ao saldo.
+        anterior = self._anterior()
         saldo_restante = self.divida.valor_total - self.divida.valor_pago
+        if anterior and anterior[0] == self.divida_id:
+            saldo_restante += anterior[1]
         if self.valor > saldo_restante:
             raise ValidationError(
                 _("O valor pago excede o saldo restante da dívida.")
             )
 
+    def _anterior(self, using=None):
+        """
+        ``(divida_id, valor)`` gravados deste pagamento, ou ``None`` se ele
+        ainda não existe.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        return PagamentoDivida.objects.db_manager(using).filter(pk=self.pk).values_list('divida_id', 'valor').first()
+
     def save(self, *args, **kwargs):
         """
-        Atualiza automaticamente o valor pago da dívida associada.
+        Atualiza automaticamente o valor pago da dívida associada, com um
+        ``UPDATE`` condicional atômico (ver ``debts.pagamentos``). Ao alterar
+        um pagamento, aplica só a diferença para o valor anterior.
         """
         self.clean()
-        super().save(*args, **kwargs)
-        # Atualizar o valor pago na dívida
-        self.divida.valor_pago += self.valor
-        self.divida.save()
+        banco = kwargs.pop('using', None) or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=banco):
+            anterior = self._anterior(banco)
+            if anterior is None:
+                abater_da_divida(self.divida_id, self.valor, using=banco)
+            elif anterior[0] != self.divida_id:
+                ajustar_divida(anterior[0], -anterior[1], using=banco)
+                abater_da_divida(self.divida_id, self.valor, using=banco)
+            elif self.valor != anterior[1]:
+                ajustar_divida(self.divida_id, self.valor - anterior[1], using=banco)
+            super().save(*args, using=banco, **kwargs)
+        if PagamentoDivida.divida.is_cached(self):
+            self.divida.refresh_from_db(fields=['valor_pago', 'status', 'atualizado_em'])
 
@@ -0,0 +1,103 @@
+"""
+Aplicação atômica de pagamentos de dívidas.
+
+O saldo é verificado e atualizado em um único ``UPDATE`` condicional:
+
+    UPDATE divida SET valor_pago = valor_pago + :valor, status = CASE ...
+    WHERE id = :id AND valor_total >= valor_pago + :valor
+
+Se duas requisições pagarem a mesma dívida ao mesmo tempo, o banco serializa
+os dois ``UPDATE``s e nenhum pagamento se perde; se o saldo não comportar o
+valor, nenhuma linha é alterada e o pagamento é recusado.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import Case, F, Value, When
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+
+
+def abater_da_divida(divida_id, valor, using=None):
+    """
+    Soma ``valor`` a ``valor_pago`` da dívida e recalcula o ``status`` no
+    mesmo comando. Levanta ``ValidationError`` se o valor exceder o saldo e
+    ``Divida.DoesNotExist`` se a dívida não existir. ``using`` é o banco da
+    transação em andamento (com shards, o do usuário).
+    """
+    if valor <= 0:
+        raise ValidationError(_("O valor pago deve ser maior que zero."))
+    ajustar_divida(divida_id, valor, using)
+
+
+def ajustar_divida(divida_id, diferenca, using=None):
+    """
+    Aplica ``diferenca`` (positiva ou negativa, como na alteração de um
+    pagamento) a ``valor_pago`` com o ``UPDATE`` condicional.
+    """
+    from debts.models import Divida
+
+    novo_valor_pago = F('valor_pago') + diferenca
+    dividas = Divida.objects.db_manager(using).filter(pk=divida_id)
+    atualizadas = dividas.filter(valor_total__gte=novo_valor_pago, valor_pago__gte=-diferenca).update(
+        valor_pago=novo_valor_pago,
+        status=Case(
+            When(valor_total__lte=novo_valor_pago, then=Value('liquidada')),
+            When(valor_pago__lte=-diferenca, then=Value('pendente')),
+            default=Value('parcial'),
+        ),
+        atualizado_em=now(),
+    )
+    if atualizadas:
+        return
+    if not dividas.exists():
+        raise Divida.DoesNotExist(_("Dívida %(divida)s não encontrada.") % {'divida': divida_id})
+    raise ValidationError(_("O valor pago excede o saldo restante da dívida."))
+
+
+def registrar_pagamento(divida, valor, descricao=None):
+    """
+    Registra um pagamento e o abate da dívida na mesma transação.
+    """
+    from debts.models import PagamentoDivida
+
+    pagamento = PagamentoDivida(divida=divida, valor=valor, descricao=descricao)
+    pagamento.save()
+    return pagamento
+
+
+def registrar_pagamentos(pagamentos):
+    """
+    Registra vários pagamentos (pares ``(divida_id, valor)`` ou tuplas
+    ``(divida_id, valor, descricao)``) em uma única transação: um ``UPDATE``
+    por dívida com a soma dos valores e um ``bulk_create`` dos registros.
+    Se algum pagamento for recusado, nenhum é aplicado.
+    """
+    from accounts.versoes import incrementar_versao
+    from debts.models import Divida, PagamentoDivida
+
+    registros = []
+    totais = defaultdict(Decimal)
+    for divida_id, valor, *resto in pagamentos:
+        valor = Decimal(valor)
+        if valor <= 0:
+            raise ValidationError(_("O valor pago deve ser maior que zero."))
+        totais[divida_id] += valor
+        registros.append(PagamentoDivida(divida_id=divida_id, valor=valor, descricao=resto[0] if resto else None))
+
+    # Com shards, as dívidas estão no banco do usuário em contexto.
+    banco = router.db_for_write(Divida)
+    with transaction.atomic(using=banco):
+        for divida_id in sorted(totais):
+            try:
+                abater_da_divida(divida_id, totais[divida_id], using=banco)
+            except ValidationError as erro:
+                raise ValidationError(
+                    _("Dívida %(divida)s: %(erro)s"),
+                    params={'divida': divida_id, 'erro': erro.messages[0]},
+                )
+        criados = PagamentoDivida.objects.using(banco).bulk_create(registros)
+        incrementar_versao(Divida.objects.using(banco).filter(pk__in=totais).values('usuario_id'))
+        return criados
@@ -1,3 +1,240 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from debts.models import Divida, PagamentoDivida
+from debts.pagamentos import abater_da_divida, registrar_pagamento, registrar_pagamentos
+from goals.contribuicoes import somar_a_meta
+from goals.models import Meta, RegistroMeta
+
+
+def em_paralelo(threads, funcao):
+    """
+    Executa ``funcao(indice)`` em ``threads`` threads ao mesmo tempo, cada uma
+    com a própria conexão, e devolve os resultados de todas.
+    """
+    barreira = threading.Barrier(threads)
+    resultados = [None] * threads
+
+    def alvo(indice):
+        barreira.wait()
+        try:
+            resultados[indice] = funcao(indice)
+        finally:
+            connection.close()
+
+    trabalhos = [threading.Thread(target=alvo, args=(i,)) for i in range(threads)]
+    for trabalho in trabalhos:
+        trabalho.start()
+    for trabalho in trabalhos:
+        trabalho.join()
+    return resultados
+
+
+class PagamentoDividaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('devedor')
+
+    def criar_divida(self, valor_total):
+        return Divida.objects.create(
+            usuario=self.usuario, credor='Banco', valor_total=Decimal(valor_total),
+            data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 31),
+        )
+
+    def test_pagamento_atualiza_saldo_e_status(self):
+        divida = self.criar_divida('100.00')
+        registrar_pagamento(divida, Decimal('40.00'))
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('40.00'), 'parcial'))
+        registrar_pagamento(divida, Decimal('60.00'))
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('100.00'), 'liquidada'))
+
+    def test_pagamento_acima_do_saldo_e_recusado(self):
+        divida = self.criar_divida('100.00')
+        with self.assertRaises(ValidationError):
+            registrar_pagamento(divida, Decimal('100.01'))
+        self.assertFalse(PagamentoDivida.objects.exists())
+        divida.refresh_from_db()
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('0.00'), 'pendente'))
+
+    def test_lote_e_tudo_ou_nada(self):
+        primeira = self.criar_divida('100.00')
+        segunda = self.criar_divida('50.00')
+        with self.assertNumQueries(6):  # dois UPDATEs, um INSERT e a versão, entre SAVEPOINT e RELEASE
+            registrar_pagamentos([(primeira.pk, '30'), (segunda.pk, '20'), (primeira.pk, '70')])
+        primeira.refresh_from_db()
+        self.assertEqual((primeira.valor_pago, primeira.status), (Decimal('100.00'), 'liquidada'))
+
+        with self.assertRaises(ValidationError):
+            registrar_pagamentos([(segunda.pk, '10'), (primeira.pk, '0.01')])
+        segunda.refresh_from_db()
+        self.assertEqual(segunda.valor_pago, Decimal('20.00'))
+        self.assertEqual(PagamentoDivida.objects.count(), 3)
+
+    def test_alterar_pagamento_aplica_a_diferenca(self):
+        divida = self.criar_divida('100.00')
+        pagamento = registrar_pagamento(divida, Decimal('40.00'))
+
+        pagamento.valor = Decimal('100.00')
+        pagamento.save()
+        divida.refresh_from_db()
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('100.00'), 'liquidada'))
+
+        pagamento.valor = Decimal('100.01')
+        with self.assertRaises(ValidationError):
+            pagamento.save()
+        pagamento.valor = Decimal('0')
+        with self.assertRaises(ValidationError):
+            pagamento.save()
+
+        pagamento.valor = Decimal('10.00')
+        pagamento.save()
+        divida.refresh_from_db()
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('10.00'), 'parcial'))
+
+        outra = self.criar_divida('50.00')
+        pagamento.divida = outra
+        pagamento.save()
+        divida.refresh_from_db()
+        outra.refresh_from_db()
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('0.00'), 'pendente'))
+        self.assertEqual(outra.valor_pago, Decimal('10.00'))
+
+    def test_divida_ou_meta_inexistente(self):
+        with self.assertRaises(Divida.DoesNotExist):
+            abater_da_divida(999, Decimal('1.00'))
+        with self.assertRaises(Divida.DoesNotExist):
+            registrar_pagamentos([(999, '1.00')])
+        with self.assertRaises(Meta.DoesNotExist):
+            somar_a_meta(999, Decimal('1.00'))
+
+    def test_alterar_contribuicao_aplica_a_diferenca(self):
+        meta = Meta.objects.create(
+            usuario=self.usuario, titulo='Viagem', valor_alvo=Decimal('100.00'),
+            data_inicio=date(2024, 1, 1), data_fim=date(2099, 12, 31),
+        )
+        registro = RegistroMeta.objects.create(meta=meta, valor=Decimal('30.00'), descricao='Depósito')
+        registro.valor = Decimal('100.00')
+        registro.save()
+        meta.refresh_from_db()
+        self.assertEqual((meta.progresso, meta.status), (Decimal('100.00'), 'alcançada'))
+
+        registro.valor = Decimal('20.00')
+        registro.save()
+        meta.refresh_from_db()
+        self.assertEqual((meta.progresso, meta.status), (Decimal('20.00'), 'em_progresso'))
+        self.assertEqual(RegistroMeta.objects.count(), 1)
+
+
+class JurosTests(TestCase):
+    HOJE = date(2024, 6, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('atrasado')
+
+    def test_calcular_juros_sem_data_de_referencia(self):
+        divida = Divida(valor_total=Decimal('1000.00'), taxa_juros=Decimal('12.00'),
+                        data_vencimento=date.today() - timedelta(days=30))
+        self.assertEqual(divida.calcular_juros(), Decimal('9.86'))
+        divida.data_vencimento = date.today() + timedelta(days=1)
+        self.assertEqual(divida.calcular_juros(), Decimal('0.00'))
+
+    def test_lote_anotacao_e_objeto_concordam(self):
+        # 1,55 a 10% por 365 dias dá exatamente 0,155, que deve virar 0,16.
+        valores = ['1.55', '2.25', '182.50', '1000', '999.99', '12345.67', '0.01']
+        taxas = ['0', '1', '2.50', '5', '10', '99.99']
+        Divida.objects.bulk_create([
+            Divida(usuario=self.usuario, credor='Banco', valor_total=Decimal(valor), taxa_juros=Decimal(taxa),
+                   data_inicio=date(2023, 1, 1), data_vencimento=self.HOJE - timedelta(days=dias))
+            for valor in valores for taxa in taxas for dias in (-5, 1, 17, 146, 365, 1001)
+        ])
+
+        lote = Divida.objects.juros_em_lote(self.HOJE)
+        anotadas = {d.pk: d for d in Divida.objects.com_juros(self.HOJE)}
+        self.assertEqual(len(anotadas), len(valores) * len(taxas) * 6)
+        for divida in Divida.objects.all():
+            with self.subTest(valor=divida.valor_total, taxa=divida.taxa_juros, vencimento=divida.data_vencimento):
+                juros = divida.calcular_juros(self.HOJE)
+                anotada = anotadas[divida.pk]
+                self.assertEqual(lote[divida.pk].juros, juros)
+                self.assertEqual((anotada.juros, anotada.dias_atraso), (juros, lote[divida.pk].dias_atraso))
+                self.assertEqual(anotada.valor_quitacao, lote[divida.pk].valor_quitacao)
+
+
+class PagamentosConcorrentesTests(TransactionTestCase):
+    """
+    Várias threads pagando a mesma dívida (ou contribuindo para a mesma meta)
+    ao mesmo tempo: nenhum pagamento pode se perder e o saldo nunca pode ser
+    ultrapassado.
+    """
+    THREADS = 8
+    POR_THREAD = 25
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('concorrente')
+
+    def pagar_varias_vezes(self, divida_id):
+        def pagar(indice):
+            aceitos = 0
+            for _ in range(self.POR_THREAD):
+                try:
+                    PagamentoDivida.objects.create(divida_id=divida_id, valor=Decimal('1.00'))
+                    aceitos += 1
+                except ValidationError:
+                    pass
+            return aceitos
+        return em_paralelo(self.THREADS, pagar)
+
+    def test_totais_exatos_sob_concorrencia(self):
+        divida = Divida.objects.create(
+            usuario=self.usuario, credor='Banco', valor_total=Decimal('1000.00'),
+            data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 31),
+        )
+        aceitos = self.pagar_varias_vezes(divida.pk)
+
+        esperado = self.THREADS * self.POR_THREAD
+        self.assertEqual(sum(aceitos), esperado)
+        divida.refresh_from_db()
+        self.assertEqual(divida.valor_pago, Decimal(esperado))
+        self.assertEqual(divida.status, 'parcial')
+        self.assertEqual(divida.pagamentos.count(), esperado)
+
+    def test_saldo_nunca_e_ultrapassado(self):
+        divida = Divida.objects.create(
+            usuario=self.usuario, credor='Banco', valor_total=Decimal('100.00'),
+            data_inicio=date(2024, 1, 1), data_vencimento=date(2024, 12, 31),
+        )
+        aceitos = self.pagar_varias_vezes(divida.pk)
+
+        self.assertEqual(sum(aceitos), 100)
+        divida.refresh_from_db()
+        self.assertEqual((divida.valor_pago, divida.status), (Decimal('100.00'), 'liquidada'))
+        self.assertEqual(divida.pagamentos.count(), 100)
+
+    def test_contribuicoes_a_meta(self):
+        meta = Meta.objects.create(
+            usuario=self.usuario, titulo='Reserva', valor_alvo=Decimal('150.00'),
+            data_inicio=date(2024, 1, 1), data_fim=date(2099, 12, 31),
+        )
+
+        def contribuir(indice):
+            aceitos = 0
+            for _ in range(self.POR_THREAD):
+                try:
+                    RegistroMeta.objects.create(meta_id=meta.pk, valor=Decimal('1.00'), descricao='Depósito')
+                    aceitos += 1
+                except ValidationError:
+                    pass
+            return aceitos
+
+        aceitos = em_paralelo(self.THREADS, contribuir)
+        self.assertEqual(sum(aceitos), 150)
+        meta.refresh_from_db()
+        self.assertEqual((meta.progresso, meta.status), (Decimal('150.00'), 'alcançada'))
+        self.assertEqual(meta.registros.count(), 150)
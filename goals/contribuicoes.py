@@ -0,0 +1,98 @@
+"""
+Aplicação atômica de contribuições a metas.
+
+Assim como em ``debts.pagamentos``, o progresso é verificado e atualizado em um
+único ``UPDATE`` condicional (``WHERE valor_alvo >= progresso + :valor``), com
+o ``status`` recalculado no mesmo comando. Contribuições simultâneas à mesma
+meta não se perdem e nunca ultrapassam o valor-alvo.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+def somar_a_meta(meta_id, valor, using=None):
+    """
+    Soma ``valor`` ao ``progresso`` da meta e recalcula o ``status`` no mesmo
+    comando. Levanta ``ValidationError`` se o valor exceder o que falta e
+    ``Meta.DoesNotExist`` se a meta não existir. ``using`` é o banco da
+    transação em andamento (com shards, o do usuário).
+    """
+    if valor <= 0:
+        raise ValidationError(_("O valor contribuído deve ser maior que zero."))
+    ajustar_meta(meta_id, valor, using)
+
+
+def ajustar_meta(meta_id, diferenca, using=None):
+    """
+    Aplica ``diferenca`` (positiva ou negativa, como na alteração de uma
+    contribuição) ao ``progresso`` com o ``UPDATE`` condicional.
+    """
+    from goals.models import Meta
+
+    novo_progresso = F('progresso') + diferenca
+    metas = Meta.objects.db_manager(using).filter(pk=meta_id)
+    atualizadas = metas.filter(valor_alvo__gte=novo_progresso, progresso__gte=-diferenca).update(
+        progresso=novo_progresso,
+        status=Case(
+            When(valor_alvo__lte=novo_progresso, then=Value('alcançada')),
+            When(data_fim__lt=timezone.localdate(), then=Value('não_alcançada')),
+            default=Value('em_progresso'),
+        ),
+        atualizado_em=timezone.now(),
+    )
+    if atualizadas:
+        return
+    if not metas.exists():
+        raise Meta.DoesNotExist(_("Meta %(meta)s não encontrada.") % {'meta': meta_id})
+    raise ValidationError(_("O valor contribuído excede o valor restante para atingir a meta."))
+
+
+def registrar_contribuicao(meta, valor, descricao):
+    """
+    Registra uma contribuição e a soma ao progresso da meta na mesma transação.
+    """
+    from goals.models import RegistroMeta
+
+    registro = RegistroMeta(meta=meta, valor=valor, descricao=descricao)
+    registro.save()
+    return registro
+
+
+def registrar_contribuicoes(contribuicoes):
+    """
+    Registra várias contribuições ``(meta_id, valor, descricao)`` em uma única
+    transação: um ``UPDATE`` por meta com a soma dos valores e um
+    ``bulk_create`` dos registros. Se alguma for recusada, nenhuma é aplicada.
+    """
+    from accounts.versoes import incrementar_versao
+    from goals.models import Meta, RegistroMeta
+
+    registros = []
+    totais = defaultdict(Decimal)
+    for meta_id, valor, descricao in contribuicoes:
+        valor = Decimal(valor)
+        if valor <= 0:
+            raise ValidationError(_("O valor contribuído deve ser maior que zero."))
+        totais[meta_id] += valor
+        registros.append(RegistroMeta(meta_id=meta_id, valor=valor, descricao=descricao))
+
+    # Com shards, as metas estão no banco do usuário em contexto.
+    banco = router.db_for_write(Meta)
+    with transaction.atomic(using=banco):
+        for meta_id in sorted(totais):
+            try:
+                somar_a_meta(meta_id, totais[meta_id], using=banco)
+            except ValidationError as erro:
+                raise ValidationError(
+                    _("Meta %(meta)s: %(erro)s"),
+                    params={'meta': meta_id, 'erro': erro.messages[0]},
+                )
+        criados = RegistroMeta.objects.using(banco).bulk_create(registros)
+        incrementar_versao(Meta.objects.using(banco).filter(pk__in=totais).values('usuario_id'))
+        return criados
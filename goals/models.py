@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from decimal import Decimal
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from goals.contribuicoes import ajustar_meta, somar_a_meta
 
 
 class Meta(models.Model):
@@ -75,7 +78,7 @@ class Meta(models.Model):
         """
         if self.progresso >= self.valor_alvo:
             self.status = 'alcançada'
-        elif self.data_fim < models.DateField.today() and self.progresso < self.valor_alvo:
+        elif self.data_fim < timezone.localdate() and self.progresso < self.valor_alvo:
             self.status = 'não_alcançada'
         else:
             self.status = 'em_progresso'
@@ -119,18 +122,42 @@ class RegistroMeta(models.Model):
         if self.valor <= 0:
             raise ValidationError(_("O valor contribuído deve ser maior que zero."))
 
+        # Ao alterar uma contribuição, o valor anterior volta ao que falta.
+        anterior = self._anterior()
         valor_restante = self.meta.valor_alvo - self.meta.progresso
+        if anterior and anterior[0] == self.meta_id:
+            valor_restante += anterior[1]
         if self.valor > valor_restante:
             raise ValidationError(
                 _("O valor contribuído excede o valor restante para atingir a meta.")
             )
 
+    def _anterior(self, using=None):
+        """
+        ``(meta_id, valor)`` gravados deste registro, ou ``None`` se ele ainda
+        não existe.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        return RegistroMeta.objects.db_manager(using).filter(pk=self.pk).values_list('meta_id', 'valor').first()
+
     def save(self, *args, **kwargs):
         """
-        Atualiza automaticamente o progresso da meta associada.
+        Atualiza automaticamente o progresso da meta associada, com um
+        ``UPDATE`` condicional atômico (ver ``goals.contribuicoes``). Ao
+        alterar um registro, aplica só a diferença para o valor anterior.
         """
         self.clean()
-        super().save(*args, **kwargs)
-        # Atualizar o progresso da meta
-        self.meta.progresso += self.valor
-        self.meta.save()
+        banco = kwargs.pop('using', None) or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=banco):
+            anterior = self._anterior(banco)
+            if anterior is None:
+                somar_a_meta(self.meta_id, self.valor, using=banco)
+            elif anterior[0] != self.meta_id:
+                ajustar_meta(anterior[0], -anterior[1], using=banco)
+                somar_a_meta(self.meta_id, self.valor, using=banco)
+            elif self.valor != anterior[1]:
+                ajustar_meta(self.meta_id, self.valor - anterior[1], using=banco)
+            super().save(*args, using=banco, **kwargs)
+        if RegistroMeta.meta.is_cached(self):
+            self.meta.refresh_from_db(fields=['progresso', 'status', 'atualizado_em'])
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
+    # Os testes usam bancos extras (réplica e shards); ver setup/settings_testes.py.
+    configuracoes = 'setup.settings_testes' if sys.argv[1:2] == ['test'] else 'setup.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', configuracoes)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -3,10 +3,10 @@ from reports.models import Relatorio, LogRelatorio
 
 @admin.register(Relatorio)
 class RelatorioAdmin(admin.ModelAdmin):
-    list_display = ('id_relatorio', 'usuario', 'tipo', 'status', 'data_solicitacao', 'data_conclusao')
+    list_display = ('id_relatorio', 'usuario', 'tipo', 'status', 'trabalhador', 'tentativas', 'data_solicitacao', 'data_conclusao')
     list_filter = ('tipo', 'status', 'data_solicitacao')
     search_fields = ('usuario__username', 'tipo')
-    readonly_fields = ('id_relatorio', 'data_solicitacao', 'data_conclusao')
+    readonly_fields = ('id_relatorio', 'data_solicitacao', 'data_conclusao', 'trabalhador', 'data_inicio', 'ultimo_sinal', 'tentativas')
 
 
 @admin.register(LogRelatorio)
@@ -0,0 +1,101 @@
+"""
+Fila de relatórios persistida no banco.
+
+Um relatório ``pendente`` é reivindicado atomicamente por um trabalhador e
+passa a ``em_processamento``. Em bancos com ``SELECT ... FOR UPDATE SKIP
+LOCKED`` (PostgreSQL, MySQL 8) cada trabalhador pula as linhas já travadas
+por outro; no SQLite, onde as escritas são serializadas, a reivindicação é um
+``UPDATE ... WHERE status = 'pendente'`` condicional: só um trabalhador
+consegue alterar a linha.
+
+Enquanto processa, o trabalhador atualiza ``ultimo_sinal``. Relatórios presos
+em ``em_processamento`` sem sinal recente (trabalhador morto) voltam para a
+fila, até ``MAXIMO_TENTATIVAS``. A conclusão e a falha também são ``UPDATE``s
+condicionais ao trabalhador (ver ``Relatorio._finalizar``): o resultado de um
+trabalhador dado como morto não sobrescreve o de quem reivindicou depois.
+"""
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from reports.models import LogRelatorio, Relatorio
+
+
+MAXIMO_TENTATIVAS = 3
+TOLERANCIA_SEM_SINAL = timedelta(minutes=5)
+
+
+def reivindicar_proximo(trabalhador):
+    """
+    Reivindica o relatório pendente mais antigo para ``trabalhador`` e o
+    retorna, ou ``None`` se a fila estiver vazia.
+    """
+    pendentes = Relatorio.objects.filter(status='pendente').order_by('data_solicitacao')
+
+    # Com shards, a fila de cada banco é consumida dentro de ``em_shard``.
+    banco = router.db_for_write(Relatorio)
+    if connections[banco].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=banco):
+            pk = pendentes.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            _marcar_em_processamento(Relatorio.objects.filter(pk=pk), trabalhador)
+        return Relatorio.objects.get(pk=pk)
+
+    while True:
+        pk = pendentes.values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        if _marcar_em_processamento(Relatorio.objects.filter(pk=pk, status='pendente'), trabalhador):
+            return Relatorio.objects.get(pk=pk)
+        # Outro trabalhador levou este relatório; tenta o próximo.
+
+
+def _marcar_em_processamento(queryset, trabalhador):
+    agora = now()
+    return queryset.update(
+        status='em_processamento',
+        trabalhador=trabalhador,
+        data_inicio=agora,
+        ultimo_sinal=agora,
+        tentativas=F('tentativas') + 1,
+    )
+
+
+def registrar_sinal(relatorio, trabalhador, mensagem=None):
+    """
+    Atualiza o sinal de vida do trabalhador e, opcionalmente, registra uma
+    mensagem de progresso em ``LogRelatorio``.
+    """
+    Relatorio.objects.filter(pk=relatorio.pk, trabalhador=trabalhador).update(ultimo_sinal=now())
+    if mensagem:
+        LogRelatorio.objects.create(relatorio=relatorio, mensagem=mensagem)
+
+
+def recuperar_travados(tolerancia=TOLERANCIA_SEM_SINAL):
+    """
+    Devolve à fila os relatórios cujo trabalhador parou de dar sinal. Os que
+    já esgotaram as tentativas são marcados como falha. Retorna a quantidade
+    de relatórios recuperados.
+    """
+    travados = Relatorio.objects.filter(status='em_processamento', ultimo_sinal__lt=now() - tolerancia)
+    logs = []
+    recuperados = 0
+    for relatorio in travados.only('pk', 'trabalhador', 'tentativas'):
+        atual = Relatorio.objects.filter(pk=relatorio.pk, status='em_processamento', trabalhador=relatorio.trabalhador)
+        if relatorio.tentativas >= MAXIMO_TENTATIVAS:
+            if atual.update(status='falha', trabalhador=None):
+                logs.append(LogRelatorio(
+                    relatorio_id=relatorio.pk,
+                    mensagem=f"Falha após {relatorio.tentativas} tentativas sem conclusão.",
+                ))
+        elif atual.update(status='pendente', trabalhador=None):
+            recuperados += 1
+            logs.append(LogRelatorio(
+                relatorio_id=relatorio.pk,
+                mensagem=f"Trabalhador {relatorio.trabalhador} parou de responder; relatório devolvido à fila.",
+            ))
+    LogRelatorio.objects.bulk_create(logs)
+    return recuperados
@@ -0,0 +1,93 @@
+"""
+Geradores de arquivo para cada tipo de relatório.
+
+Cada gerador recebe o relatório, um arquivo de texto aberto para escrita e uma
+função ``progresso(linhas)`` a ser chamada periodicamente, e retorna
+``(linhas_escritas, extensao)``. As linhas vêm do banco com
+``iterator(chunk_size=...)``, então a memória não cresce com o tamanho do
+relatório.
+"""
+import csv
+
+from django.contrib.auth.models import User
+
+from transactions.arquivo import arquivadas_do_filtro
+from transactions.exportacao import exportar
+from transactions.filtros import TransacaoFiltro
+from transactions.models import Transaction
+
+
+TAMANHO_BLOCO = 2000
+
+
+class TipoSemGerador(Exception):
+    """
+    O tipo de relatório solicitado não possui gerador implementado.
+    """
+
+
+def _escrever(arquivo, cabecalho, linhas, progresso):
+    escritor = csv.writer(arquivo)
+    escritor.writerow(cabecalho)
+    total = 0
+    for linha in linhas:
+        escritor.writerow(linha)
+        total += 1
+        if total % TAMANHO_BLOCO == 0:
+            progresso(total)
+    return total
+
+
+def gerar_transacoes(relatorio, arquivo, progresso):
+    """
+    Transações do usuário solicitante. ``parametros`` aceita os mesmos filtros
+    de ``FiltrarTransacoesView`` (``date__gte``, ``amount__lte``, ...), além de
+    ``inicio``/``fim`` (AAAA-MM-DD) e ``formato`` (``csv`` ou ``ndjson``).
+    """
+    parametros = dict(relatorio.parametros or {})
+    formato = parametros.pop('formato', 'csv')
+    if 'inicio' in parametros:
+        parametros.setdefault('date__gte', parametros.pop('inicio'))
+    if 'fim' in parametros:
+        parametros.setdefault('date__lte', parametros.pop('fim'))
+
+    filtro = TransacaoFiltro(parametros, queryset=Transaction.objects.filter(user_id=relatorio.usuario_id))
+    if not filtro.is_valid():
+        raise ValueError(f"Parâmetros inválidos: {dict(filtro.errors)}")
+    # Inclui os anos arquivados, como a listagem e a exportação.
+    arquivadas = arquivadas_do_filtro(relatorio.usuario_id, filtro.form.cleaned_data)
+    total = 0
+
+    def contar(linhas):
+        nonlocal total
+        total = linhas
+        progresso(linhas)
+
+    blocos, _ = exportar(filtro.qs, formato, arquivadas, progresso=contar)
+    for bloco in blocos:
+        arquivo.write(bloco)
+    return total, formato
+
+
+def gerar_usuarios(relatorio, arquivo, progresso):
+    """
+    Usuários cadastrados no sistema.
+    """
+    linhas = User.objects.order_by('pk').values_list(
+        'pk', 'username', 'email', 'is_active', 'date_joined',
+    ).iterator(chunk_size=TAMANHO_BLOCO)
+    cabecalho = ['id', 'usuario', 'email', 'ativo', 'cadastrado_em']
+    return _escrever(arquivo, cabecalho, linhas, progresso), 'csv'
+
+
+GERADORES = {
+    'transacoes': gerar_transacoes,
+    'usuarios': gerar_usuarios,
+}
+
+
+def gerador_para(tipo):
+    try:
+        return GERADORES[tipo]
+    except KeyError:
+        raise TipoSemGerador(f"O tipo de relatório '{tipo}' ainda não possui gerador.")
@@ -0,0 +1,43 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from reports.trabalhador import iniciar_processo
+
+
+class Command(BaseCommand):
+    help = "Inicia processos trabalhadores que geram os relatórios pendentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help="Quantidade de processos trabalhadores.")
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help="Segundos de espera quando a fila está vazia.")
+        parser.add_argument('--ate-esvaziar', action='store_true',
+                            help="Encerra os trabalhadores quando não houver mais relatórios pendentes.")
+
+    def handle(self, *args, **opcoes):
+        connections.close_all()
+        contexto = multiprocessing.get_context('spawn')
+        processos = [
+            contexto.Process(
+                target=iniciar_processo,
+                args=(indice, opcoes['intervalo'], opcoes['ate_esvaziar']),
+                name=f"relatorios-{indice}",
+            )
+            for indice in range(opcoes['workers'])
+        ]
+        for processo in processos:
+            processo.start()
+        self.stdout.write(f"{len(processos)} trabalhadores iniciados.")
+
+        try:
+            for processo in processos:
+                processo.join()
+        except KeyboardInterrupt:
+            for processo in processos:
+                processo.terminate()
+            for processo in processos:
+                processo.join()
+        self.stdout.write(self.style.SUCCESS("Trabalhadores encerrados."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatorio',
+            name='data_inicio',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Início do Processamento'),
+        ),
+        migrations.AddField(
+            model_name='relatorio',
+            name='tentativas',
+            field=models.PositiveIntegerField(default=0, verbose_name='Tentativas'),
+        ),
+        migrations.AddField(
+            model_name='relatorio',
+            name='trabalhador',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Trabalhador Responsável'),
+        ),
+        migrations.AddField(
+            model_name='relatorio',
+            name='ultimo_sinal',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último Sinal do Trabalhador'),
+        ),
+        migrations.AddIndex(
+            model_name='relatorio',
+            index=models.Index(fields=['status', 'data_solicitacao'], name='relatorio_fila_idx'),
+        ),
+    ]
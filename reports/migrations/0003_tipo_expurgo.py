@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_fila_de_processamento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatorio',
+            name='tipo',
+            field=models.CharField(choices=[('transacoes', 'Transações'), ('usuarios', 'Usuários'), ('contas', 'Contas'), ('customizado', 'Customizado'), ('expurgo', 'Expurgo de Transações')], max_length=20, verbose_name='Tipo de Relatório'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_tipo_expurgo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='relatorio',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pendente', 'em_processamento']), ('tipo', 'expurgo')), fields=('usuario',), name='expurgo_unico_em_andamento'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
+from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 import uuid
 
@@ -14,6 +15,7 @@ class Relatorio(models.Model):
         ('usuarios', 'Usuários'),
         ('contas', 'Contas'),
         ('customizado', 'Customizado'),
+        ('expurgo', 'Expurgo de Transações'),
     ]
 
     STATUS_RELATORIO_CHOICES = [
@@ -66,11 +68,39 @@ class Relatorio(models.Model):
         null=True,
         verbose_name="Data de Conclusão"
     )
+    trabalhador = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name="Trabalhador Responsável"
+    )
+    data_inicio = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Início do Processamento"
+    )
+    ultimo_sinal = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Último Sinal do Trabalhador"
+    )
+    tentativas = models.PositiveIntegerField(default=0, verbose_name="Tentativas")
 
     class Meta:
         verbose_name = "Relatório"
         verbose_name_plural = "Relatórios"
         ordering = ['-data_solicitacao']
+        indexes = [
+            models.Index(fields=['status', 'data_solicitacao'], name='relatorio_fila_idx'),
+        ]
+        constraints = [
+            # Um expurgo agendado ou em andamento por usuário.
+            models.UniqueConstraint(
+                fields=['usuario'],
+                condition=models.Q(tipo='expurgo', status__in=['pendente', 'em_processamento']),
+                name='expurgo_unico_em_andamento',
+            ),
+        ]
 
     def __str__(self):
         return f"Relatório {self.tipo} - {self.usuario.username} ({self.get_status_display()})"
@@ -78,19 +108,38 @@ class Relatorio(models.Model):
     def marcar_concluido(self, caminho_arquivo):
         """
         Marca o relatório como concluído e define o caminho do arquivo.
+        Retorna ``False`` se o relatório não estiver mais com este trabalhador
+        (ver ``_finalizar``).
         """
-        self.status = 'concluido'
         self.caminho_arquivo = caminho_arquivo
-        self.data_conclusao = now()
-        self.save()
+        return self._finalizar(
+            status='concluido',
+            caminho_arquivo=self.caminho_arquivo.name,
+            data_conclusao=now(),
+            parametros=self.parametros,
+        )
 
     def marcar_falha(self, mensagem_erro):
         """
-        Marca o relatório como falho e registra o erro nos parâmetros.
+        Marca o relatório como falho e registra o erro nos parâmetros,
+        preservando os demais. Retorna ``False`` como ``marcar_concluido``.
+        """
+        return self._finalizar(status='falha', parametros={**(self.parametros or {}), 'erro': mensagem_erro})
+
+    def _finalizar(self, **campos):
+        """
+        Grava ``campos`` com um ``UPDATE`` condicional: só se o relatório ainda
+        estiver em processamento pelo mesmo trabalhador. Um relatório dado como
+        travado volta para a fila e pode ser reivindicado por outro; o
+        resultado do trabalhador antigo é então descartado.
         """
-        self.status = 'falha'
-        self.parametros = {'erro': mensagem_erro}
-        self.save()
+        atualizados = Relatorio.objects.filter(
+            pk=self.pk, status='em_processamento', trabalhador=self.trabalhador,
+        ).update(**campos)
+        if atualizados:
+            for campo, valor in campos.items():
+                setattr(self, campo, valor)
+        return bool(atualizados)
 
     def clean(self):
         """
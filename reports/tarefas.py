@@ -0,0 +1,50 @@
+"""
+Tarefas de manutenção executadas pela fila de relatórios.
+
+Diferente de um gerador, uma tarefa não escreve um arquivo temporário que o
+trabalhador salva ao final: ela recebe o relatório e a função
+``progresso(linhas)`` e retorna ``(linhas_processadas, caminho_arquivo)``,
+com o caminho relativo a ``MEDIA_ROOT`` ou ``None``.
+"""
+import os
+from datetime import date
+
+from django.conf import settings
+
+from reports.models import Relatorio
+from transactions.retencao import TAMANHO_BLOCO_PADRAO, ExpurgoTransacoes, ProgressoExpurgo
+
+
+def expurgar_transacoes(relatorio, progresso):
+    """
+    Remove as transações do usuário anteriores a ``antes_de`` em blocos.
+    ``parametros`` aceita ``tamanho_bloco``, ``pausa`` (segundos entre blocos)
+    e ``arquivar`` (grava as linhas em ``expurgos/<id>.csv.gz`` antes de
+    removê-las). O progresso fica em ``parametros['progresso']``, gravado na
+    transação de cada bloco, e uma nova tentativa continua de onde parou.
+    """
+    # O mesmo dicionário fica no relatório: o progresso é preservado se ele
+    # for marcado como falha.
+    relatorio.parametros = parametros = dict(relatorio.parametros or {})
+    relativo = f"expurgos/{relatorio.pk}.csv.gz" if parametros.get('arquivar') else None
+    expurgo = ExpurgoTransacoes(
+        date.fromisoformat(parametros['antes_de']),
+        user_id=relatorio.usuario_id,
+        tamanho_bloco=int(parametros.get('tamanho_bloco', TAMANHO_BLOCO_PADRAO)),
+        pausa=float(parametros.get('pausa', 0)),
+        caminho_arquivo=os.path.join(settings.MEDIA_ROOT, relativo) if relativo else None,
+    )
+
+    def bloco_concluido(estado):
+        parametros['progresso'] = estado.como_dict()
+        Relatorio.objects.filter(pk=relatorio.pk).update(parametros=parametros)
+        progresso(estado.excluidas)
+
+    anterior = parametros.get('progresso') or {}
+    estado = expurgo.executar(bloco_concluido, estado=ProgressoExpurgo(**anterior))
+    return estado.excluidas, relativo
+
+
+TAREFAS = {
+    'expurgo': expurgar_transacoes,
+}
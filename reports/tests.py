@@ -1,3 +1,95 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from django.utils.timezone import now
+
+from reports import fila
+from reports.fila import MAXIMO_TENTATIVAS, recuperar_travados, reivindicar_proximo
+from reports.models import Relatorio
+from reports.trabalhador import sinal_de_vida
+
+
+class FilaDeRelatoriosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('solicitante')
+
+    def relatorio(self, **campos):
+        return Relatorio.objects.create(usuario=self.usuario, tipo='usuarios', **campos)
+
+    def test_reivindica_o_mais_antigo_uma_unica_vez(self):
+        primeiro, segundo = self.relatorio(), self.relatorio()
+
+        self.assertEqual(reivindicar_proximo('a').pk, primeiro.pk)
+        self.assertEqual(reivindicar_proximo('b').pk, segundo.pk)
+        self.assertIsNone(reivindicar_proximo('c'))
+
+        primeiro.refresh_from_db()
+        self.assertEqual((primeiro.status, primeiro.trabalhador, primeiro.tentativas), ('em_processamento', 'a', 1))
+        self.assertIsNotNone(primeiro.ultimo_sinal)
+
+    def test_update_condicional_pula_o_relatorio_levado_por_outro(self):
+        primeiro, segundo = self.relatorio(), self.relatorio()
+        original = fila._marcar_em_processamento
+
+        def concorrente_chega_antes(queryset, trabalhador):
+            # Entre o SELECT e o UPDATE, outro trabalhador leva o primeiro.
+            if not Relatorio.objects.filter(trabalhador='outro').exists():
+                original(Relatorio.objects.filter(pk=primeiro.pk), 'outro')
+            return original(queryset, trabalhador)
+
+        with mock.patch.object(fila, '_marcar_em_processamento', concorrente_chega_antes):
+            self.assertEqual(reivindicar_proximo('a').pk, segundo.pk)
+
+        primeiro.refresh_from_db()
+        self.assertEqual((primeiro.trabalhador, primeiro.tentativas), ('outro', 1))
+
+    def test_travados_voltam_para_a_fila_ate_esgotar_as_tentativas(self):
+        antigo = now() - timedelta(minutes=10)
+        travado = self.relatorio(status='em_processamento', trabalhador='morto', ultimo_sinal=antigo, tentativas=1)
+        esgotado = self.relatorio(
+            status='em_processamento', trabalhador='morto', ultimo_sinal=antigo, tentativas=MAXIMO_TENTATIVAS,
+        )
+        ativo = self.relatorio(status='em_processamento', trabalhador='vivo', ultimo_sinal=now(), tentativas=1)
+
+        self.assertEqual(recuperar_travados(), 1)
+
+        travado.refresh_from_db()
+        esgotado.refresh_from_db()
+        ativo.refresh_from_db()
+        self.assertEqual((travado.status, travado.trabalhador), ('pendente', None))
+        self.assertEqual(esgotado.status, 'falha')
+        self.assertEqual((ativo.status, ativo.trabalhador), ('em_processamento', 'vivo'))
+        self.assertEqual(reivindicar_proximo('novo').pk, travado.pk)
+
+    def test_resultado_de_trabalhador_substituido_e_descartado(self):
+        self.relatorio(parametros={'formato': 'csv'})
+        antigo = reivindicar_proximo('a')
+        Relatorio.objects.filter(pk=antigo.pk).update(status='pendente', trabalhador=None)
+        novo = reivindicar_proximo('b')
+
+        self.assertFalse(antigo.marcar_concluido('relatorios/antigo.csv'))
+        self.assertFalse(antigo.marcar_falha("erro"))
+        self.assertTrue(novo.marcar_falha("Sem espaço em disco."))
+
+        novo.refresh_from_db()
+        self.assertEqual((novo.status, novo.trabalhador), ('falha', 'b'))
+        self.assertEqual(novo.parametros, {'formato': 'csv', 'erro': "Sem espaço em disco."})
+
+
+class SinalDeVidaTests(TransactionTestCase):
+    def test_sinal_atualizado_durante_um_bloco_demorado(self):
+        usuario = User.objects.create_user('paciente')
+        Relatorio.objects.create(usuario=usuario, tipo='usuarios')
+        relatorio = reivindicar_proximo('a')
+        Relatorio.objects.filter(pk=relatorio.pk).update(ultimo_sinal=now() - timedelta(minutes=10))
+
+        with sinal_de_vida(relatorio, 'a', intervalo=0.05):
+            time.sleep(0.3)
+
+        relatorio.refresh_from_db()
+        self.assertGreater(relatorio.ultimo_sinal, now() - timedelta(minutes=1))
+        self.assertEqual(recuperar_travados(), 0)
@@ -0,0 +1,172 @@
+"""
+Trabalhador que consome a fila de relatórios.
+
+``iniciar_processo`` é o ponto de entrada de cada processo criado por
+``run_report_workers``; como os processos são iniciados com ``spawn``, ele
+configura o Django antes de importar os modelos.
+
+O sinal de vida (``ultimo_sinal``) é atualizado por uma thread própria
+enquanto o relatório é processado, de modo que uma consulta ou um bloco
+demorado do gerador não faça o relatório parecer travado.
+"""
+import contextvars
+import io
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+INTERVALO_SINAL = 5.0
+INTERVALO_RECUPERACAO = 60.0
+
+
+@contextmanager
+def sinal_de_vida(relatorio, trabalhador, intervalo=INTERVALO_SINAL):
+    """
+    Atualiza o sinal de vida do relatório a cada ``intervalo`` segundos, em
+    uma thread, enquanto o bloco executa.
+    """
+    from django.db import DatabaseError, connection
+
+    from reports.fila import registrar_sinal
+
+    parar = threading.Event()
+    # A thread herda o contexto (shard do usuário) de quem abriu o bloco.
+    contexto = contextvars.copy_context()
+
+    def pulsar():
+        try:
+            while not parar.wait(intervalo):
+                try:
+                    contexto.run(registrar_sinal, relatorio, trabalhador)
+                except DatabaseError:
+                    # Banco ocupado: o próximo sinal tenta de novo.
+                    pass
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=pulsar, name=f"sinal-{relatorio.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        thread.join()
+
+
+def processar(relatorio, trabalhador):
+    """
+    Gera o arquivo do relatório, grava-o em ``caminho_arquivo`` e marca o
+    relatório como concluído (ou como falha, registrando o erro). Se o
+    relatório tiver sido devolvido à fila e reivindicado por outro trabalhador
+    nesse meio-tempo, o resultado é descartado.
+    """
+    from django.core.files import File
+
+    from accounts.replicas import ler_da_replica
+    from reports.geradores import gerador_para
+    from reports.models import LogRelatorio
+    from reports.tarefas import TAREFAS
+
+    LogRelatorio.objects.create(relatorio=relatorio, mensagem=f"Processamento iniciado por {trabalhador}.")
+    ultimo_registro = time.monotonic()
+
+    def progresso(linhas):
+        nonlocal ultimo_registro
+        if time.monotonic() - ultimo_registro >= INTERVALO_SINAL:
+            LogRelatorio.objects.create(relatorio=relatorio, mensagem=f"{linhas} linhas processadas.")
+            ultimo_registro = time.monotonic()
+
+    def concluir(caminho, total):
+        if relatorio.marcar_concluido(caminho):
+            LogRelatorio.objects.create(relatorio=relatorio, mensagem=f"Concluído com {total} linhas.")
+            return
+        if relatorio.tipo not in TAREFAS and relatorio.caminho_arquivo:
+            relatorio.caminho_arquivo.delete(save=False)
+        LogRelatorio.objects.create(
+            relatorio=relatorio,
+            mensagem=f"Resultado de {trabalhador} descartado: o relatório foi devolvido à fila.",
+        )
+
+    with sinal_de_vida(relatorio, trabalhador):
+        try:
+            if relatorio.tipo in TAREFAS:
+                total, caminho = TAREFAS[relatorio.tipo](relatorio, progresso)
+                concluir(caminho, total)
+                return
+
+            gerador = gerador_para(relatorio.tipo)
+            with tempfile.TemporaryFile() as temporario:
+                texto = io.TextIOWrapper(temporario, encoding='utf-8', newline='')
+                # Os dados do relatório vêm de uma réplica; o progresso e o
+                # resultado são gravados no principal.
+                with ler_da_replica(fixar_apos_escrita=False):
+                    total, extensao = gerador(relatorio, texto, progresso)
+                texto.flush()
+                texto.detach()
+                temporario.seek(0)
+                relatorio.caminho_arquivo.save(f"{relatorio.tipo}-{relatorio.pk}.{extensao}", File(temporario), save=False)
+            concluir(relatorio.caminho_arquivo.name, total)
+        except Exception as erro:
+            if relatorio.marcar_falha(str(erro)):
+                LogRelatorio.objects.create(relatorio=relatorio, mensagem=f"Falha: {erro}")
+
+
+def executar(trabalhador, intervalo=2.0, parar_quando_vazio=False, deve_parar=lambda: False):
+    """
+    Laço principal: recupera relatórios travados de tempos em tempos,
+    reivindica o próximo pendente e o processa. Com shards, cada banco tem a
+    sua fila, e o relatório é processado no shard do usuário.
+    """
+    from accounts.shards import bancos_de_usuarios, em_shard, no_shard_do_usuario
+    from reports.fila import recuperar_travados, reivindicar_proximo
+
+    proxima_recuperacao = 0.0
+    while not deve_parar():
+        if time.monotonic() >= proxima_recuperacao:
+            for banco in bancos_de_usuarios():
+                with em_shard(banco):
+                    recuperar_travados()
+            proxima_recuperacao = time.monotonic() + INTERVALO_RECUPERACAO
+
+        relatorio = None
+        for banco in bancos_de_usuarios():
+            with em_shard(banco):
+                relatorio = reivindicar_proximo(trabalhador)
+            if relatorio is not None:
+                break
+        if relatorio is None:
+            if parar_quando_vazio:
+                return
+            time.sleep(intervalo)
+            continue
+        with no_shard_do_usuario(relatorio.usuario_id):
+            processar(relatorio, trabalhador)
+
+
+def nome_trabalhador(indice):
+    return f"{socket.gethostname()}:{os.getpid()}:{indice}"
+
+
+def iniciar_processo(indice, intervalo, parar_quando_vazio):
+    import django
+    django.setup()
+
+    parar = False
+
+    def sinalizar_parada(*args):
+        nonlocal parar
+        parar = True
+
+    signal.signal(signal.SIGTERM, sinalizar_parada)
+    signal.signal(signal.SIGINT, sinalizar_parada)
+    executar(
+        nome_trabalhador(indice),
+        intervalo=intervalo,
+        parar_quando_vazio=parar_quando_vazio,
+        deve_parar=lambda: parar,
+    )
@@ -0,0 +1,7 @@
+from django.urls import path
+from reports.views import SolicitarRelatorioView, RelatorioStatusView
+
+urlpatterns = [
+    path('', SolicitarRelatorioView.as_view(), name='relatorios_solicitar'),
+    path('<uuid:id_relatorio>/', RelatorioStatusView.as_view(), name='relatorio_status'),
+]
@@ -1,3 +1,52 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.views import APIView # type: ignore
+from rest_framework import status # type: ignore
+from reports.models import Relatorio
+from reports.geradores import GERADORES
 
-# Create your views here.
+
+class SolicitarRelatorioView(APIView):
+    """
+    View para solicitar a geração de um relatório em segundo plano.
+    """
+    def post(self, request):
+        """
+        Enfileira o relatório e responde imediatamente; o arquivo é gerado
+        pelos trabalhadores de ``run_report_workers``.
+        """
+        tipo = request.data.get('tipo')
+        if tipo not in GERADORES:
+            return JsonResponse(
+                {"erro": f"Tipo de relatório inválido. Opções: {', '.join(GERADORES)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if tipo == 'usuarios' and not request.user.is_staff:
+            return JsonResponse({"erro": "Relatório restrito à equipe."}, status=status.HTTP_403_FORBIDDEN)
+        parametros = request.data.get('parametros') or None
+        if parametros is not None and not isinstance(parametros, dict):
+            return JsonResponse({"erro": "Os parâmetros devem ser um objeto JSON."}, status=status.HTTP_400_BAD_REQUEST)
+
+        relatorio = Relatorio.objects.create(usuario=request.user, tipo=tipo, parametros=parametros)
+        return JsonResponse(
+            {"id_relatorio": relatorio.id_relatorio, "status": relatorio.status},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class RelatorioStatusView(APIView):
+    """
+    View para acompanhar um relatório solicitado.
+    """
+    def get(self, request, id_relatorio):
+        relatorio = get_object_or_404(Relatorio, id_relatorio=id_relatorio, usuario=request.user)
+        return JsonResponse({
+            "id_relatorio": relatorio.id_relatorio,
+            "tipo": relatorio.tipo,
+            "status": relatorio.status,
+            "arquivo": relatorio.caminho_arquivo.url if relatorio.caminho_arquivo else None,
+            "data_solicitacao": relatorio.data_solicitacao,
+            "data_conclusao": relatorio.data_conclusao,
+            "progresso": (relatorio.parametros or {}).get('progresso'),
+            "logs": list(relatorio.logs.values_list('mensagem', flat=True)[:20]),
+        })
@@ -0,0 +1,138 @@
+"""
+Perfis de banco de dados, escolhidos pela variável de ambiente ``BANCO_PERFIL``.
+
+- ``sqlite`` (padrão): SQLite ajustado para vários processos escrevendo ao
+  mesmo tempo. WAL deixa leitores e o escritor trabalharem em paralelo,
+  ``synchronous=NORMAL`` só sincroniza o disco nos checkpoints (seguro com
+  WAL), o ``timeout`` faz a conexão esperar o bloqueio em vez de falhar com
+  "database is locked", e ``BEGIN IMMEDIATE`` reserva a escrita no início da
+  transação, evitando o impasse de duas transações de leitura que tentam
+  escrever. ``mmap_size`` e ``cache_size`` reduzem leituras do disco.
+- ``sqlite_padrao``: o SQLite sem ajustes, para comparação nos benchmarks.
+- ``postgresql``: PostgreSQL com conexões persistentes (``CONN_MAX_AGE``) ou,
+  com ``BANCO_POOL=true``, com o pool do psycopg (requer ``psycopg[pool]``).
+
+Os dados de conexão do PostgreSQL vêm de ``BANCO_NOME``, ``BANCO_USUARIO``,
+``BANCO_SENHA``, ``BANCO_HOST`` e ``BANCO_PORTA``.
+
+Réplicas de leitura (ver ``accounts.replicas``) vêm de ``BANCO_REPLICAS``,
+separadas por vírgula: ``host[:porta]`` no PostgreSQL ou o caminho de uma
+cópia sincronizada do arquivo no SQLite. Cada uma vira o alias ``replica1``,
+``replica2``... com as demais configurações do perfil.
+
+Shards (ver ``accounts.shards``) vêm de ``BANCO_SHARDS`` da mesma forma, com
+``host[:porta][/nome]`` no PostgreSQL ou o caminho do arquivo (relativo ao
+projeto) no SQLite, e viram os aliases ``shard1``, ``shard2``... A ordem
+define a faixa de ids de cada shard: acrescente shards sempre ao final.
+"""
+import os
+from pathlib import Path
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PERFIS = ('sqlite', 'sqlite_padrao', 'postgresql')
+
+PRAGMAS_SQLITE = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',  # 256 MB
+    'PRAGMA cache_size=-65536',  # 64 MB (valores negativos são em KB)
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def perfil_banco(perfil=None, ambiente=None):
+    """
+    Monta o dicionário de ``DATABASES['default']`` para o perfil informado
+    (padrão: ``BANCO_PERFIL`` ou ``sqlite``).
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    perfil = perfil or ambiente.get('BANCO_PERFIL', 'sqlite')
+    if perfil not in PERFIS:
+        raise ValueError(f"Perfil de banco desconhecido: '{perfil}'. Opções: {', '.join(PERFIS)}.")
+
+    if perfil == 'postgresql':
+        pool = ambiente.get('BANCO_POOL', 'false').lower() == 'true'
+        banco = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': ambiente.get('BANCO_NOME', 'controle_despesas'),
+            'USER': ambiente.get('BANCO_USUARIO', ''),
+            'PASSWORD': ambiente.get('BANCO_SENHA', ''),
+            'HOST': ambiente.get('BANCO_HOST', 'localhost'),
+            'PORT': ambiente.get('BANCO_PORTA', '5432'),
+            # Com o pool, as conexões são devolvidas a ele ao fim de cada
+            # requisição; o Django exige CONN_MAX_AGE = 0 nesse caso.
+            'CONN_MAX_AGE': 0 if pool else int(ambiente.get('BANCO_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': not pool,
+            'OPTIONS': {},
+        }
+        if pool:
+            banco['OPTIONS']['pool'] = {
+                'min_size': int(ambiente.get('BANCO_POOL_MIN', 2)),
+                'max_size': int(ambiente.get('BANCO_POOL_MAX', 10)),
+                'timeout': float(ambiente.get('BANCO_POOL_TIMEOUT', 10)),
+            }
+        return banco
+
+    banco = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ambiente.get('BANCO_NOME', BASE_DIR / 'db.sqlite3'),
+        # Banco de testes em arquivo: o SQLite em memória compartilhada recusa
+        # escritas concorrentes de threads em vez de aguardar o bloqueio.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+    if perfil == 'sqlite':
+        banco.update({
+            'CONN_MAX_AGE': int(ambiente.get('BANCO_CONN_MAX_AGE', 600)),
+            'OPTIONS': {
+                'timeout': float(ambiente.get('BANCO_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(PRAGMAS_SQLITE),
+            },
+        })
+    return banco
+
+
+def replicas_do_perfil(perfil=None, ambiente=None):
+    """
+    Monta as entradas de ``DATABASES`` das réplicas de leitura do perfil.
+    Nos testes, cada réplica espelha o banco principal (``TEST['MIRROR']``).
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    principal = perfil_banco(perfil, ambiente)
+    replicas = {}
+    enderecos = [e.strip() for e in ambiente.get('BANCO_REPLICAS', '').split(',') if e.strip()]
+    for indice, endereco in enumerate(enderecos, start=1):
+        replica = {**principal, 'OPTIONS': dict(principal.get('OPTIONS', {})), 'TEST': {'MIRROR': 'default'}}
+        if principal['ENGINE'].endswith('postgresql'):
+            host, _, porta = endereco.partition(':')
+            replica.update(HOST=host, PORT=porta or principal['PORT'])
+        else:
+            replica['NAME'] = endereco
+            # Réplicas SQLite são somente leitura: sem BEGIN IMMEDIATE, que
+            # reservaria a escrita no arquivo.
+            replica['OPTIONS'].pop('transaction_mode', None)
+        replicas[f'replica{indice}'] = replica
+    return replicas
+
+
+def shards_do_perfil(perfil=None, ambiente=None):
+    """
+    Monta as entradas de ``DATABASES`` dos shards do perfil. ``SHARD_INDICE``
+    define a faixa de ids de cada um.
+    """
+    ambiente = os.environ if ambiente is None else ambiente
+    principal = perfil_banco(perfil, ambiente)
+    shards = {}
+    enderecos = [e.strip() for e in ambiente.get('BANCO_SHARDS', '').split(',') if e.strip()]
+    for indice, endereco in enumerate(enderecos, start=1):
+        shard = {**principal, 'OPTIONS': dict(principal.get('OPTIONS', {})), 'SHARD_INDICE': indice}
+        if principal['ENGINE'].endswith('postgresql'):
+            endereco, _, nome = endereco.partition('/')
+            host, _, porta = endereco.partition(':')
+            shard.update(HOST=host, PORT=porta or principal['PORT'], NAME=nome or principal['NAME'], TEST={})
+        else:
+            arquivo = BASE_DIR / endereco
+            shard.update(NAME=arquivo, TEST={'NAME': arquivo.with_name(f"test_{arquivo.name}")})
+        shards[f'shard{indice}'] = shard
+    return shards
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path, os
 from dotenv import load_dotenv
 
+from setup.bancos import perfil_banco, replicas_do_perfil, shards_do_perfil
+
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,6 +41,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
+    'django_filters',
     'usuario.apps.UsuarioConfig',
     'Despesas.apps.DespesasConfig',
     'transactions.apps.TransactionsConfig',
@@ -54,10 +58,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'accounts.instrumentacao.MedicaoMiddleware',
+    'accounts.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.shards.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,13 +93,26 @@ WSGI_APPLICATION = 'setup.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# O perfil do banco vem de BANCO_PERFIL: 'sqlite' (padrão, ajustado com WAL e
+# conexões persistentes), 'sqlite_padrao' ou 'postgresql' (com BANCO_POOL=true
+# para usar o pool de conexões do psycopg). Veja setup/bancos.py.
+BANCO_PERFIL = os.getenv('BANCO_PERFIL', 'sqlite')
+BANCOS_REPLICA = list(replicas_do_perfil(BANCO_PERFIL))
+BANCOS_SHARD = list(shards_do_perfil(BANCO_PERFIL))
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': perfil_banco(BANCO_PERFIL),
+    **replicas_do_perfil(BANCO_PERFIL),
+    **shards_do_perfil(BANCO_PERFIL),
 }
 
+# Réplicas de leitura (ver accounts/replicas.py): relatórios, gráficos,
+# exportações e listagens do admin leem delas, exceto por
+# REPLICA_JANELA_APOS_ESCRITA segundos depois de uma escrita do cliente.
+# Shards (ver accounts/shards.py): os dados de cada usuário ficam em um dos
+# bancos de BANCOS_SHARD.
+DATABASE_ROUTERS = ['accounts.replicas.RoteadorReplicas', 'accounts.shards.RoteadorShards']
+REPLICA_JANELA_APOS_ESCRITA = int(os.getenv('REPLICA_JANELA_APOS_ESCRITA', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,6 +151,49 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR / 'static')]
 
+# Arquivos gerados (relatórios)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Cache de respostas por usuário (ver accounts/cache.py). Por padrão em
+# memória local, com no máximo CACHE_RESPOSTAS_MAX entradas e descarte das
+# menos usadas recentemente; com CACHE_RESPOSTAS_DIR, passa a ser em arquivos.
+CACHE_RESPOSTAS_MAX = int(os.getenv('CACHE_RESPOSTAS_MAX', 5000))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'respostas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'respostas',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': CACHE_RESPOSTAS_MAX, 'CULL_FREQUENCY': 20},
+    },
+}
+if os.getenv('CACHE_RESPOSTAS_DIR'):
+    CACHES['respostas'].update({
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_RESPOSTAS_DIR'),
+    })
+
+# Instrumentação das requisições (ver accounts/instrumentacao.py): cabeçalho
+# Server-Timing e estatísticas por rota das últimas INSTRUMENTACAO_JANELA
+# requisições; avisa no log quando uma requisição repete a mesma consulta
+# INSTRUMENTACAO_LIMIAR_REPETICAO vezes ou mais.
+INSTRUMENTACAO_ATIVA = os.getenv('INSTRUMENTACAO_ATIVA', 'true').lower() != 'false'
+INSTRUMENTACAO_JANELA = int(os.getenv('INSTRUMENTACAO_JANELA', 500))
+INSTRUMENTACAO_LIMIAR_REPETICAO = int(os.getenv('INSTRUMENTACAO_LIMIAR_REPETICAO', 10))
+
+# Lotes de transações com Idempotency-Key (ver transactions/lote.py): horas
+# em que a resposta guardada de cada chave vale; depois disso a chave pode ser
+# reutilizada e o comando expurgar_chaves_idempotencia remove a linha.
+IDEMPOTENCIA_VALIDADE_HORAS = int(os.getenv('IDEMPOTENCIA_VALIDADE_HORAS', 24))
+
+# Notificações em tempo real (ver dashboard/notificacoes.py): intervalo, em
+# segundos, da consulta de reserva ao banco em cada conexão SSE ociosa.
+NOTIFICACOES_INTERVALO_CONSULTA = float(os.getenv('NOTIFICACOES_INTERVALO_CONSULTA', 15))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,13 @@
+"""
+Configurações dos testes (``manage.py test`` as usa por padrão).
+
+Além das do projeto, declara a réplica 'replica', que espelha o banco
+principal, e os shards 'shard1' e 'shard2', arquivos SQLite próprios. Só os
+testes que os incluem em BANCOS_REPLICA e BANCOS_SHARD os usam.
+"""
+from setup.settings import *  # noqa: F401,F403
+from setup.bancos import shards_do_perfil
+
+DATABASES.setdefault('replica', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})  # noqa: F405
+for _alias, _shard in shards_do_perfil('sqlite', {'BANCO_SHARDS': 'shard1.sqlite3,shard2.sqlite3'}).items():
+    DATABASES.setdefault(_alias, _shard)  # noqa: F405
@@ -4,5 +4,10 @@ from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/transacoes/', include('transactions.urls')),
+    path('api/relatorios/', include('reports.urls')),
+    path('api/planejamentos/', include('annual_planning.urls')),
+    path('api/contas/', include('accounts.urls')),
+    path('api/dashboard/', include('dashboard.urls')),
     path('', include('usuario.urls')),
 ]
@@ -1,5 +1,8 @@
 from django.contrib import admin
 from django.contrib import admin
+from django.utils.text import smart_split, unescape_string_literal
+from accounts.replicas import ListagemEmReplicaAdminMixin
+from transactions.busca import buscar, indice_disponivel
 from transactions.models import Category, Transaction
 
 @admin.register(Category)
@@ -8,9 +11,21 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ListagemEmReplicaAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'transaction_type', 'amount', 'date', 'category')
     list_filter = ('transaction_type', 'category', 'date')
-    search_fields = ('description',)
+    search_fields = ('description', 'category__name')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Busca pelo índice textual (``transactions.busca``) quando o banco tem um.
+        """
+        if not search_term or not indice_disponivel(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        termos = [
+            unescape_string_literal(termo) if termo[0] in ('"', "'") and termo[-1] == termo[0] else termo
+            for termo in smart_split(search_term)
+        ]
+        return buscar(queryset, termos), False
 
 
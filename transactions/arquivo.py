@@ -0,0 +1,297 @@
+"""
+Arquivamento de transações antigas em segmentos compactados.
+
+As transações de um usuário em um ano já encerrado há tempo suficiente saem
+da tabela principal e vão para um ``SegmentoArquivado``: uma linha por
+(usuário, ano) com as transações em JSON compactado com zlib e as métricas do
+ano pré-calculadas. A tabela principal fica pequena e os índices quentes, sem
+perder o histórico.
+
+O arquivamento não altera os dados do ponto de vista do usuário, então não
+emite movimentos: resumos mensais, gasto real dos planejamentos etc.
+continuam valendo. As leituras atravessam para o arquivo quando o intervalo
+pedido alcança anos arquivados:
+
+- ``metricas_arquivadas`` devolve linhas de métricas no formato de
+  ``resumir_transacoes`` (anos inteiros vêm direto dos totais do segmento,
+  sem descompactar);
+- ``transacoes_arquivadas`` devolve instâncias (não salvas) de
+  ``Transaction`` para a listagem, que as mescla à página da tabela principal
+  quando ordenada por data (``anos_arquivados`` permite ler um ano por vez);
+- ``transacao_arquivada`` encontra uma transação pelo id, para o detalhe;
+- ``arquivadas_do_filtro`` percorre um segmento por vez, da mais recente para
+  a mais antiga, para a exportação e os relatórios em fluxo.
+
+Transações incluídas depois em um ano já arquivado ficam na tabela principal
+até o próximo arquivamento, que as acrescenta ao segmento. Transações
+arquivadas não podem ser alteradas nem excluídas individualmente; o expurgo
+(``transactions.retencao``) as remove com ``aparar_segmento``.
+"""
+import json
+import zlib
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models.functions import ExtractYear
+
+from accounts.shards import atomico_do_usuario
+from transactions.models import Category, SegmentoArquivado, Transaction
+from transactions.resumo import METRICAS
+from transactions.signals import movimentos_suspensos
+
+
+CAMPOS = ('id', 'date', 'transaction_type', 'category_id', 'amount', 'description', 'created_at', 'updated_at')
+
+
+def compactar(registros):
+    return zlib.compress(json.dumps(registros, separators=(',', ':'), ensure_ascii=False).encode(), 6)
+
+
+def descompactar(dados):
+    return json.loads(zlib.decompress(bytes(dados)))
+
+
+def _registro(linha):
+    pk, dia, tipo, categoria_id, valor, descricao, criado, atualizado = linha
+    return [pk, dia.isoformat(), tipo, categoria_id, str(valor), descricao, criado.isoformat(), atualizado.isoformat()]
+
+
+def _para_transacao(user_id, registro):
+    pk, dia, tipo, categoria_id, valor, descricao, criado, atualizado = registro
+    transacao = Transaction(
+        id=pk, user_id=user_id, date=date.fromisoformat(dia), transaction_type=tipo,
+        category_id=categoria_id, amount=Decimal(valor), description=descricao,
+        created_at=datetime.fromisoformat(criado), updated_at=datetime.fromisoformat(atualizado),
+    )
+    transacao._state.adding = False
+    transacao.arquivada = True
+    return transacao
+
+
+def _metricas(registros):
+    """
+    Métricas de ``resumir_transacoes`` calculadas sobre registros arquivados.
+    """
+    metricas = {chave: None for chave in METRICAS}
+    metricas.update(quantidade_receitas=0, quantidade_despesas=0)
+    for _, _, tipo, _, valor, *_ in registros:
+        valor = Decimal(valor)
+        sufixo = 'receita' if tipo == 'income' else 'despesa'
+        metricas[f'total_{sufixo}s'] = (metricas[f'total_{sufixo}s'] or 0) + valor
+        metricas[f'quantidade_{sufixo}s'] += 1
+        menor, maior = metricas[f'menor_{sufixo}'], metricas[f'maior_{sufixo}']
+        metricas[f'menor_{sufixo}'] = valor if menor is None else min(menor, valor)
+        metricas[f'maior_{sufixo}'] = valor if maior is None else max(maior, valor)
+    return metricas
+
+
+def arquivar_ano(user_id, ano):
+    """
+    Move as transações de ``user_id`` em ``ano`` para o segmento do ano,
+    acrescentando-as às já arquivadas. Retorna quantas foram movidas.
+    """
+    from accounts.versoes import incrementar_versao
+
+    with atomico_do_usuario(user_id) as banco:
+        linhas = list(
+            Transaction.objects.select_for_update()
+            .filter(user_id=user_id, date__range=(date(ano, 1, 1), date(ano, 12, 31)))
+            .order_by('date', 'pk')
+            .values_list(*CAMPOS)
+        )
+        if not linhas:
+            return 0
+        segmento = (
+            SegmentoArquivado.objects.select_for_update().filter(user_id=user_id, ano=ano).first()
+            or SegmentoArquivado(user_id=user_id, ano=ano)
+        )
+        registros = descompactar(segmento.dados) if segmento.pk else []
+        registros.extend(_registro(linha) for linha in linhas)
+        _gravar_registros(segmento, registros)
+        # As linhas continuam existindo no segmento: os movimentos da exclusão
+        # não são emitidos.
+        with movimentos_suspensos():
+            Transaction.objects.using(banco).filter(pk__in=[linha[0] for linha in linhas]).delete()
+        incrementar_versao([user_id])
+    return len(linhas)
+
+
+def _gravar_registros(segmento, registros):
+    registros.sort(key=lambda registro: (registro[1], registro[0]))
+    for chave, valor in _metricas(registros).items():
+        setattr(segmento, chave, valor if valor is not None or not chave.startswith('total_') else Decimal('0.00'))
+    segmento.dados = compactar(registros)
+    segmento.save()
+
+
+def aparar_segmento(segmento_id, antes_de):
+    """
+    Remove do segmento as transações com ``date < antes_de``, recalculando os
+    totais, ou apaga o segmento se não sobrar nenhuma. Deve ser chamada dentro
+    de uma transação no banco do segmento. Retorna as transações removidas,
+    como instâncias não salvas de ``Transaction``.
+    """
+    segmento = SegmentoArquivado.objects.select_for_update().filter(pk=segmento_id).first()
+    if segmento is None:
+        return []
+    limite = antes_de.isoformat()
+    registros = descompactar(segmento.dados)
+    removidos = [registro for registro in registros if registro[1] < limite]
+    if not removidos:
+        return []
+    restantes = [registro for registro in registros if registro[1] >= limite]
+    if restantes:
+        _gravar_registros(segmento, restantes)
+    else:
+        segmento.delete()
+    return [_para_transacao(segmento.user_id, registro) for registro in removidos]
+
+
+def anos_a_arquivar(antes_do_ano, user_ids=None):
+    """
+    Pares ``(user_id, ano)`` com transações na tabela principal anteriores a
+    ``antes_do_ano``.
+    """
+    transacoes = Transaction.objects.filter(date__lt=date(antes_do_ano, 1, 1))
+    if user_ids:
+        transacoes = transacoes.filter(user_id__in=user_ids)
+    return list(
+        transacoes.order_by().annotate(ano=ExtractYear('date'))
+        .values_list('user_id', 'ano').distinct().order_by('user_id', 'ano')
+    )
+
+
+def _segmentos(user_id, inicio, fim):
+    segmentos = SegmentoArquivado.objects.filter(user_id=user_id)
+    if inicio:
+        segmentos = segmentos.filter(ano__gte=inicio.year)
+    if fim:
+        segmentos = segmentos.filter(ano__lte=fim.year)
+    return segmentos.order_by('ano')
+
+
+def _no_intervalo(registros, inicio, fim):
+    inicio = inicio.isoformat() if inicio else None
+    fim = fim.isoformat() if fim else None
+    return [
+        registro for registro in registros
+        if (inicio is None or registro[1] >= inicio) and (fim is None or registro[1] <= fim)
+    ]
+
+
+def metricas_arquivadas(user_id, inicio=None, fim=None, agrupar=()):
+    """
+    Linhas de métricas das transações arquivadas de ``user_id`` no intervalo,
+    no mesmo formato das linhas agrupadas de ``resumir_transacoes`` (com
+    ``category_id``/``category__name`` e/ou ``mes`` conforme ``agrupar``).
+    """
+    linhas = []
+    nomes = None
+    for segmento in _segmentos(user_id, inicio, fim).defer('dados'):
+        ano_inteiro = (inicio is None or inicio <= date(segmento.ano, 1, 1)) and \
+                      (fim is None or fim >= date(segmento.ano, 12, 31))
+        if ano_inteiro and not agrupar:
+            linhas.append({chave: getattr(segmento, chave) for chave in METRICAS})
+            continue
+
+        registros = _no_intervalo(descompactar(segmento.dados), inicio, fim)
+        grupos = defaultdict(list)
+        for registro in registros:
+            chave = []
+            if 'categoria' in agrupar:
+                chave.append(registro[3])
+            if 'mes' in agrupar:
+                chave.append(registro[1][:7])
+            grupos[tuple(chave)].append(registro)
+        if 'categoria' in agrupar and nomes is None:
+            nomes = dict(Category.objects.values_list('pk', 'name'))
+        for chave, registros_do_grupo in grupos.items():
+            linha = _metricas(registros_do_grupo)
+            partes = list(chave)
+            if 'categoria' in agrupar:
+                categoria_id = partes.pop(0)
+                linha.update(category_id=categoria_id, category__name=nomes.get(categoria_id))
+            if 'mes' in agrupar:
+                linha['mes'] = date.fromisoformat(partes.pop(0) + '-01')
+            linhas.append(linha)
+    return linhas
+
+
+def anos_arquivados(user_id):
+    return list(SegmentoArquivado.objects.filter(user_id=user_id).order_by('ano').values_list('ano', flat=True))
+
+
+def transacoes_arquivadas(user_id, inicio=None, fim=None):
+    """
+    Transações arquivadas de ``user_id`` no intervalo, como instâncias não
+    salvas de ``Transaction`` (com ``arquivada = True``).
+    """
+    return [
+        _para_transacao(user_id, registro)
+        for segmento in _segmentos(user_id, inicio, fim)
+        for registro in _no_intervalo(descompactar(segmento.dados), inicio, fim)
+    ]
+
+
+def transacao_arquivada(user_id, pk):
+    """
+    A transação arquivada ``pk`` de ``user_id``, ou ``None``. Descompacta os
+    segmentos do usuário até encontrá-la: serve ao detalhe, não a listagens.
+    """
+    for segmento in _segmentos(user_id, None, None).iterator(chunk_size=1):
+        for registro in descompactar(segmento.dados):
+            if registro[0] == pk:
+                return _para_transacao(user_id, registro)
+    return None
+
+
+def arquivadas_do_filtro(user_id, filtros, using=None):
+    """
+    Transações arquivadas de ``user_id`` que atendem aos filtros já validados
+    de um ``FilterSet``, da mais recente para a mais antiga (data e id), com
+    um segmento descompactado por vez. ``using`` fixa o banco, para geradores
+    consumidos fora do escopo da requisição.
+    """
+    segmentos = _segmentos(user_id, filtros.get('date__gte'), filtros.get('date__lte'))
+    if using is not None:
+        segmentos = segmentos.using(using)
+    for segmento in segmentos.reverse().iterator(chunk_size=1):
+        registros = _no_intervalo(descompactar(segmento.dados), filtros.get('date__gte'), filtros.get('date__lte'))
+        for registro in reversed(registros):
+            transacao = _para_transacao(user_id, registro)
+            if corresponde_aos_filtros(transacao, filtros):
+                yield transacao
+
+
+def corresponde_aos_filtros(transacao, filtros):
+    """
+    Aplica em memória os filtros já validados de um ``FilterSet``
+    (``campo``, ``campo__gte`` e ``campo__lte``).
+    """
+    for nome, valor in filtros.items():
+        if valor in (None, ''):
+            continue
+        campo, _, operador = nome.partition('__')
+        atual = getattr(transacao, Transaction._meta.get_field(campo).attname)
+        valor = getattr(valor, 'pk', valor)
+        if operador == 'gte' and not atual >= valor:
+            return False
+        if operador == 'lte' and not atual <= valor:
+            return False
+        if operador in ('', 'exact') and atual != valor:
+            return False
+    return True
+
+
+def movimentos_arquivados(user_ids, ano=None):
+    """
+    Gera ``(user_id, data, tipo, categoria_id, valor)`` das transações
+    arquivadas dos usuários, para as reconstruções de agregados.
+    """
+    segmentos = SegmentoArquivado.objects.filter(user_id__in=user_ids)
+    if ano is not None:
+        segmentos = segmentos.filter(ano=ano)
+    for user_id, dados in segmentos.values_list('user_id', 'dados').iterator(chunk_size=100):
+        for _, dia, tipo, categoria_id, valor, *_ in descompactar(dados):
+            yield user_id, date.fromisoformat(dia), tipo, categoria_id, Decimal(valor)
@@ -0,0 +1,257 @@
+"""
+Utilitários compartilhados pelos comandos de benchmark.
+"""
+import csv
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from debts.models import Divida
+from goals.models import Meta
+from transactions.carga import percentis
+from transactions.models import Category, Transaction
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+@contextmanager
+def banco_descartavel(alias='default'):
+    """
+    Cria um banco temporário com todas as migrações aplicadas e o remove ao
+    final, para que os benchmarks nunca toquem nos dados reais. Em SQLite o
+    banco é um arquivo (e não memória) para não distorcer a medição de RSS.
+    ``DEBUG`` é desligado para que o log de queries não acumule memória.
+    """
+    conexao = connections[alias]
+    diretorio = tempfile.mkdtemp(prefix='bench-')
+    nome_original = conexao.settings_dict['NAME']
+    if conexao.vendor == 'sqlite':
+        conexao.settings_dict['TEST']['NAME'] = os.path.join(diretorio, 'bench.sqlite3')
+    conexao.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        with override_settings(DEBUG=False):
+            yield conexao
+    finally:
+        conexao.creation.destroy_test_db(nome_original, verbosity=0)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+@contextmanager
+def alias_temporario(alias, configuracao):
+    """
+    Registra ``configuracao`` como o banco ``alias`` enquanto o bloco durar,
+    para medir um perfil de banco diferente do configurado em ``DATABASES``.
+    """
+    configuracao = connections.configure_settings({'default': dict(configuracao)})['default']
+    settings.DATABASES[alias] = configuracao
+    try:
+        yield connections[alias]
+    finally:
+        if any(conexao.alias == alias for conexao in connections.all(initialized_only=True)):
+            connections[alias].close()
+            del connections[alias]
+        del settings.DATABASES[alias]
+
+
+def pico_memoria_mb():
+    """
+    Pico de memória residente (RSS) do processo em MB, ou ``None`` se a
+    plataforma não oferecer o módulo ``resource``.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def gerar_csv_sintetico(caminho, linhas, categorias, semente=42):
+    """
+    Escreve um CSV de importação com ``linhas`` transações aleatórias, em fluxo.
+    ``categorias`` é uma lista de pares ``(nome, tipo)``.
+    """
+    aleatorio = random.Random(semente)
+    inicio = date(2015, 1, 1)
+    tipos = {'income': 'receita', 'expense': 'despesa'}
+    with open(caminho, 'w', newline='', encoding='utf-8') as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(['tipo', 'valor', 'data', 'descricao', 'categoria'])
+        for i in range(linhas):
+            nome, tipo = aleatorio.choice(categorias)
+            escritor.writerow([
+                tipos[tipo],
+                f"{aleatorio.randint(1, 500000) / 100:.2f}",
+                (inicio + timedelta(days=aleatorio.randint(0, 3650))).isoformat(),
+                f"Transação sintética {i}",
+                nome,
+            ])
+
+
+def semear_transacoes(usuario, quantidade, categorias, lote=10000, semente=42, descricoes=None):
+    """
+    Insere ``quantidade`` transações aleatórias de ``usuario`` com
+    ``bulk_create``. Não emite movimentos: os agregados do dashboard não são
+    mantidos para esses dados. Com ``descricoes``, cada transação recebe uma
+    delas, sorteada.
+    """
+    aleatorio = random.Random(semente)
+    inicio = date(2015, 1, 1)
+    restantes = quantidade
+    while restantes > 0:
+        atual = min(lote, restantes)
+        transacoes = []
+        for _ in range(atual):
+            categoria = aleatorio.choice(categorias)
+            transacoes.append(Transaction(
+                user=usuario,
+                category=categoria,
+                transaction_type=categoria.type,
+                amount=Decimal(aleatorio.randint(1, 500000)) / 100,
+                date=inicio + timedelta(days=aleatorio.randint(0, 3650)),
+                description=aleatorio.choice(descricoes) if descricoes else "Transação sintética",
+            ))
+        Transaction.objects.bulk_create(transacoes)
+        restantes -= atual
+
+
+def semear_dividas(usuarios, quantidade, lote=10000, semente=42):
+    """
+    Insere ``quantidade`` dívidas aleatórias distribuídas entre ``usuarios``.
+    """
+    aleatorio = random.Random(semente)
+    inicio = date(2018, 1, 1)
+    restantes = quantidade
+    while restantes > 0:
+        atual = min(lote, restantes)
+        dividas = []
+        for _ in range(atual):
+            valor_total = Decimal(aleatorio.randint(10000, 5000000)) / 100
+            data_inicio = inicio + timedelta(days=aleatorio.randint(0, 2000))
+            dividas.append(Divida(
+                usuario=aleatorio.choice(usuarios),
+                credor=f"Credor {aleatorio.randint(1, 500)}",
+                valor_total=valor_total,
+                valor_pago=(valor_total * aleatorio.randint(0, 90) / 100).quantize(Decimal('0.01')),
+                taxa_juros=Decimal(aleatorio.randint(0, 2500)) / 100,
+                data_inicio=data_inicio,
+                data_vencimento=data_inicio + timedelta(days=aleatorio.randint(30, 1500)),
+            ))
+        Divida.objects.bulk_create(dividas)
+        restantes -= atual
+
+
+def semear_usuarios(quantidade, prefixo='bench'):
+    """
+    Cria ``quantidade`` usuários sem senha utilizável com ``bulk_create``.
+    """
+    User.objects.bulk_create(
+        [User(username=f"{prefixo}{i}", password='!') for i in range(quantidade)],
+        batch_size=1000,
+    )
+    return list(User.objects.filter(username__startswith=prefixo).order_by('pk'))
+
+
+def semear_categorias(quantidade):
+    """
+    Cria ``quantidade`` categorias, alternando receitas e despesas.
+    """
+    return Category.objects.bulk_create([
+        Category(name=f"Categoria {i}", type='income' if i % 4 == 0 else 'expense')
+        for i in range(quantidade)
+    ])
+
+
+def semear_metas(usuarios, quantidade, lote=10000, semente=42):
+    """
+    Insere ``quantidade`` metas aleatórias distribuídas entre ``usuarios``.
+    """
+    aleatorio = random.Random(semente)
+    inicio = date(2020, 1, 1)
+    restantes = quantidade
+    while restantes > 0:
+        atual = min(lote, restantes)
+        metas = []
+        for i in range(atual):
+            valor_alvo = Decimal(aleatorio.randint(10000, 2000000)) / 100
+            data_inicio = inicio + timedelta(days=aleatorio.randint(0, 1500))
+            metas.append(Meta(
+                usuario=aleatorio.choice(usuarios),
+                titulo=f"Meta {i}",
+                valor_alvo=valor_alvo,
+                progresso=(valor_alvo * aleatorio.randint(0, 90) / 100).quantize(Decimal('0.01')),
+                data_inicio=data_inicio,
+                data_fim=data_inicio + timedelta(days=aleatorio.randint(30, 1500)),
+            ))
+        Meta.objects.bulk_create(metas)
+        restantes -= atual
+
+
+def medir_requisicoes(clientes, requisicoes, quantidade):
+    """
+    Executa ``quantidade`` requisições pelo cliente de testes, em rodízio
+    sobre os pares ``(cliente, requisicao)``, e devolve latências,
+    requisições por segundo e consultas por requisição. ``requisicao`` é
+    ``(metodo, caminho, corpo)``.
+    """
+    tempos, consultas, erros = [], 0, 0
+    pares = [(cliente, requisicao) for cliente, lista in zip(clientes, requisicoes) for requisicao in lista]
+    for indice in range(quantidade):
+        cliente, (metodo, caminho, corpo) = pares[indice % len(pares)]
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            if metodo == 'GET':
+                resposta = cliente.get(caminho)
+            else:
+                resposta = cliente.generic(metodo, caminho, json.dumps(corpo), content_type='application/json')
+            if getattr(resposta, 'streaming', False):
+                b''.join(resposta.streaming_content)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        consultas += len(capturadas)
+        erros += resposta.status_code >= 400
+    total = sum(tempos) / 1000
+    return {
+        'requisicoes': quantidade,
+        'erros': erros,
+        'requisicoes_por_segundo': round(quantidade / total, 1) if total else None,
+        'consultas_por_requisicao': round(consultas / quantidade, 2) if quantidade else None,
+        **percentis(tempos),
+    }
+
+
+class _ManipuladorSilencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def servidor_local():
+    """
+    Sobe o projeto em um servidor WSGI com threads em uma porta livre de
+    127.0.0.1 e devolve a URL base. Cada requisição usa a própria conexão com
+    o banco, fechada ao final, como no ``runserver``.
+    """
+    servidor = ThreadedWSGIServer(('127.0.0.1', 0), _ManipuladorSilencioso, allow_reuse_address=False)
+    servidor.set_app(WSGIHandler())
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_port}"
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+        thread.join()
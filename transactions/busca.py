@@ -0,0 +1,160 @@
+"""
+Busca textual nas transações.
+
+O ``SearchFilter`` do DRF e a busca do admin viram ``LIKE '%termo%'``, que
+varre a tabela inteira. A migração ``0005_busca_textual`` cria um índice
+invertido da descrição e do nome da categoria de cada transação:
+
+- SQLite: a tabela virtual FTS5 ``transacao_busca`` (``rowid`` = id da
+  transação), com o tokenizador ``unicode61 remove_diacritics 2``, que ignora
+  maiúsculas e acentos, e índices de prefixo de 2 e 3 caracteres;
+- PostgreSQL: a tabela ``transacao_busca`` com um ``tsvector`` (configuração
+  ``simple``, sem radicalização, e acentos retirados com ``translate``) e um
+  índice GIN.
+
+Gatilhos no banco mantêm o índice a cada gravação, inclusive ``bulk_create``,
+``update()`` e remoções em cascata, e quando uma categoria muda de nome. Como
+o índice fica no mesmo banco das transações, a busca funciona igual nos
+shards e nas réplicas.
+
+Cada termo busca palavras que começam com ele (``farm`` encontra
+"Farmácia"); um termo com várias palavras (``"pão de açúcar"``) busca a
+sequência. Todos os termos precisam aparecer, cada um na descrição ou na
+categoria. Em outros bancos, ou sem FTS5, vale o ``LIKE`` de sempre.
+
+No SQLite, uma migração que refaça a tabela de transações (mudança de campo)
+remove os gatilhos junto com ela; recrie-os na mesma migração e rode
+``reindexar_busca``.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from rest_framework import filters  # type: ignore
+
+
+TABELA = 'transacao_busca'
+
+_PALAVRA = re.compile(r'[^\W_]+')
+
+# Índices encontrados por banco (alias e arquivo ou nome do banco).
+_disponivel = {}
+
+
+def dobrar(texto):
+    """
+    Texto em minúsculas e sem acentos, como o tokenizador do índice o vê.
+    """
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def palavras(texto):
+    return _PALAVRA.findall(dobrar(texto))
+
+
+def indice_disponivel(alias):
+    """
+    Indica se o banco ``alias`` tem o índice de busca (a migração não o cria
+    em bancos sem suporte).
+    """
+    conexao = connections[alias]
+    chave = (alias, str(conexao.settings_dict['NAME']))
+    if chave not in _disponivel:
+        _disponivel[chave] = (
+            conexao.vendor in ('sqlite', 'postgresql') and TABELA in conexao.introspection.table_names()
+        )
+    return _disponivel[chave]
+
+
+def _consulta(vendor, termos):
+    """
+    Expressão de busca do banco para os termos, ou ``None`` se nenhum termo
+    tiver palavras.
+    """
+    frases = [palavras(termo) for termo in termos]
+    frases = [frase for frase in frases if frase]
+    if not frases:
+        return None
+    if vendor == 'postgresql':
+        return ' & '.join(' <-> '.join(frase[:-1] + [frase[-1] + ':*']) for frase in frases)
+    # As palavras só têm letras e dígitos: dispensam o escape de aspas.
+    return ' '.join(f'"{" ".join(frase)}"*' for frase in frases)
+
+
+def buscar(queryset, termos):
+    """
+    Filtra um queryset de ``Transaction`` pelos termos usando o índice.
+    """
+    consulta = _consulta(connections[queryset.db].vendor, termos)
+    if consulta is None:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        sql = f"SELECT transacao_id FROM {TABELA} WHERE documento @@ to_tsquery('simple', %s)"
+    else:
+        sql = f"SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH %s"
+    return queryset.filter(pk__in=RawSQL(sql, [consulta]))
+
+
+def corresponde(termos, textos, indexada=True):
+    """
+    Aplica a mesma regra da busca a textos em memória (as transações
+    arquivadas). Com ``indexada=False``, a regra do ``LIKE``.
+    """
+    if not indexada:
+        textos = [(texto or '').casefold() for texto in textos]
+        return all(any(termo.casefold() in texto for texto in textos) for termo in termos)
+
+    listas = [palavras(texto) for texto in textos]
+    for termo in termos:
+        frase = palavras(termo)
+        if not frase:
+            continue
+        *inteiras, prefixo = frase
+        if not any(
+            lista[i:i + len(inteiras)] == inteiras and lista[i + len(inteiras)].startswith(prefixo)
+            for lista in listas
+            for i in range(len(lista) - len(inteiras))
+        ):
+            return False
+    return True
+
+
+def reconstruir_indice(alias):
+    """
+    Refaz o índice do banco ``alias`` a partir das transações. Devolve a
+    quantidade de transações indexadas.
+    """
+    conexao = connections[alias]
+    with conexao.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA}")
+        if conexao.vendor == 'postgresql':
+            cursor.execute(
+                f"INSERT INTO {TABELA} (transacao_id, documento) "
+                "SELECT t.id, transacao_busca_documento(t.description, c.name) "
+                "FROM transactions_transaction t LEFT JOIN transactions_category c ON c.id = t.category_id"
+            )
+            quantidade = cursor.rowcount
+        else:
+            cursor.execute(
+                f"INSERT INTO {TABELA} (rowid, descricao, categoria) "
+                "SELECT t.id, COALESCE(t.description, ''), COALESCE(c.name, '') "
+                "FROM transactions_transaction t LEFT JOIN transactions_category c ON c.id = t.category_id"
+            )
+            quantidade = cursor.rowcount
+            # Junta os segmentos do índice, como depois de uma carga grande.
+            cursor.execute(f"INSERT INTO {TABELA} ({TABELA}) VALUES ('optimize')")
+    return quantidade
+
+
+class BuscaTextualFilter(filters.SearchFilter):
+    """
+    ``SearchFilter`` que usa o índice de busca quando o banco tem um; senão,
+    os ``search_fields`` da view, como o DRF.
+    """
+    def filter_queryset(self, request, queryset, view):
+        termos = self.get_search_terms(request)
+        if not termos or not indice_disponivel(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        return buscar(queryset, termos)
@@ -0,0 +1,101 @@
+"""
+Gerador de carga HTTP e estatísticas dos benchmarks da API.
+
+Este módulo usa só a biblioteca padrão: os processos do gerador são iniciados
+com ``spawn`` e importam apenas ele, sem configurar o Django.
+"""
+import json
+import math
+import multiprocessing
+import time
+import urllib.error
+import urllib.request
+
+
+def percentis(tempos_ms):
+    """
+    Resume uma lista de latências (ms) com p50/p95/p99 pelo método do
+    posto mais próximo, média, mínimo e máximo.
+    """
+    if not tempos_ms:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'media_ms': None, 'min_ms': None, 'max_ms': None}
+    ordenados = sorted(tempos_ms)
+
+    def posto(percentil):
+        return ordenados[max(0, math.ceil(percentil / 100 * len(ordenados)) - 1)]
+
+    return {
+        'p50_ms': round(posto(50), 3),
+        'p95_ms': round(posto(95), 3),
+        'p99_ms': round(posto(99), 3),
+        'media_ms': round(sum(ordenados) / len(ordenados), 3),
+        'min_ms': round(ordenados[0], 3),
+        'max_ms': round(ordenados[-1], 3),
+    }
+
+
+def _disparar(url_base, requisicoes, cabecalhos, quantidade):
+    """
+    Executa ``quantidade`` requisições (em rodízio sobre ``requisicoes``,
+    pares ``(metodo, caminho, corpo)``) e devolve ``(latencias_ms, erros)``.
+    """
+    tempos, erros = [], 0
+    for indice in range(quantidade):
+        metodo, caminho, corpo = requisicoes[indice % len(requisicoes)]
+        dados = json.dumps(corpo).encode() if corpo is not None else None
+        pedido = urllib.request.Request(url_base + caminho, data=dados, method=metodo, headers=cabecalhos)
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(pedido, timeout=30) as resposta:
+                resposta.read()
+        except (urllib.error.URLError, OSError):
+            erros += 1
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos, erros
+
+
+def gerar_carga(url_base, trabalhos, processos):
+    """
+    Distribui ``trabalhos`` (tuplas ``(requisicoes, cabecalhos, quantidade)``,
+    uma por processo) entre ``processos`` processos e mede o conjunto.
+    """
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(processos) as pool:
+        # Aquecimento: uma requisição por processo antes de medir, para que a
+        # inicialização dos processos não entre na vazão.
+        pool.starmap(_disparar, [(url_base, requisicoes, cabecalhos, 1) for requisicoes, cabecalhos, _ in trabalhos])
+        inicio = time.perf_counter()
+        resultados = pool.starmap(_disparar, [(url_base, *trabalho) for trabalho in trabalhos])
+        duracao = time.perf_counter() - inicio
+    tempos = [tempo for parcial, _ in resultados for tempo in parcial]
+    return {
+        'requisicoes': len(tempos),
+        'erros': sum(erros for _, erros in resultados),
+        'processos': processos,
+        'requisicoes_por_segundo': round(len(tempos) / duracao, 1) if duracao else None,
+        **percentis(tempos),
+    }
+
+
+def comparar(atual, base, tolerancia=0.10):
+    """
+    Compara dois resultados do ``benchmark_api`` endpoint a endpoint. Uma
+    regressão é um p95 mais de ``tolerancia`` acima da base ou uma vazão mais
+    de ``tolerancia`` abaixo dela.
+    """
+    variacoes, regressoes = {}, []
+    for modo, endpoints in atual.get('resultados', {}).items():
+        for nome, medida in endpoints.items():
+            referencia = base.get('resultados', {}).get(modo, {}).get(nome)
+            if not referencia or not referencia.get('p95_ms') or not referencia.get('requisicoes_por_segundo'):
+                continue
+            variacao = {
+                'p95': round(medida['p95_ms'] / referencia['p95_ms'] - 1, 4),
+                'requisicoes_por_segundo': round(
+                    medida['requisicoes_por_segundo'] / referencia['requisicoes_por_segundo'] - 1, 4
+                ),
+            }
+            variacoes[f'{modo}.{nome}'] = variacao
+            if variacao['p95'] > tolerancia or variacao['requisicoes_por_segundo'] < -tolerancia:
+                regressoes.append(f'{modo}.{nome}')
+    return {'tolerancia': tolerancia, 'variacoes': variacoes, 'regressoes': regressoes}
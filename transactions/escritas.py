@@ -0,0 +1,55 @@
+"""
+Processos escritores do ``benchmark_escritas``.
+
+Os processos são iniciados com ``spawn`` e configuram o Django no
+inicializador, com ``BANCO_PERFIL`` e ``BANCO_NOME`` apontando para o banco
+descartável do perfil medido; por isso este módulo não importa nada do Django
+no topo.
+"""
+import os
+import time
+
+
+def preparar(perfil, nome_banco):
+    """
+    Inicializador do pool: configura o Django com o perfil de banco informado.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'setup.settings'
+    os.environ['BANCO_PERFIL'] = perfil
+    os.environ['BANCO_NOME'] = str(nome_banco)
+
+    import django
+    django.setup()
+
+
+def escrever(usuario_id, categoria_id, quantidade):
+    """
+    Cria ``quantidade`` despesas, uma por "requisição", e devolve
+    ``(latencias_ms, erros)``. Cada criação passa por todos os receivers de
+    ``transacoes_movimentadas``, como na API, e é seguida de
+    ``close_old_connections``, o que o Django faz ao fim de cada requisição:
+    sem ``CONN_MAX_AGE`` a conexão é reaberta a cada escrita.
+    """
+    from datetime import date
+    from decimal import Decimal
+
+    from django.db import OperationalError, close_old_connections, transaction
+
+    from transactions.models import Transaction
+
+    tempos, erros = [], 0
+    for indice in range(quantidade):
+        inicio = time.perf_counter()
+        try:
+            with transaction.atomic():
+                Transaction.objects.create(
+                    user_id=usuario_id, category_id=categoria_id, transaction_type='expense',
+                    amount=Decimal('10.00') + indice % 100, date=date(2024, 1 + indice % 12, 1 + indice % 28),
+                    description='Benchmark de escrita',
+                )
+        except OperationalError:
+            # "database is locked": o tempo de espera do SQLite se esgotou.
+            erros += 1
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        close_old_connections()
+    return tempos, erros
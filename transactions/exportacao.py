@@ -0,0 +1,110 @@
+"""
+Exportação de transações em fluxo.
+
+As linhas são lidas do banco com ``QuerySet.iterator(chunk_size=...)`` e
+convertidas em blocos de texto à medida que são consumidas, seja por uma
+``StreamingHttpResponse`` ou por um arquivo de relatório. A memória usada é a
+de um bloco, qualquer que seja a quantidade de transações.
+
+As transações arquivadas (``transactions.arquivo.arquivadas_do_filtro``) são
+intercaladas às da tabela principal na mesma ordem, sem carregá-las todas.
+"""
+import csv
+import heapq
+import io
+
+from transactions.models import Category
+from transactions.serializacao import codificar_json
+
+
+TAMANHO_BLOCO = 2000
+
+COLUNAS = ('id', 'data', 'tipo', 'categoria', 'valor', 'descricao')
+CAMPOS = ('pk', 'date', 'transaction_type', 'category__name', 'amount', 'description')
+
+
+def _linhas(queryset, arquivadas=None):
+    linhas = (
+        queryset.order_by('-date', '-pk')
+        .values_list(*CAMPOS)
+        .iterator(chunk_size=TAMANHO_BLOCO)
+    )
+    if arquivadas is None:
+        return linhas
+    nomes = dict(Category.objects.values_list('pk', 'name'))
+    do_arquivo = (
+        (t.pk, t.date, t.transaction_type, nomes.get(t.category_id), t.amount, t.description)
+        for t in arquivadas
+    )
+    return heapq.merge(linhas, do_arquivo, key=lambda linha: (linha[1], linha[0]), reverse=True)
+
+
+def blocos_csv(queryset, arquivadas=None, progresso=None):
+    """
+    Gera o CSV (com cabeçalho) em blocos de ``TAMANHO_BLOCO`` linhas.
+    ``progresso(linhas)`` recebe o total de transações escritas antes de
+    cada bloco ser entregue (descrições podem conter quebras de linha).
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS)
+    total = 0
+    for linha in _linhas(queryset, arquivadas):
+        escritor.writerow(linha)
+        total += 1
+        if total % TAMANHO_BLOCO == 0:
+            if progresso:
+                progresso(total)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if progresso:
+        progresso(total)
+    yield buffer.getvalue()
+
+
+def blocos_ndjson(queryset, arquivadas=None, progresso=None):
+    """
+    Gera um objeto JSON por linha (NDJSON), em blocos de ``TAMANHO_BLOCO``,
+    com ``progresso`` como em ``blocos_csv``.
+    """
+    bloco = []
+    total = 0
+    for pk, data, tipo, categoria, valor, descricao in _linhas(queryset, arquivadas):
+        bloco.append(codificar_json({
+            'id': pk,
+            'data': data.isoformat(),
+            'tipo': tipo,
+            'categoria': categoria,
+            'valor': str(valor),
+            'descricao': descricao,
+        }))
+        total += 1
+        if len(bloco) == TAMANHO_BLOCO:
+            if progresso:
+                progresso(total)
+            yield '\n'.join(bloco) + '\n'
+            bloco = []
+    if progresso:
+        progresso(total)
+    if bloco:
+        yield '\n'.join(bloco) + '\n'
+
+
+FORMATOS = {
+    'csv': (blocos_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (blocos_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
+
+
+def exportar(queryset, formato, arquivadas=None, progresso=None):
+    """
+    Retorna ``(blocos, content_type)`` para o ``formato`` pedido.
+    ``arquivadas`` são as transações arquivadas a incluir, em ordem
+    decrescente de data e id.
+    """
+    try:
+        gerador, content_type = FORMATOS[formato]
+    except KeyError:
+        raise ValueError(f"Formato inválido. Opções: {', '.join(FORMATOS)}.")
+    return gerador(queryset, arquivadas, progresso), content_type
@@ -0,0 +1,17 @@
+from django_filters import rest_framework as filters # type: ignore
+from transactions.models import Transaction
+
+
+class TransacaoFiltro(filters.FilterSet):
+    """
+    Filtros avançados de transações, compartilhados pela listagem filtrada,
+    pela exportação e pelos relatórios de transações.
+    """
+    class Meta:
+        model = Transaction
+        fields = {
+            'amount': ['gte', 'lte'],  # Faixa de valores
+            'date': ['gte', 'lte'],  # Faixa de datas
+            'transaction_type': ['exact'],
+            'category': ['exact'],
+        }
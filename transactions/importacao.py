@@ -0,0 +1,231 @@
+"""
+Importação em lote de transações a partir de arquivos CSV.
+
+O arquivo é lido em fluxo, linha a linha, sem nunca ser carregado inteiro na
+memória. As linhas válidas são acumuladas em lotes e gravadas com
+``bulk_create``; as inválidas são rejeitadas com o número da linha e o motivo.
+"""
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from accounts.shards import atomico_do_usuario
+from transactions.models import Category, Transaction
+from transactions.signals import Movimento, emitir_movimentos
+
+
+TAMANHO_LOTE_PADRAO = 5000
+LIMITE_REJEICOES = 1000
+COLUNAS_OBRIGATORIAS = ('tipo', 'valor', 'data')
+VALOR_MAXIMO = Decimal('10') ** 13
+CENTAVO = Decimal('0.01')
+
+TIPOS = {
+    'receita': 'income',
+    'income': 'income',
+    'despesa': 'expense',
+    'expense': 'expense',
+}
+
+
+class ErroImportacao(Exception):
+    """
+    Erro que impede a importação do arquivo como um todo (ex.: cabeçalho inválido).
+    """
+
+
+class ImportacaoInterrompida(Exception):
+    """
+    Falha na gravação de um lote no modo por lote. ``resultado`` traz o que
+    já foi confirmado, com ``ultima_linha_gravada`` para retomar.
+    """
+    def __init__(self, mensagem, resultado):
+        super().__init__(mensagem)
+        self.resultado = resultado
+
+
+class LinhaInvalida(Exception):
+    """
+    Erro de validação de uma única linha do arquivo.
+    """
+
+
+@dataclass
+class ResultadoImportacao:
+    """
+    Resumo de uma importação: totais, rejeições e vazão.
+    """
+    importadas: int = 0
+    total_rejeitadas: int = 0
+    rejeitadas: list = field(default_factory=list)
+    ultima_linha_gravada: int = 0
+    duracao: float = 0.0
+
+    @property
+    def linhas_por_segundo(self):
+        if not self.duracao:
+            return 0.0
+        return (self.importadas + self.total_rejeitadas) / self.duracao
+
+    def rejeitar(self, linha, erro):
+        self.total_rejeitadas += 1
+        if len(self.rejeitadas) < LIMITE_REJEICOES:
+            self.rejeitadas.append({'linha': linha, 'erro': erro})
+
+    def como_dict(self):
+        return {
+            'importadas': self.importadas,
+            'total_rejeitadas': self.total_rejeitadas,
+            'rejeitadas': self.rejeitadas,
+            'ultima_linha_gravada': self.ultima_linha_gravada,
+            'duracao_segundos': round(self.duracao, 3),
+            'linhas_por_segundo': round(self.linhas_por_segundo, 1),
+        }
+
+
+def converter_valor(texto):
+    """
+    Converte o valor do CSV diretamente para ``Decimal``.
+    Aceita tanto ``1234.56`` quanto o formato brasileiro ``1.234,56``.
+    """
+    texto = (texto or '').strip().replace('R$', '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        raise LinhaInvalida(f"Valor inválido: '{texto}'.")
+    if not valor.is_finite():
+        raise LinhaInvalida(f"Valor inválido: '{texto}'.")
+    if valor != valor.quantize(CENTAVO):
+        raise LinhaInvalida("O valor deve ter no máximo duas casas decimais.")
+    if valor <= 0:
+        raise LinhaInvalida("O valor da transação deve ser positivo.")
+    if valor >= VALOR_MAXIMO:
+        raise LinhaInvalida("O valor excede o limite permitido.")
+    return valor.quantize(CENTAVO)
+
+
+def converter_data(texto):
+    """
+    Converte a data do CSV, aceitando ``AAAA-MM-DD`` ou ``DD/MM/AAAA``.
+    """
+    texto = (texto or '').strip()
+    try:
+        if '/' in texto:
+            return datetime.strptime(texto, '%d/%m/%Y').date()
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise LinhaInvalida(f"Data inválida: '{texto}'.")
+
+
+class ImportadorCSV:
+    """
+    Importa transações de um CSV com as colunas ``tipo``, ``valor``, ``data``,
+    ``descricao`` e ``categoria`` (nome de uma ``Category`` existente).
+
+    Com ``atomico=True`` o arquivo inteiro é gravado em uma única transação:
+    ou tudo entra, ou nada entra. Com ``atomico=False`` cada lote é confirmado
+    separadamente e ``ultima_linha_gravada`` indica de onde retomar, passando-a
+    como ``linha_inicial`` numa nova chamada; se um lote falhar, o erro vem
+    como ``ImportacaoInterrompida`` com o resultado parcial.
+    """
+
+    def __init__(self, usuario, tamanho_lote=TAMANHO_LOTE_PADRAO, atomico=True, linha_inicial=0):
+        if tamanho_lote <= 0:
+            raise ErroImportacao("O tamanho do lote deve ser positivo.")
+        self.usuario = usuario
+        self.tamanho_lote = tamanho_lote
+        self.atomico = atomico
+        self.linha_inicial = linha_inicial
+        self.categorias = {
+            nome.casefold(): (pk, tipo)
+            for pk, nome, tipo in Category.objects.values_list('pk', 'name', 'type')
+        }
+
+    def importar(self, arquivo):
+        """
+        Importa o conteúdo de ``arquivo`` (binário ou texto) e retorna um
+        ``ResultadoImportacao``.
+        """
+        inicio = time.perf_counter()
+        resultado = ResultadoImportacao(ultima_linha_gravada=self.linha_inicial)
+        texto = self._abrir_texto(arquivo)
+        try:
+            if self.atomico:
+                with atomico_do_usuario(self.usuario.pk):
+                    self._processar(texto, resultado)
+            else:
+                try:
+                    self._processar(texto, resultado)
+                except ErroImportacao:
+                    raise
+                except Exception as erro:
+                    resultado.duracao = time.perf_counter() - inicio
+                    raise ImportacaoInterrompida(str(erro), resultado) from erro
+        finally:
+            if texto is not arquivo:
+                texto.detach()
+        resultado.duracao = time.perf_counter() - inicio
+        return resultado
+
+    def _abrir_texto(self, arquivo):
+        if isinstance(arquivo, io.TextIOBase):
+            return arquivo
+        bruto = getattr(arquivo, 'file', arquivo)
+        return io.TextIOWrapper(bruto, encoding='utf-8-sig', newline='')
+
+    def _processar(self, texto, resultado):
+        leitor = csv.DictReader(texto)
+        faltantes = [c for c in COLUNAS_OBRIGATORIAS if c not in (leitor.fieldnames or [])]
+        if faltantes:
+            raise ErroImportacao(f"Colunas obrigatórias ausentes: {', '.join(faltantes)}.")
+
+        lote = []
+        for linha in leitor:
+            numero = leitor.line_num
+            if numero <= self.linha_inicial:
+                continue
+            try:
+                lote.append(self._montar(linha))
+            except LinhaInvalida as erro:
+                resultado.rejeitar(numero, str(erro))
+            if len(lote) >= self.tamanho_lote:
+                self._gravar(lote, resultado, numero)
+                lote = []
+        self._gravar(lote, resultado, leitor.line_num)
+
+    def _montar(self, linha):
+        tipo = TIPOS.get((linha.get('tipo') or '').strip().lower())
+        if tipo is None:
+            raise LinhaInvalida(f"Tipo inválido: '{linha.get('tipo')}'.")
+
+        categoria_id = None
+        nome_categoria = (linha.get('categoria') or '').strip()
+        if nome_categoria:
+            try:
+                categoria_id, tipo_categoria = self.categorias[nome_categoria.casefold()]
+            except KeyError:
+                raise LinhaInvalida(f"Categoria inexistente: '{nome_categoria}'.")
+            if tipo_categoria != tipo:
+                raise LinhaInvalida("O tipo da transação não corresponde ao tipo da categoria.")
+
+        return Transaction(
+            user=self.usuario,
+            transaction_type=tipo,
+            amount=converter_valor(linha.get('valor')),
+            date=converter_data(linha.get('data')),
+            description=linha.get('descricao') or None,
+            category_id=categoria_id,
+        )
+
+    def _gravar(self, lote, resultado, ultima_linha):
+        if lote:
+            with atomico_do_usuario(self.usuario.pk):
+                Transaction.objects.bulk_create(lote)
+                emitir_movimentos(Movimento.de(t) for t in lote)
+            resultado.importadas += len(lote)
+        resultado.ultima_linha_gravada = max(resultado.ultima_linha_gravada, ultima_linha)
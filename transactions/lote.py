@@ -0,0 +1,299 @@
+"""
+Operações em lote sobre transações (inclusões, alterações e exclusões).
+
+Um lote é uma lista de operações no formato::
+
+    {"op": "criar", "dados": {"transaction_type": "expense", "amount": "10.50", "date": "2024-05-01"}}
+    {"op": "atualizar", "id": 42, "dados": {"amount": "12.00"}}
+    {"op": "excluir", "id": 43}
+
+A validação é feita para o lote inteiro com uma consulta para as categorias e
+outra para as transações referenciadas; a gravação usa ``bulk_create``,
+``bulk_update`` e um único ``DELETE``, dentro de uma transação, e os
+movimentos de todas as operações são emitidos de uma vez.
+
+Com ``Idempotency-Key``, a resposta do lote fica guardada em
+``ChaveIdempotencia`` na mesma transação da gravação: um reenvio com a mesma
+chave recebe a resposta original, e um reenvio simultâneo espera o primeiro
+terminar em vez de aplicar o lote duas vezes. A chave vale por
+``IDEMPOTENCIA_VALIDADE_HORAS``; vencida, é descartada no próximo envio e
+removida por ``expurgar_chaves_vencidas``.
+"""
+import hashlib
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from accounts.shards import atomico_do_usuario, bancos_de_usuarios
+
+from transactions.importacao import TIPOS, LinhaInvalida, converter_data, converter_valor
+from transactions.models import Category, ChaveIdempotencia, Transaction
+from transactions.signals import Movimento, emitir_movimentos, movimentos_suspensos
+
+
+LIMITE_OPERACOES = 5000
+OPERACOES = ('criar', 'atualizar', 'excluir')
+CAMPOS = ('transaction_type', 'amount', 'date', 'category', 'description')
+
+
+class ErroLote(Exception):
+    """
+    Erro que impede o processamento do lote como um todo.
+    """
+
+
+class ChaveReutilizada(ErroLote):
+    """
+    A ``Idempotency-Key`` já foi usada com um lote (ou modo) diferente.
+    """
+
+
+@dataclass
+class ResultadoLote:
+    """
+    Resultado por operação, na ordem em que foram enviadas.
+    """
+    resultados: list = field(default_factory=list)
+    aplicado: bool = False
+
+    @property
+    def erros(self):
+        return sum(1 for r in self.resultados if r['status'] == 'erro')
+
+    def como_dict(self):
+        contagem = {op: 0 for op in ('criada', 'atualizada', 'excluida')}
+        for resultado in self.resultados:
+            if resultado['status'] in contagem:
+                contagem[resultado['status']] += 1
+        return {
+            'aplicado': self.aplicado,
+            'criadas': contagem['criada'],
+            'atualizadas': contagem['atualizada'],
+            'excluidas': contagem['excluida'],
+            'erros': self.erros,
+            'resultados': self.resultados,
+        }
+
+
+class LoteTransacoes:
+    """
+    Valida e aplica um lote de operações do ``usuario``.
+
+    Com ``atomico=True`` (padrão), um único erro de validação impede a
+    gravação do lote inteiro; com ``atomico=False``, as operações válidas são
+    gravadas e as inválidas aparecem com ``status: erro``.
+    """
+
+    def __init__(self, usuario, atomico=True):
+        self.usuario = usuario
+        self.atomico = atomico
+
+    def aplicar(self, operacoes):
+        if not isinstance(operacoes, list):
+            raise ErroLote("O lote deve ser uma lista de operações.")
+        if len(operacoes) > LIMITE_OPERACOES:
+            raise ErroLote(f"O lote excede o limite de {LIMITE_OPERACOES} operações.")
+
+        existentes = self._carregar(operacoes)
+        resultado = ResultadoLote()
+        criar, atualizar, excluir = [], [], []
+        vistos = set()
+        for indice, operacao in enumerate(operacoes):
+            item = {'indice': indice, 'op': operacao.get('op') if isinstance(operacao, dict) else None}
+            try:
+                tipo, transacao = self._validar(operacao, existentes, vistos)
+            except LinhaInvalida as erro:
+                item.update(status='erro', erro=str(erro))
+            else:
+                {'criar': criar, 'atualizar': atualizar, 'excluir': excluir}[tipo].append((item, transacao))
+                item['status'] = 'valida'
+            resultado.resultados.append(item)
+
+        if resultado.erros and self.atomico:
+            return resultado
+        self._gravar(criar, atualizar, excluir, existentes)
+        resultado.aplicado = True
+        return resultado
+
+    def _carregar(self, operacoes):
+        """
+        Busca de uma vez as transações referenciadas (com o estado atual, para
+        os movimentos) e as categorias usadas no lote.
+        """
+        ids, categorias = set(), set()
+        for operacao in operacoes:
+            if not isinstance(operacao, dict):
+                continue
+            if isinstance(operacao.get('id'), int):
+                ids.add(operacao['id'])
+            dados = operacao.get('dados')
+            if isinstance(dados, dict) and isinstance(dados.get('category'), int):
+                categorias.add(dados['category'])
+        existentes = Transaction.objects.filter(user=self.usuario, pk__in=ids).in_bulk()
+        categorias.update(t.category_id for t in existentes.values() if t.category_id is not None)
+        self.categorias = dict(Category.objects.filter(pk__in=categorias).values_list('pk', 'type'))
+        return existentes
+
+    def _validar(self, operacao, existentes, vistos):
+        if not isinstance(operacao, dict):
+            raise LinhaInvalida("A operação deve ser um objeto.")
+        tipo = operacao.get('op')
+        if tipo not in OPERACOES:
+            raise LinhaInvalida(f"Operação inválida. Opções: {', '.join(OPERACOES)}.")
+
+        if tipo == 'criar':
+            return tipo, self._montar(Transaction(user=self.usuario), operacao.get('dados'), parcial=False)
+
+        pk = operacao.get('id')
+        if pk not in existentes:
+            raise LinhaInvalida(f"Transação não encontrada: {pk!r}.")
+        if pk in vistos:
+            raise LinhaInvalida(f"A transação {pk} aparece em mais de uma operação do lote.")
+        vistos.add(pk)
+        if tipo == 'excluir':
+            return tipo, existentes[pk]
+
+        atual = existentes[pk]
+        copia = Transaction(**{f.attname: getattr(atual, f.attname) for f in Transaction._meta.concrete_fields})
+        copia._state.adding = False
+        return tipo, self._montar(copia, operacao.get('dados'), parcial=True)
+
+    def _montar(self, transacao, dados, parcial):
+        if not isinstance(dados, dict) or not dados:
+            raise LinhaInvalida("Informe os campos da transação em 'dados'.")
+        desconhecidos = set(dados) - set(CAMPOS)
+        if desconhecidos:
+            raise LinhaInvalida(f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}.")
+        if not parcial:
+            faltantes = [c for c in ('transaction_type', 'amount', 'date') if dados.get(c) in (None, '')]
+            if faltantes:
+                raise LinhaInvalida(f"Campos obrigatórios ausentes: {', '.join(faltantes)}.")
+
+        if 'transaction_type' in dados:
+            transacao.transaction_type = TIPOS.get(str(dados['transaction_type']).strip().lower())
+            if transacao.transaction_type is None:
+                raise LinhaInvalida(f"Tipo inválido: '{dados['transaction_type']}'.")
+        if 'amount' in dados:
+            transacao.amount = converter_valor(str(dados['amount']))
+        if 'date' in dados:
+            transacao.date = converter_data(str(dados['date']))
+        if 'description' in dados:
+            transacao.description = dados['description'] or None
+        if 'category' in dados:
+            if dados['category'] is not None and dados['category'] not in self.categorias:
+                raise LinhaInvalida(f"Categoria inexistente: {dados['category']!r}.")
+            transacao.category_id = dados['category']
+
+        if transacao.category_id is not None and self.categorias[transacao.category_id] != transacao.transaction_type:
+            raise LinhaInvalida("O tipo da transação não corresponde ao tipo da categoria.")
+        return transacao
+
+    def _gravar(self, criar, atualizar, excluir, existentes):
+        agora = timezone.now()
+        movimentos = []
+        with atomico_do_usuario(self.usuario.pk):
+            if criar:
+                novas = Transaction.objects.bulk_create([t for _, t in criar])
+                for (item, _), nova in zip(criar, novas):
+                    item.update(status='criada', id=nova.pk)
+                movimentos.extend(Movimento.de(t) for t in novas)
+            if atualizar:
+                for item, nova in atualizar:
+                    nova.updated_at = agora
+                    item.update(status='atualizada', id=nova.pk)
+                    movimentos.extend([Movimento.de(existentes[nova.pk], -1), Movimento.de(nova)])
+                Transaction.objects.bulk_update(
+                    [t for _, t in atualizar],
+                    ['transaction_type', 'amount', 'date', 'category', 'description', 'updated_at'],
+                    batch_size=1000,
+                )
+            if excluir:
+                for item, antiga in excluir:
+                    item.update(status='excluida', id=antiga.pk)
+                    movimentos.append(Movimento.de(antiga, -1))
+                with movimentos_suspensos():
+                    Transaction.objects.filter(pk__in=[t.pk for _, t in excluir]).delete()
+            emitir_movimentos(movimentos)
+
+
+def assinatura(corpo, atomico=True):
+    """
+    Hash do que define o resultado do lote: o corpo e o modo (``atomico``).
+    """
+    return hashlib.sha256(b'atomico:%d\n' % atomico + corpo).hexdigest()
+
+
+def aplicar_lote(usuario, operacoes, atomico=True, chave=None, corpo=b''):
+    """
+    Aplica o lote e retorna ``(resposta, codigo_status, repetido)``. Com
+    ``chave``, um lote já aplicado com a mesma chave não é reaplicado: a
+    resposta guardada é devolvida com ``repetido=True``.
+    """
+    if not chave:
+        return (*_processar(usuario, operacoes, atomico), False)
+
+    hash_corpo = assinatura(corpo, atomico)
+    guardada = _resposta_guardada(usuario, chave, hash_corpo)
+    if guardada:
+        return (*guardada, True)
+    try:
+        with atomico_do_usuario(usuario.pk) as banco:
+            try:
+                with transaction.atomic(using=banco):
+                    registro = ChaveIdempotencia.objects.create(user=usuario, chave=chave, assinatura=hash_corpo)
+            except IntegrityError:
+                # Outro envio com a mesma chave terminou enquanto esperávamos.
+                raise _ChaveEmUso
+            resposta, codigo = _processar(usuario, operacoes, atomico)
+            registro.resposta, registro.codigo_status = resposta, codigo
+            registro.save(update_fields=['resposta', 'codigo_status'])
+    except _ChaveEmUso:
+        return (*_resposta_guardada(usuario, chave, hash_corpo), True)
+    return resposta, codigo, False
+
+
+class _ChaveEmUso(Exception):
+    pass
+
+
+def _limite_validade(agora=None):
+    return (agora or timezone.now()) - timedelta(hours=settings.IDEMPOTENCIA_VALIDADE_HORAS)
+
+
+def _resposta_guardada(usuario, chave, hash_corpo):
+    registro = ChaveIdempotencia.objects.filter(user=usuario, chave=chave).first()
+    if registro is None:
+        return None
+    if registro.created_at < _limite_validade():
+        # Chave vencida: o envio é tratado como novo.
+        registro.delete()
+        return None
+    if registro.assinatura != hash_corpo:
+        raise ChaveReutilizada("Esta Idempotency-Key já foi usada com um lote ou modo diferente.")
+    return registro.resposta, registro.codigo_status
+
+
+def expurgar_chaves_vencidas(agora=None):
+    """
+    Remove, do banco principal e dos shards, as chaves de idempotência criadas
+    há mais de ``IDEMPOTENCIA_VALIDADE_HORAS``. Retorna quantas foram removidas.
+    """
+    limite = _limite_validade(agora)
+    removidas = 0
+    for banco in bancos_de_usuarios():
+        removidas += ChaveIdempotencia.objects.using(banco).filter(created_at__lt=limite).delete()[0]
+    return removidas
+
+
+def _processar(usuario, operacoes, atomico):
+    resultado = LoteTransacoes(usuario, atomico=atomico).aplicar(operacoes)
+    if not resultado.aplicado:
+        codigo = 400
+    elif resultado.erros:
+        codigo = 207
+    else:
+        codigo = 200
+    return resultado.como_dict(), codigo
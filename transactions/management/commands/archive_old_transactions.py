@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions.arquivo import anos_a_arquivar, arquivar_ano
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as transações de anos antigos para segmentos arquivados "
+        "compactados (um por usuário e ano)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anos', type=int, default=5,
+                            help="Mantém na tabela principal os últimos N anos encerrados (padrão: 5).")
+        parser.add_argument('--usuarios', type=int, nargs='*',
+                            help="IDs dos usuários a arquivar (padrão: todos).")
+        parser.add_argument('--pausa', type=float, default=0.0,
+                            help="Segundos de espera entre um segmento e o próximo.")
+
+    def handle(self, *args, **opcoes):
+        antes_do_ano = timezone.localdate().year - opcoes['anos']
+        total = 0
+        for user_id, ano in anos_a_arquivar(antes_do_ano, opcoes['usuarios']):
+            movidas = arquivar_ano(user_id, ano)
+            total += movidas
+            self.stdout.write(f"Usuário {user_id}, {ano}: {movidas} transações arquivadas.")
+            if opcoes['pausa']:
+                time.sleep(opcoes['pausa'])
+        self.stdout.write(self.style.SUCCESS(f"{total} transações arquivadas."))
@@ -0,0 +1,147 @@
+import json
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.crypto import get_random_string
+
+from transactions.bench import (
+    banco_descartavel, medir_requisicoes, semear_categorias, semear_dividas, semear_metas,
+    semear_transacoes, semear_usuarios, servidor_local,
+)
+from transactions.carga import comparar, gerar_carga
+from transactions.models import Transaction
+
+
+def requisicoes_do_usuario(usuario, categoria_despesa):
+    """
+    Requisições medidas para um usuário, por endpoint de ``transactions/views.py``.
+    """
+    transacao = Transaction.objects.filter(user=usuario).order_by('pk').values_list('pk', flat=True).first()
+    return {
+        'listagem': ('GET', '/api/transacoes/?tamanho=50', None),
+        'listagem_ordenada': ('GET', '/api/transacoes/?ordering=amount&tamanho=50', None),
+        'filtro': ('GET', '/api/transacoes/filtrar/?amount__gte=100&date__gte=2020-01-01&tamanho=50', None),
+        'relatorio': ('GET', '/api/transacoes/relatorio/?agrupar=categoria,mes', None),
+        'detalhe': ('GET', f'/api/transacoes/{transacao}/', None),
+        'criacao': ('POST', '/api/transacoes/', {
+            'transaction_type': 'expense', 'amount': '12.34', 'date': date.today().isoformat(),
+            'category': categoria_despesa.pk, 'user': usuario.pk, 'description': 'Benchmark',
+        }),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Semeia um banco descartável e mede os endpoints de transações pelo cliente "
+        "de testes e por HTTP com vários processos, em JSON (p50/p95/p99, "
+        "requisições por segundo e consultas por requisição)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20)
+        parser.add_argument('--categorias', type=int, default=8)
+        parser.add_argument('--transacoes', type=int, default=2000,
+                            help="Transações por usuário.")
+        parser.add_argument('--dividas', type=int, default=200)
+        parser.add_argument('--metas', type=int, default=200)
+        parser.add_argument('--requisicoes', type=int, default=200,
+                            help="Requisições por endpoint e modo.")
+        parser.add_argument('--processos', type=int, default=4,
+                            help="Processos do gerador de carga HTTP.")
+        parser.add_argument('--modo', choices=['cliente', 'http', 'ambos'], default='ambos')
+        parser.add_argument('--endpoints', nargs='*',
+                            help="Endpoints a medir (padrão: todos).")
+        parser.add_argument('--base', help="JSON de uma execução anterior para comparação.")
+        parser.add_argument('--tolerancia', type=float, default=0.10,
+                            help="Variação aceita em relação à base (padrão: 0.10).")
+        parser.add_argument('--falhar-em-regressao', action='store_true',
+                            help="Termina com erro se algum endpoint regredir em relação à base.")
+        parser.add_argument('--saida', help="Grava o JSON também neste arquivo.")
+
+    def handle(self, *args, **opcoes):
+        base = None
+        if opcoes['base']:
+            with open(opcoes['base'], encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+
+        hosts = ['testserver', '127.0.0.1', 'localhost']
+        with banco_descartavel(), override_settings(ALLOWED_HOSTS=hosts):
+            usuarios = semear_usuarios(opcoes['usuarios'])
+            categorias = semear_categorias(opcoes['categorias'])
+            for usuario in usuarios:
+                semear_transacoes(usuario, opcoes['transacoes'], categorias, semente=usuario.pk)
+            semear_dividas(usuarios, opcoes['dividas'])
+            semear_metas(usuarios, opcoes['metas'])
+
+            amostra = usuarios[:10]
+            despesa = next(c for c in categorias if c.type == 'expense')
+            por_usuario = [requisicoes_do_usuario(usuario, despesa) for usuario in amostra]
+            endpoints = opcoes['endpoints'] or list(por_usuario[0])
+            desconhecidos = set(endpoints) - set(por_usuario[0])
+            if desconhecidos:
+                raise CommandError(f"Endpoints desconhecidos: {', '.join(sorted(desconhecidos))}.")
+
+            resultados = {}
+            if opcoes['modo'] in ('cliente', 'ambos'):
+                resultados['cliente'] = self._medir_cliente(amostra, por_usuario, endpoints, opcoes)
+            if opcoes['modo'] in ('http', 'ambos'):
+                resultados['http'] = self._medir_http(amostra, por_usuario, endpoints, opcoes)
+
+        saida = {
+            'configuracao': {
+                chave: opcoes[chave]
+                for chave in ('usuarios', 'categorias', 'transacoes', 'dividas', 'metas', 'requisicoes', 'processos')
+            },
+            'resultados': resultados,
+        }
+        if base is not None:
+            saida['comparacao'] = comparar(saida, base, opcoes['tolerancia'])
+
+        texto = json.dumps(saida, indent=2)
+        if opcoes['saida']:
+            os.makedirs(os.path.dirname(opcoes['saida']) or '.', exist_ok=True)
+            with open(opcoes['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto)
+        self.stdout.write(texto)
+        if base is not None and opcoes['falhar_em_regressao'] and saida['comparacao']['regressoes']:
+            raise CommandError(f"Regressões: {', '.join(saida['comparacao']['regressoes'])}.")
+
+    def _medir_cliente(self, usuarios, por_usuario, endpoints, opcoes):
+        clientes = []
+        for usuario in usuarios:
+            cliente = Client()
+            cliente.force_login(usuario)
+            clientes.append(cliente)
+        return {
+            nome: medir_requisicoes(clientes, [[requisicoes[nome]] for requisicoes in por_usuario], opcoes['requisicoes'])
+            for nome in endpoints
+        }
+
+    def _medir_http(self, usuarios, por_usuario, endpoints, opcoes):
+        cabecalhos = []
+        for usuario in usuarios:
+            cliente = Client()
+            cliente.force_login(usuario)
+            # SessionAuthentication exige CSRF nos POSTs; qualquer segredo
+            # serve desde que o cookie e o cabeçalho coincidam.
+            token = get_random_string(32)
+            cabecalhos.append({
+                'Cookie': f"sessionid={cliente.cookies['sessionid'].value}; csrftoken={token}",
+                'X-CSRFToken': token,
+                'Content-Type': 'application/json',
+            })
+
+        processos = opcoes['processos']
+        parcela, sobra = divmod(opcoes['requisicoes'], processos)
+        resultados = {}
+        with servidor_local() as url_base:
+            for nome in endpoints:
+                trabalhos = [
+                    ([por_usuario[i % len(usuarios)][nome]], cabecalhos[i % len(usuarios)], parcela + (i < sobra))
+                    for i in range(processos)
+                ]
+                resultados[nome] = gerar_carga(url_base, trabalhos, processos)
+        return resultados
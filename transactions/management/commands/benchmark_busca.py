@@ -0,0 +1,88 @@
+import json
+import statistics
+import time
+from functools import reduce
+from operator import and_
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from transactions.bench import banco_descartavel, semear_transacoes
+from transactions.busca import buscar, indice_disponivel
+from transactions.models import Category, Transaction
+
+
+LOJAS = [
+    'Pão de Açúcar', 'Farmácia São João', 'Posto Ipiranga', 'Padaria Estrela', 'Uber viagem',
+    'Restaurante Sabor Caseiro', 'Conta de luz', 'Aluguel apartamento', 'Academia Fórmula',
+    'Livraria Cultura', 'Mercado Extra', 'Açougue Boi Gordo', 'Cinema Itaú', 'Pet shop Cãopanheiro',
+]
+TERMOS = ['farmacia', 'pão', 'acucar', 'posto ipiranga', 'mercado 42', 'cãopanheiro']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a busca de transações pelo índice textual (transactions/busca.py) "
+        "com o LIKE do SearchFilter, em um banco descartável: tempo da primeira "
+        "página e da contagem de cada termo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000)
+        parser.add_argument('--termos', nargs='+', default=TERMOS)
+        parser.add_argument('--repeticoes', type=int, default=5,
+                            help="Execuções de cada consulta; vale a mediana.")
+
+    def handle(self, *args, **opcoes):
+        if opcoes['linhas'] < 1 or opcoes['repeticoes'] < 1:
+            raise CommandError("--linhas e --repeticoes devem ser positivos.")
+
+        descricoes = [f"{loja} {numero}" for loja in LOJAS for numero in range(1, 101)]
+        with banco_descartavel() as conexao:
+            if not indice_disponivel(conexao.alias):
+                raise CommandError("O banco não tem o índice de busca (requer SQLite com FTS5 ou PostgreSQL).")
+            categorias = [
+                Category.objects.create(name='Salário', type='income'),
+                Category.objects.create(name='Mercado', type='expense'),
+                Category.objects.create(name='Saúde', type='expense'),
+            ]
+            usuario = User.objects.create_user('benchmark')
+            inicio = time.perf_counter()
+            semear_transacoes(usuario, opcoes['linhas'], categorias, descricoes=descricoes)
+            semeadura = time.perf_counter() - inicio
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            transacoes = Transaction.objects.filter(user=usuario).order_by('-date', '-id')
+            resultados = {}
+            for termo in opcoes['termos']:
+                palavras = termo.split()
+                caminhos = {
+                    'like': transacoes.filter(reduce(and_, (
+                        Q(description__icontains=p) | Q(category__name__icontains=p) for p in palavras
+                    ))),
+                    'indice': buscar(transacoes, palavras),
+                }
+                resultados[termo] = {}
+                for nome, consulta in caminhos.items():
+                    pagina = [self._medir(lambda: list(consulta[:50])) for _ in range(opcoes['repeticoes'])]
+                    contagem = [self._medir(consulta.count) for _ in range(opcoes['repeticoes'])]
+                    resultados[termo][nome] = {
+                        'encontradas': consulta.count(),
+                        'pagina_ms': round(statistics.median(pagina), 2),
+                        'contagem_ms': round(statistics.median(contagem), 2),
+                    }
+
+        self.stdout.write(json.dumps({
+            'linhas': opcoes['linhas'],
+            'banco': connection.vendor,
+            'semeadura_linhas_por_segundo': round(opcoes['linhas'] / semeadura),
+            'resultados': resultados,
+        }, indent=2, ensure_ascii=False))
+
+    def _medir(self, funcao):
+        inicio = time.perf_counter()
+        funcao()
+        return (time.perf_counter() - inicio) * 1000
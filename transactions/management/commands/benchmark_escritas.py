@@ -0,0 +1,81 @@
+import json
+import multiprocessing
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from setup.bancos import PERFIS, perfil_banco
+from transactions import escritas
+from transactions.bench import alias_temporario, banco_descartavel
+from transactions.carga import percentis
+from transactions.models import Category
+
+
+ALIAS = 'benchmark_escritas'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a vazão de escrita dos perfis de banco (setup/bancos.py) com N "
+        "processos criando transações ao mesmo tempo, cada um em um banco "
+        "descartável, em JSON (escritas por segundo, erros e p50/p95/p99)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfis', nargs='+', choices=PERFIS, default=['sqlite_padrao', 'sqlite'])
+        parser.add_argument('--escritores', type=int, default=4,
+                            help="Processos escrevendo ao mesmo tempo.")
+        parser.add_argument('--escritas', type=int, default=200,
+                            help="Transações criadas por processo.")
+
+    def handle(self, *args, **opcoes):
+        if opcoes['escritores'] < 1 or opcoes['escritas'] < 1:
+            raise CommandError("--escritores e --escritas devem ser positivos.")
+
+        resultados = {}
+        for perfil in opcoes['perfis']:
+            try:
+                resultados[perfil] = self._medir(perfil, opcoes['escritores'], opcoes['escritas'])
+            except (ImproperlyConfigured, DatabaseError) as erro:
+                # Perfil sem servidor ou sem driver instalado (psycopg).
+                resultados[perfil] = {'erro': str(erro)}
+
+        self.stdout.write(json.dumps({
+            'configuracao': {'escritores': opcoes['escritores'], 'escritas': opcoes['escritas']},
+            'resultados': resultados,
+        }, indent=2))
+
+    def _medir(self, perfil, escritores, escritas_por_processo):
+        with alias_temporario(ALIAS, perfil_banco(perfil)), banco_descartavel(ALIAS) as conexao:
+            usuarios = User.objects.using(ALIAS).bulk_create([
+                User(username=f"escritor{i}", password='!') for i in range(escritores)
+            ])
+            categoria = Category.objects.using(ALIAS).create(name='Benchmark', type='expense')
+            nome_banco = conexao.settings_dict['NAME']
+            # Os processos abrem o arquivo por conta própria; a conexão deste
+            # processo não deve segurar bloqueios durante a medição.
+            conexao.close()
+
+            contexto = multiprocessing.get_context('spawn')
+            with contexto.Pool(escritores, initializer=escritas.preparar, initargs=(perfil, nome_banco)) as pool:
+                trabalhos = [(usuario.pk, categoria.pk) for usuario in usuarios]
+                # Aquecimento: a inicialização do Django nos processos fica
+                # fora da medição.
+                pool.starmap(escritas.escrever, [(*trabalho, 1) for trabalho in trabalhos])
+                inicio = time.perf_counter()
+                parciais = pool.starmap(
+                    escritas.escrever, [(*trabalho, escritas_por_processo) for trabalho in trabalhos]
+                )
+                duracao = time.perf_counter() - inicio
+
+        tempos = [tempo for parcial, _ in parciais for tempo in parcial]
+        erros = sum(erros for _, erros in parciais)
+        return {
+            'escritas': len(tempos) - erros,
+            'erros': erros,
+            'escritas_por_segundo': round((len(tempos) - erros) / duracao, 1) if duracao else None,
+            **percentis(tempos),
+        }
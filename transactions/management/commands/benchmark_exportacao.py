@@ -0,0 +1,48 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from transactions.bench import banco_descartavel, pico_memoria_mb, semear_transacoes
+from transactions.models import Category
+
+
+class Command(BaseCommand):
+    help = "Mede vazão (MB/s) e pico de RSS da exportação em fluxo de transações."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000)
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], default='csv')
+
+    def handle(self, *args, **opcoes):
+        with banco_descartavel(), override_settings(ALLOWED_HOSTS=['testserver']):
+            categorias = [
+                Category.objects.create(name='Salário', type='income'),
+                Category.objects.create(name='Mercado', type='expense'),
+            ]
+            usuario = User.objects.create_user('benchmark')
+            semear_transacoes(usuario, opcoes['linhas'], categorias)
+
+            cliente = Client()
+            cliente.force_login(usuario)
+            memoria_antes = pico_memoria_mb()
+            inicio = time.perf_counter()
+            resposta = cliente.get(f"/api/transacoes/exportar/?formato={opcoes['formato']}")
+            total_bytes = sum(len(bloco) for bloco in resposta.streaming_content)
+            duracao = time.perf_counter() - inicio
+            memoria_depois = pico_memoria_mb()
+
+        megabytes = total_bytes / 1024 / 1024
+        self.stdout.write(json.dumps({
+            'linhas': opcoes['linhas'],
+            'formato': opcoes['formato'],
+            'megabytes': round(megabytes, 1),
+            'duracao_segundos': round(duracao, 2),
+            'mb_por_segundo': round(megabytes / duracao, 1),
+            'linhas_por_segundo': round(opcoes['linhas'] / duracao),
+            'pico_rss_antes_mb': memoria_antes and round(memoria_antes, 1),
+            'pico_rss_depois_mb': memoria_depois and round(memoria_depois, 1),
+        }, indent=2))
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from transactions.bench import banco_descartavel, gerar_csv_sintetico, pico_memoria_mb
+from transactions.importacao import ImportadorCSV, TAMANHO_LOTE_PADRAO
+from transactions.models import Category, Transaction
+
+
+class Command(BaseCommand):
+    help = "Mede a importação de um CSV sintético em um banco SQLite descartável."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000)
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO)
+        parser.add_argument('--nao-atomico', action='store_true',
+                            help="Confirma cada lote separadamente.")
+
+    def handle(self, *args, **opcoes):
+        categorias = [('Salário', 'income'), ('Mercado', 'expense'), ('Aluguel', 'expense')]
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, 'transacoes.csv')
+            gerar_csv_sintetico(caminho, opcoes['linhas'], categorias)
+            tamanho_mb = os.path.getsize(caminho) / 1024 / 1024
+
+            with banco_descartavel():
+                for nome, tipo in categorias:
+                    Category.objects.create(name=nome, type=tipo)
+                usuario = User.objects.create_user('benchmark')
+
+                memoria_antes = pico_memoria_mb()
+                importador = ImportadorCSV(
+                    usuario,
+                    tamanho_lote=opcoes['lote'],
+                    atomico=not opcoes['nao_atomico'],
+                )
+                with open(caminho, 'rb') as arquivo:
+                    resultado = importador.importar(arquivo)
+                memoria_depois = pico_memoria_mb()
+                gravadas = Transaction.objects.count()
+
+        relatorio = {
+            'linhas': opcoes['linhas'],
+            'arquivo_mb': round(tamanho_mb, 1),
+            'gravadas': gravadas,
+            'rejeitadas': resultado.total_rejeitadas,
+            'duracao_segundos': round(resultado.duracao, 2),
+            'linhas_por_segundo': round(resultado.linhas_por_segundo),
+            'pico_rss_antes_mb': memoria_antes and round(memoria_antes, 1),
+            'pico_rss_depois_mb': memoria_depois and round(memoria_depois, 1),
+        }
+        self.stdout.write(json.dumps(relatorio, indent=2))
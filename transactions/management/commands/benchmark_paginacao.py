@@ -0,0 +1,70 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from transactions.bench import banco_descartavel, semear_transacoes
+from transactions.models import Category, Transaction
+from transactions.paginacao import PaginacaoPorCursor
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o custo de uma página no início, no meio e no fim da listagem, "
+        "com cursor (keyset) e com OFFSET."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000)
+        parser.add_argument('--tamanho', type=int, default=50)
+        parser.add_argument('--repeticoes', type=int, default=20)
+
+    def handle(self, *args, **opcoes):
+        linhas, tamanho = opcoes['linhas'], opcoes['tamanho']
+        with banco_descartavel(), override_settings(ALLOWED_HOSTS=['testserver']):
+            categorias = [
+                Category.objects.create(name='Salário', type='income'),
+                Category.objects.create(name='Mercado', type='expense'),
+            ]
+            usuario = User.objects.create_user('benchmark')
+            semear_transacoes(usuario, linhas, categorias)
+
+            cliente = Client()
+            cliente.force_login(usuario)
+            ordenadas = Transaction.objects.filter(user=usuario).order_by('-date', '-pk')
+            resultado = {'linhas': linhas, 'tamanho_pagina': tamanho, 'paginas': []}
+
+            for fracao in (0, 0.5, 0.99):
+                deslocamento = int(linhas * fracao)
+                url = f'/api/transacoes/?tamanho={tamanho}'
+                if deslocamento:
+                    ancora = ordenadas[deslocamento - 1]
+                    paginador = PaginacaoPorCursor()
+                    paginador.ordenacao = '-date'
+                    url += '&cursor=' + paginador._cursor(ancora, 'date', voltar=False)
+
+                cursor_ms = self._medir(lambda: cliente.get(url), opcoes['repeticoes'])
+                offset_ms = self._medir(
+                    lambda: list(ordenadas[deslocamento:deslocamento + tamanho]),
+                    opcoes['repeticoes'],
+                )
+                resultado['paginas'].append({
+                    'deslocamento': deslocamento,
+                    'cursor_requisicao_ms': cursor_ms,
+                    'offset_consulta_ms': offset_ms,
+                })
+
+        self.stdout.write(json.dumps(resultado, indent=2))
+
+    @staticmethod
+    def _medir(funcao, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return round(statistics.median(tempos), 2)
@@ -0,0 +1,64 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer  # type: ignore
+
+from transactions.bench import banco_descartavel, semear_transacoes
+from transactions.models import Category, Transaction
+from transactions.serializacao import RenderizadorJSONRapido, orjson, serializacao_de
+from transactions.serializers import TransacaoSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a serialização das listagens de transações pelo TransacaoSerializer "
+        "(DRF) e pela SerializacaoRapida, da consulta ao JSON, em linhas por segundo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=50_000)
+        parser.add_argument('--repeticoes', type=int, default=3,
+                            help="Execuções de cada caminho; vale a mais rápida.")
+
+    def handle(self, *args, **opcoes):
+        if opcoes['linhas'] < 1 or opcoes['repeticoes'] < 1:
+            raise CommandError("--linhas e --repeticoes devem ser positivos.")
+
+        with banco_descartavel():
+            categorias = [
+                Category.objects.create(name='Salário', type='income'),
+                Category.objects.create(name='Mercado', type='expense'),
+            ]
+            usuario = User.objects.create_user('benchmark')
+            semear_transacoes(usuario, opcoes['linhas'], categorias)
+            transacoes = Transaction.objects.filter(user=usuario).order_by('-date', '-id')
+            serializacao = serializacao_de(TransacaoSerializer)
+
+            def drf():
+                return JSONRenderer().render(TransacaoSerializer(transacoes, many=True).data)
+
+            def rapido():
+                return RenderizadorJSONRapido().render(serializacao.para_dicts(serializacao.linhas(transacoes)))
+
+            resultados = {}
+            saidas = {}
+            for nome, caminho in (('drf', drf), ('rapido', rapido)):
+                tempos = []
+                for _ in range(opcoes['repeticoes']):
+                    inicio = time.perf_counter()
+                    saidas[nome] = caminho()
+                    tempos.append(time.perf_counter() - inicio)
+                resultados[nome] = {
+                    'duracao_segundos': round(min(tempos), 3),
+                    'linhas_por_segundo': round(opcoes['linhas'] / min(tempos)),
+                }
+
+        self.stdout.write(json.dumps({
+            'linhas': opcoes['linhas'],
+            'orjson': orjson is not None,
+            'saidas_identicas': saidas['drf'] == saidas['rapido'],
+            'resultados': resultados,
+            'aceleracao': round(resultados['drf']['duracao_segundos'] / resultados['rapido']['duracao_segundos'], 1),
+        }, indent=2))
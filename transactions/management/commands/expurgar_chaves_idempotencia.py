@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from transactions.lote import expurgar_chaves_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove as chaves de idempotência dos lotes de transações criadas há mais "
+        "de IDEMPOTENCIA_VALIDADE_HORAS, no banco principal e nos shards."
+    )
+
+    def handle(self, *args, **opcoes):
+        removidas = expurgar_chaves_vencidas()
+        self.stdout.write(self.style.SUCCESS(f"{removidas} chaves de idempotência removidas."))
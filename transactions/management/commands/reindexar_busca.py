@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.shards import bancos_de_usuarios
+from transactions.busca import indice_disponivel, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = (
+        "Refaz o índice de busca textual das transações (transactions/busca.py) "
+        "no banco principal e nos shards."
+    )
+
+    def handle(self, *args, **opcoes):
+        total = 0
+        for banco in bancos_de_usuarios():
+            if not indice_disponivel(banco):
+                self.stdout.write(f"{banco}: sem índice de busca; a busca usa LIKE.")
+                continue
+            with transaction.atomic(using=banco):
+                indexadas = reconstruir_indice(banco)
+            total += indexadas
+            self.stdout.write(f"{banco}: {indexadas} transações indexadas.")
+        self.stdout.write(self.style.SUCCESS(f"{total} transações indexadas."))
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0003_chave_idempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentoArquivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField(verbose_name='Ano')),
+                ('total_receitas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17, verbose_name='Total de Receitas')),
+                ('total_despesas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17, verbose_name='Total de Despesas')),
+                ('quantidade_receitas', models.PositiveIntegerField(default=0, verbose_name='Quantidade de Receitas')),
+                ('quantidade_despesas', models.PositiveIntegerField(default=0, verbose_name='Quantidade de Despesas')),
+                ('menor_receita', models.DecimalField(decimal_places=2, max_digits=15, null=True, verbose_name='Menor Receita')),
+                ('maior_receita', models.DecimalField(decimal_places=2, max_digits=15, null=True, verbose_name='Maior Receita')),
+                ('menor_despesa', models.DecimalField(decimal_places=2, max_digits=15, null=True, verbose_name='Menor Despesa')),
+                ('maior_despesa', models.DecimalField(decimal_places=2, max_digits=15, null=True, verbose_name='Maior Despesa')),
+                ('dados', models.BinaryField(verbose_name='Transações Compactadas')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Segmento Arquivado',
+                'verbose_name_plural': 'Segmentos Arquivados',
+                'ordering': ['user', 'ano'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'ano'), name='segmento_arquivado_unico_por_ano')],
+            },
+        ),
+    ]
@@ -0,0 +1,131 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+# Ver transactions/busca.py.
+SQLITE = [
+    """CREATE VIRTUAL TABLE transacao_busca USING fts5(
+        descricao, categoria, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    """CREATE TRIGGER transacao_busca_inclusao AFTER INSERT ON transactions_transaction BEGIN
+        INSERT INTO transacao_busca (rowid, descricao, categoria) VALUES (
+            NEW.id, COALESCE(NEW.description, ''),
+            COALESCE((SELECT name FROM transactions_category WHERE id = NEW.category_id), '')
+        );
+    END""",
+    """CREATE TRIGGER transacao_busca_alteracao AFTER UPDATE OF description, category_id ON transactions_transaction BEGIN
+        UPDATE transacao_busca SET
+            descricao = COALESCE(NEW.description, ''),
+            categoria = COALESCE((SELECT name FROM transactions_category WHERE id = NEW.category_id), '')
+        WHERE rowid = NEW.id;
+    END""",
+    """CREATE TRIGGER transacao_busca_remocao AFTER DELETE ON transactions_transaction BEGIN
+        DELETE FROM transacao_busca WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER transacao_busca_categoria AFTER UPDATE OF name ON transactions_category BEGIN
+        UPDATE transacao_busca SET categoria = NEW.name
+        WHERE rowid IN (SELECT id FROM transactions_transaction WHERE category_id = NEW.id);
+    END""",
+    """INSERT INTO transacao_busca (rowid, descricao, categoria)
+        SELECT t.id, COALESCE(t.description, ''), COALESCE(c.name, '')
+        FROM transactions_transaction t LEFT JOIN transactions_category c ON c.id = t.category_id""",
+]
+
+SQLITE_REMOCAO = [
+    "DROP TRIGGER IF EXISTS transacao_busca_inclusao",
+    "DROP TRIGGER IF EXISTS transacao_busca_alteracao",
+    "DROP TRIGGER IF EXISTS transacao_busca_remocao",
+    "DROP TRIGGER IF EXISTS transacao_busca_categoria",
+    "DROP TABLE IF EXISTS transacao_busca",
+]
+
+POSTGRESQL = [
+    """CREATE FUNCTION transacao_busca_documento(descricao text, categoria text) RETURNS tsvector AS $$
+        SELECT to_tsvector('simple', translate(
+            lower(coalesce(descricao, '') || ' ' || coalesce(categoria, '')),
+            'áàâãäéèêëíìîïóòôõöúùûüçñ', 'aaaaaeeeeiiiiooooouuuucn'
+        ))
+    $$ LANGUAGE sql IMMUTABLE""",
+    """CREATE TABLE transacao_busca (
+        transacao_id bigint PRIMARY KEY,
+        documento tsvector NOT NULL
+    )""",
+    "CREATE INDEX transacao_busca_documento_idx ON transacao_busca USING gin (documento)",
+    """CREATE FUNCTION transacao_busca_transacao() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM transacao_busca WHERE transacao_id = OLD.id;
+            RETURN NULL;
+        END IF;
+        INSERT INTO transacao_busca (transacao_id, documento) VALUES (
+            NEW.id,
+            transacao_busca_documento(
+                NEW.description, (SELECT name FROM transactions_category WHERE id = NEW.category_id)
+            )
+        ) ON CONFLICT (transacao_id) DO UPDATE SET documento = EXCLUDED.documento;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER transacao_busca_transacao
+        AFTER INSERT OR UPDATE OF description, category_id OR DELETE ON transactions_transaction
+        FOR EACH ROW EXECUTE FUNCTION transacao_busca_transacao()""",
+    """CREATE FUNCTION transacao_busca_categoria() RETURNS trigger AS $$
+    BEGIN
+        UPDATE transacao_busca b SET documento = transacao_busca_documento(t.description, NEW.name)
+        FROM transactions_transaction t
+        WHERE t.category_id = NEW.id AND b.transacao_id = t.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER transacao_busca_categoria
+        AFTER UPDATE OF name ON transactions_category
+        FOR EACH ROW EXECUTE FUNCTION transacao_busca_categoria()""",
+    """INSERT INTO transacao_busca (transacao_id, documento)
+        SELECT t.id, transacao_busca_documento(t.description, c.name)
+        FROM transactions_transaction t LEFT JOIN transactions_category c ON c.id = t.category_id""",
+]
+
+POSTGRESQL_REMOCAO = [
+    "DROP TRIGGER IF EXISTS transacao_busca_transacao ON transactions_transaction",
+    "DROP TRIGGER IF EXISTS transacao_busca_categoria ON transactions_category",
+    "DROP FUNCTION IF EXISTS transacao_busca_transacao()",
+    "DROP FUNCTION IF EXISTS transacao_busca_categoria()",
+    "DROP TABLE IF EXISTS transacao_busca",
+    "DROP FUNCTION IF EXISTS transacao_busca_documento(text, text)",
+]
+
+
+def criar_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == 'postgresql':
+        comandos = POSTGRESQL
+    elif conexao.vendor == 'sqlite':
+        comandos = SQLITE
+        try:
+            schema_editor.execute("CREATE VIRTUAL TABLE temp.transacao_busca_teste USING fts5(texto)")
+        except OperationalError:
+            # SQLite compilado sem FTS5: a busca continua com LIKE.
+            return
+        schema_editor.execute("DROP TABLE temp.transacao_busca_teste")
+    else:
+        return
+    for comando in comandos:
+        schema_editor.execute(comando)
+
+
+def remover_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    comandos = {'postgresql': POSTGRESQL_REMOCAO, 'sqlite': SQLITE_REMOCAO}.get(conexao.vendor, [])
+    for comando in comandos:
+        schema_editor.execute(comando)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_segmento_arquivado'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
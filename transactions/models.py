@@ -66,6 +66,17 @@ class Transaction(models.Model):
         ordering = ['-date']
         verbose_name = "Transação"
         verbose_name_plural = "Transações"
+        indexes = [
+            # Listagens do usuário por período. Tipo e valor no fim tornam o
+            # índice de cobertura para os relatórios, que não precisam ler a tabela.
+            models.Index(
+                fields=['user', 'date', 'transaction_type', 'amount'],
+                name='transacao_usuario_data_idx',
+            ),
+            models.Index(fields=['user', 'transaction_type', 'date'], name='transacao_usuario_tipo_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='transacao_usuario_cat_idx'),
+            models.Index(fields=['user', 'amount'], name='transacao_usuario_valor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - R$ {self.amount} em {self.date}"
@@ -98,3 +109,59 @@ class Transaction(models.Model):
         """
         self.clean()
         super().save(*args, **kwargs)
+
+
+class ChaveIdempotencia(models.Model):
+    """
+    Resultado de um lote de operações enviado com ``Idempotency-Key``. Um
+    reenvio com a mesma chave recebe a resposta guardada em vez de aplicar o
+    lote de novo.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuário")
+    chave = models.CharField(max_length=255, verbose_name="Chave")
+    assinatura = models.CharField(max_length=64, verbose_name="Assinatura do Corpo")
+    codigo_status = models.PositiveSmallIntegerField(null=True, verbose_name="Código de Status")
+    resposta = models.JSONField(null=True, verbose_name="Resposta")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Chave de Idempotência"
+        verbose_name_plural = "Chaves de Idempotência"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chave'], name='chave_idempotencia_unica_por_usuario'),
+        ]
+
+    def __str__(self):
+        return f"{self.chave} ({self.user_id})"
+
+
+class SegmentoArquivado(models.Model):
+    """
+    Transações de um usuário em um ano, retiradas da tabela principal e
+    guardadas compactadas (ver ``transactions.arquivo``). Os totais do ano
+    ficam pré-calculados, com os mesmos nomes das métricas do resumo.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuário")
+    ano = models.PositiveSmallIntegerField(verbose_name="Ano")
+    total_receitas = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'), verbose_name="Total de Receitas")
+    total_despesas = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'), verbose_name="Total de Despesas")
+    quantidade_receitas = models.PositiveIntegerField(default=0, verbose_name="Quantidade de Receitas")
+    quantidade_despesas = models.PositiveIntegerField(default=0, verbose_name="Quantidade de Despesas")
+    menor_receita = models.DecimalField(max_digits=15, decimal_places=2, null=True, verbose_name="Menor Receita")
+    maior_receita = models.DecimalField(max_digits=15, decimal_places=2, null=True, verbose_name="Maior Receita")
+    menor_despesa = models.DecimalField(max_digits=15, decimal_places=2, null=True, verbose_name="Menor Despesa")
+    maior_despesa = models.DecimalField(max_digits=15, decimal_places=2, null=True, verbose_name="Maior Despesa")
+    dados = models.BinaryField(verbose_name="Transações Compactadas")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Segmento Arquivado"
+        verbose_name_plural = "Segmentos Arquivados"
+        ordering = ['user', 'ano']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ano'], name='segmento_arquivado_unico_por_ano'),
+        ]
+
+    def __str__(self):
+        return f"{self.ano} ({self.user_id}): {self.quantidade_receitas + self.quantidade_despesas} transações"
@@ -0,0 +1,187 @@
+"""
+Paginação por cursor (keyset) para as listagens de transações.
+
+Em vez de ``OFFSET``, cada página continua a partir da chave da última linha
+entregue: ``(campo de ordenação, id)``. O banco desce direto pelo índice até o
+ponto certo, então o custo de uma página não depende da profundidade.
+O cursor é opaco para o cliente e guarda apenas a posição e a ordenação em que
+foi gerado; por isso continua válido mesmo que novas transações sejam
+incluídas entre uma página e outra.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound  # type: ignore
+from rest_framework.pagination import BasePagination  # type: ignore
+from rest_framework.response import Response  # type: ignore
+from rest_framework.utils.urls import replace_query_param  # type: ignore
+
+
+class PaginacaoPorCursor(BasePagination):
+    """
+    Pagina pelo par ``(campo, id)``, em que ``campo`` é o primeiro critério de
+    ordenação do queryset (``-date`` por padrão) e ``id`` desempata.
+    """
+    tamanho_pagina = 50
+    tamanho_maximo = 500
+    parametro_cursor = 'cursor'
+    parametro_tamanho = 'tamanho'
+    campos_ordenaveis = ('date', 'amount')
+    ordenacao_padrao = '-date'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.url_base = request.build_absolute_uri()
+        self.ordenacao = self._ordenacao(queryset)
+        campo = self.ordenacao.lstrip('-')
+        descendente = self.ordenacao.startswith('-')
+        tamanho = self._tamanho(request)
+
+        cursor = self._decodificar(request.query_params.get(self.parametro_cursor))
+        voltando = bool(cursor and cursor['voltar'])
+        ordem_decrescente = descendente != voltando
+        prefixo = '-' if ordem_decrescente else ''
+        queryset = queryset.order_by(f'{prefixo}{campo}', f'{prefixo}pk')
+
+        chave_cursor = None
+        if cursor:
+            try:
+                valor = queryset.model._meta.get_field(campo).to_python(cursor['valor'])
+            except ValidationError:
+                raise NotFound("Cursor inválido.")
+            chave_cursor = (valor, cursor['id'])
+            queryset = queryset.filter(self._apos(campo, valor, cursor['id'], ordem_decrescente))
+
+        linhas = list(queryset[:tamanho + 1])
+        if hasattr(view, 'transacoes_arquivadas'):
+            linhas = self._mesclar_arquivadas(view, linhas, campo, chave_cursor, ordem_decrescente, tamanho)
+        ha_mais = len(linhas) > tamanho
+        linhas = linhas[:tamanho]
+        if voltando:
+            linhas.reverse()
+
+        tem_proxima = ha_mais if not voltando else True
+        tem_anterior = ha_mais if voltando else cursor is not None
+        self.proximo = self._cursor(linhas[-1], campo, voltar=False) if linhas and tem_proxima else None
+        self.anterior = self._cursor(linhas[0], campo, voltar=True) if linhas and tem_anterior else None
+        return linhas
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('proximo', self._url(self.proximo)),
+            ('anterior', self._url(self.anterior)),
+            ('resultados', data),
+        ]))
+
+    def _ordenacao(self, queryset):
+        ordenacao = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if ordenacao and ordenacao[0].lstrip('-') in self.campos_ordenaveis:
+            return ordenacao[0]
+        return self.ordenacao_padrao
+
+    def _tamanho(self, request):
+        try:
+            tamanho = int(request.query_params.get(self.parametro_tamanho, self.tamanho_pagina))
+        except ValueError:
+            return self.tamanho_pagina
+        return max(1, min(tamanho, self.tamanho_maximo))
+
+    def _mesclar_arquivadas(self, view, linhas, campo, chave_cursor, decrescente, tamanho):
+        """
+        Mescla à página as transações arquivadas (``view.transacoes_arquivadas``)
+        que caem depois do cursor. Só a ordenação por data mescla o arquivo:
+        por valor, a próxima linha poderia estar em qualquer segmento, e cada
+        página descompactaria o arquivo inteiro.
+
+        Com a página cheia, só interessa o trecho entre o cursor e a última
+        linha, o que normalmente dispensa abrir o arquivo. Com a página curta
+        (a tabela principal acabou), os anos arquivados são lidos um por vez,
+        a partir do cursor, até completar a página.
+        """
+        if campo != 'date':
+            return linhas
+        limite_cursor = chave_cursor[0] if chave_cursor else None
+        if len(linhas) > tamanho:
+            limite_pagina = linhas[-1].date
+            janelas = [(limite_pagina, limite_cursor) if decrescente else (limite_cursor, limite_pagina)]
+        else:
+            janelas = self._anos_apos(view.anos_arquivados(), limite_cursor, decrescente)
+
+        def chave(transacao):
+            return (transacao.date, transacao.pk)
+
+        arquivadas = []
+        for inicio, fim in janelas:
+            arquivadas += [
+                t for t in view.transacoes_arquivadas(inicio, fim)
+                if not chave_cursor or (chave(t) < chave_cursor if decrescente else chave(t) > chave_cursor)
+            ]
+            if len(arquivadas) > tamanho:
+                # Os anos seguintes só têm linhas depois destas.
+                break
+        if not arquivadas:
+            return linhas
+        return sorted(linhas + arquivadas, key=chave, reverse=decrescente)[:tamanho + 1]
+
+    @staticmethod
+    def _anos_apos(anos, limite, decrescente):
+        """
+        Janelas ``(inicio, fim)`` de um ano arquivado cada, na ordem da página,
+        a partir da data ``limite`` do cursor.
+        """
+        for ano in sorted(anos, reverse=decrescente):
+            inicio, fim = date(ano, 1, 1), date(ano, 12, 31)
+            if limite is not None:
+                if decrescente:
+                    if ano > limite.year:
+                        continue
+                    fim = min(fim, limite)
+                else:
+                    if ano < limite.year:
+                        continue
+                    inicio = max(inicio, limite)
+            yield inicio, fim
+
+    @staticmethod
+    def _apos(campo, valor, pk, decrescente):
+        """
+        Linhas estritamente depois de ``(valor, pk)`` na ordenação. A forma
+        ``campo <= valor AND (campo < valor OR pk < id)`` deixa o banco usar
+        o índice como faixa, ao contrário de um ``OR`` no nível externo.
+        """
+        if decrescente:
+            return Q(**{f'{campo}__lte': valor}) & (Q(**{f'{campo}__lt': valor}) | Q(pk__lt=pk))
+        return Q(**{f'{campo}__gte': valor}) & (Q(**{f'{campo}__gt': valor}) | Q(pk__gt=pk))
+
+    def _cursor(self, instancia, campo, voltar):
+        dados = {
+            'o': self.ordenacao,
+            'v': str(getattr(instancia, campo)),
+            'i': instancia.pk,
+            'r': int(voltar),
+        }
+        bruto = json.dumps(dados, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+    def _decodificar(self, token):
+        if not token:
+            return None
+        try:
+            bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            dados = json.loads(bruto)
+            cursor = {'valor': dados['v'], 'id': int(dados['i']), 'voltar': bool(dados['r'])}
+            ordenacao = dados['o']
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound("Cursor inválido.")
+        if ordenacao != self.ordenacao:
+            raise NotFound("O cursor foi gerado para outra ordenação.")
+        return cursor
+
+    def _url(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.url_base, self.parametro_cursor, cursor)
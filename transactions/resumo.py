@@ -0,0 +1,135 @@
+"""
+Resumo financeiro das transações calculado em uma única varredura.
+
+Todas as métricas (totais, contagens, mínimos e máximos por tipo) são obtidas
+com agregação condicional (``Sum(..., filter=Q(...))``). Quando há
+agrupamento, o banco devolve uma linha por combinação de grupos e os demais
+recortes (geral, por categoria, por mês) são derivados dessas linhas em
+Python, sem nova consulta à tabela de transações.
+"""
+from decimal import Decimal
+from itertools import chain
+
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+CENTAVO = Decimal('0.01')
+RECEITA = Q(transaction_type='income')
+DESPESA = Q(transaction_type='expense')
+
+METRICAS = {
+    'total_receitas': Sum('amount', filter=RECEITA),
+    'total_despesas': Sum('amount', filter=DESPESA),
+    'quantidade_receitas': Count('pk', filter=RECEITA),
+    'quantidade_despesas': Count('pk', filter=DESPESA),
+    'menor_receita': Min('amount', filter=RECEITA),
+    'maior_receita': Max('amount', filter=RECEITA),
+    'menor_despesa': Min('amount', filter=DESPESA),
+    'maior_despesa': Max('amount', filter=DESPESA),
+}
+
+AGRUPAMENTOS = {
+    'categoria': ('category_id', 'category__name'),
+    'mes': ('mes',),
+}
+
+
+def _somar(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+
+def _combinar(acumulado, linha):
+    """
+    Combina duas linhas de métricas (somas, contagens, mínimos e máximos).
+    """
+    if acumulado is None:
+        return {chave: linha[chave] for chave in METRICAS}
+    for chave in METRICAS:
+        atual, novo = acumulado[chave], linha[chave]
+        if chave.startswith(('menor_', 'maior_')):
+            valores = [v for v in (atual, novo) if v is not None]
+            escolher = min if chave.startswith('menor_') else max
+            acumulado[chave] = escolher(valores) if valores else None
+        else:
+            acumulado[chave] = _somar(atual, novo)
+    return acumulado
+
+
+def _formatar(metricas):
+    """
+    Normaliza valores monetários em duas casas decimais e calcula o saldo.
+    """
+    resultado = {}
+    for chave, valor in metricas.items():
+        if chave.startswith('quantidade_'):
+            resultado[chave] = valor or 0
+        elif valor is None:
+            resultado[chave] = Decimal('0.00') if chave.startswith('total_') else None
+        else:
+            resultado[chave] = Decimal(valor).quantize(CENTAVO)
+    resultado['saldo'] = resultado['total_receitas'] - resultado['total_despesas']
+    resultado['quantidade'] = resultado['quantidade_receitas'] + resultado['quantidade_despesas']
+    return resultado
+
+
+def resumir_transacoes(queryset, inicio=None, fim=None, agrupar=(), extras=()):
+    """
+    Resume ``queryset`` no intervalo ``[inicio, fim]``.
+
+    ``agrupar`` aceita ``'categoria'`` e/ou ``'mes'``; para cada um é incluído
+    no resultado o detalhamento correspondente (``por_categoria``/``por_mes``).
+    Em qualquer caso a tabela de transações é lida uma única vez.
+
+    ``extras`` são linhas de métricas de outra origem (por exemplo, do
+    arquivo, ver ``transactions.arquivo.metricas_arquivadas``), no mesmo
+    formato das linhas agrupadas, combinadas ao resultado do banco.
+    """
+    invalidos = set(agrupar) - set(AGRUPAMENTOS)
+    if invalidos:
+        raise ValueError(f"Agrupamento inválido: {', '.join(sorted(invalidos))}.")
+
+    if inicio:
+        queryset = queryset.filter(date__gte=inicio)
+    if fim:
+        queryset = queryset.filter(date__lte=fim)
+    queryset = queryset.order_by()
+
+    if not agrupar:
+        geral = queryset.aggregate(**METRICAS)
+        for linha in extras:
+            geral = _combinar(geral, linha)
+        return {'geral': _formatar(geral)}
+
+    campos = [campo for grupo in agrupar for campo in AGRUPAMENTOS[grupo]]
+    if 'mes' in agrupar:
+        queryset = queryset.annotate(mes=TruncMonth('date'))
+    linhas = queryset.values(*campos).annotate(**METRICAS)
+
+    geral = None
+    por_categoria = {}
+    por_mes = {}
+    for linha in chain(linhas, extras):
+        geral = _combinar(geral, linha)
+        if 'categoria' in agrupar:
+            chave = (linha['category_id'], linha['category__name'])
+            por_categoria[chave] = _combinar(por_categoria.get(chave), linha)
+        if 'mes' in agrupar:
+            por_mes[linha['mes']] = _combinar(por_mes.get(linha['mes']), linha)
+
+    resumo = {'geral': _formatar(geral or {chave: None for chave in METRICAS})}
+    if 'categoria' in agrupar:
+        resumo['por_categoria'] = [
+            {'categoria_id': pk, 'categoria': nome, **_formatar(metricas)}
+            for (pk, nome), metricas in sorted(por_categoria.items(), key=lambda item: item[0][1] or '')
+        ]
+    if 'mes' in agrupar:
+        resumo['por_mes'] = [
+            {'mes': mes.strftime('%Y-%m'), **_formatar(metricas)}
+            for mes, metricas in sorted(por_mes.items())
+        ]
+    return resumo
@@ -0,0 +1,166 @@
+"""
+Expurgo de transações antigas em blocos.
+
+Em vez de um único ``DELETE`` que trava o banco (no SQLite, todas as escritas)
+até o fim, as transações anteriores à data-limite são removidas em blocos de
+``tamanho_bloco`` linhas, cada um na sua própria transação curta, com uma
+pausa opcional entre eles para que as outras requisições avancem.
+
+Cada bloco pode ser arquivado antes de ser removido: as linhas são gravadas
+como um membro gzip acrescentado ao arquivo de arquivamento e o arquivo é
+sincronizado em disco antes do ``DELETE``. Membros concatenados formam um
+gzip válido, então um expurgo interrompido e retomado continua no mesmo
+arquivo; no pior caso (queda entre o arquivamento e o commit do bloco) as
+linhas daquele bloco aparecem duas vezes no arquivo, mas nunca se perdem.
+
+Depois da tabela principal, o expurgo apara os segmentos arquivados (ver
+``transactions.arquivo``) dos anos alcançados pela data-limite, um segmento
+por transação, com o mesmo arquivamento e os mesmos movimentos.
+
+O expurgo é naturalmente retomável: as linhas já removidas não voltam a ser
+selecionadas, então basta executá-lo de novo com os mesmos parâmetros.
+"""
+import csv
+import gzip
+import io
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.db import router, transaction
+
+from accounts.shards import atomico_do_usuario
+from transactions.arquivo import aparar_segmento
+from transactions.models import SegmentoArquivado, Transaction
+from transactions.signals import Movimento, emitir_movimentos, movimentos_suspensos
+
+
+TAMANHO_BLOCO_PADRAO = 1000
+COLUNAS_ARQUIVO = ('id', 'user_id', 'date', 'transaction_type', 'category_id', 'amount', 'description', 'created_at')
+
+
+@dataclass
+class ProgressoExpurgo:
+    excluidas: int = 0
+    blocos: int = 0
+    ultima_data: str = None
+
+    def como_dict(self):
+        return {'excluidas': self.excluidas, 'blocos': self.blocos, 'ultima_data': self.ultima_data}
+
+
+class ExpurgoTransacoes:
+    """
+    Remove as transações com ``date < antes_de`` (de ``user_id``, ou de todos
+    os usuários se for ``None``) em blocos de ``tamanho_bloco``, dormindo
+    ``pausa`` segundos entre os blocos. Com ``caminho_arquivo``, cada bloco é
+    acrescentado ao CSV compactado antes de ser removido.
+    """
+
+    def __init__(self, antes_de, user_id=None, tamanho_bloco=TAMANHO_BLOCO_PADRAO, pausa=0.0, caminho_arquivo=None):
+        if tamanho_bloco <= 0:
+            raise ValueError("O tamanho do bloco deve ser positivo.")
+        if pausa < 0:
+            raise ValueError("A pausa entre blocos não pode ser negativa.")
+        self.antes_de = antes_de
+        self.user_id = user_id
+        self.tamanho_bloco = tamanho_bloco
+        self.pausa = pausa
+        self.caminho_arquivo = caminho_arquivo
+
+    def executar(self, progresso=None, deve_parar=lambda: False, estado=None):
+        """
+        Executa o expurgo até não restar nenhuma linha (ou até ``deve_parar``)
+        e retorna o ``ProgressoExpurgo``. ``progresso(estado)`` é chamado
+        dentro da transação de cada bloco, logo após o ``DELETE``; ``estado``
+        permite continuar a contagem de uma execução anterior.
+        """
+        estado = estado or ProgressoExpurgo()
+        while not deve_parar():
+            if not self._expurgar_bloco(estado, progresso):
+                break
+            if self.pausa:
+                time.sleep(self.pausa)
+        for segmento_id in self._segmentos():
+            if deve_parar():
+                break
+            if self._aparar_segmento(segmento_id, estado, progresso) and self.pausa:
+                time.sleep(self.pausa)
+        return estado
+
+    def _candidatas(self):
+        transacoes = Transaction.objects.filter(date__lt=self.antes_de)
+        if self.user_id is not None:
+            transacoes = transacoes.filter(user_id=self.user_id)
+        # Em ordem de data, pelo índice (usuário, data): as linhas removidas
+        # somem do índice, então cada bloco começa onde o anterior parou.
+        return transacoes.order_by('date')
+
+    def _segmentos(self):
+        with self._transacao():
+            segmentos = SegmentoArquivado.objects.filter(ano__lte=self.antes_de.year)
+            if self.user_id is not None:
+                segmentos = segmentos.filter(user_id=self.user_id)
+            return list(segmentos.order_by('user_id', 'ano').values_list('pk', flat=True))
+
+    @contextmanager
+    def _transacao(self):
+        # Com shards, o bloco precisa ser atômico no banco das transações.
+        if self.user_id is not None:
+            with atomico_do_usuario(self.user_id) as banco:
+                yield banco
+            return
+        banco = router.db_for_write(Transaction)
+        with transaction.atomic(using=banco):
+            yield banco
+
+    def _expurgar_bloco(self, estado, progresso):
+        with self._transacao() as banco:
+            linhas = list(self._candidatas().values_list(*COLUNAS_ARQUIVO)[:self.tamanho_bloco])
+            if not linhas:
+                return False
+            if self.caminho_arquivo:
+                self._arquivar(linhas)
+            # Os movimentos do bloco são emitidos de uma vez logo abaixo.
+            with movimentos_suspensos():
+                Transaction.objects.using(banco).filter(pk__in=[linha[0] for linha in linhas]).delete()
+            emitir_movimentos(
+                Movimento(user_id, data, tipo, categoria_id, -valor, -1)
+                for _, user_id, data, tipo, categoria_id, valor, _, _ in linhas
+            )
+            self._avancar(estado, linhas, progresso)
+        return True
+
+    def _aparar_segmento(self, segmento_id, estado, progresso):
+        with self._transacao():
+            removidas = aparar_segmento(segmento_id, self.antes_de)
+            if not removidas:
+                return False
+            linhas = [tuple(getattr(t, coluna) for coluna in COLUNAS_ARQUIVO) for t in removidas]
+            if self.caminho_arquivo:
+                self._arquivar(linhas)
+            emitir_movimentos(Movimento.de(t, -1) for t in removidas)
+            self._avancar(estado, linhas, progresso)
+        return True
+
+    def _avancar(self, estado, linhas, progresso):
+        estado.excluidas += len(linhas)
+        estado.blocos += 1
+        estado.ultima_data = max(linha[2] for linha in linhas).isoformat()
+        if progresso:
+            progresso(estado)
+
+    def _arquivar(self, linhas):
+        novo = not os.path.exists(self.caminho_arquivo)
+        os.makedirs(os.path.dirname(self.caminho_arquivo) or '.', exist_ok=True)
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        if novo:
+            escritor.writerow(COLUNAS_ARQUIVO)
+        escritor.writerows(linhas)
+        with open(self.caminho_arquivo, 'ab') as destino:
+            with gzip.GzipFile(fileobj=destino, mode='wb') as membro:
+                membro.write(buffer.getvalue().encode('utf-8'))
+            destino.flush()
+            os.fsync(destino.fileno())
@@ -0,0 +1,170 @@
+"""
+Serialização rápida das listagens de transações.
+
+O ``TransacaoSerializer`` (``ModelSerializer``) percorre, para cada linha, os
+campos do serializer, resolve ``source`` e chama ``to_representation`` de
+cada um. ``SerializacaoRapida`` faz esse trabalho uma única vez: lê os
+campos e os tipos do serializer e guarda, para cada um, o atributo lido do
+banco e uma função de formatação equivalente à do DRF (``Decimal`` com as
+casas do campo, datas em ISO 8601, datas e horas no fuso atual). As linhas
+vêm de ``values_list`` em vez de instâncias do modelo, e o JSON é escrito
+pelo ``orjson`` quando instalado.
+
+A saída é a mesma do serializer, byte a byte; campos de tipos que não estão
+em ``_formatador`` usam o próprio ``to_representation`` do DRF.
+"""
+import json
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter
+
+from django.utils import timezone
+from rest_framework import serializers  # type: ignore
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer  # type: ignore
+from rest_framework.response import Response  # type: ignore
+from rest_framework.settings import api_settings  # type: ignore
+
+from accounts.instrumentacao import serializacao_medida
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Datas e horas dependem do fuso ativo na requisição; o formatador é montado
+# a cada chamada de ``para_dicts``.
+_DATA_HORA = object()
+
+
+def _identidade(valor):
+    return valor
+
+
+def _formatador(campo):
+    """
+    Função que converte o valor lido do banco na representação do DRF, ou
+    ``None`` se o tipo do campo não tiver um formatador próprio.
+    """
+    if isinstance(campo, serializers.DecimalField):
+        coerce_to_string = getattr(campo, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or campo.localize or campo.normalize_output or campo.rounding:
+            return None
+        expoente = Decimal(1).scaleb(-campo.decimal_places) if campo.decimal_places is not None else None
+        if expoente is None:
+            return lambda valor: f"{valor:f}"
+        return lambda valor: f"{valor.quantize(expoente):f}"
+    if isinstance(campo, serializers.DateTimeField):
+        if getattr(campo, 'format', api_settings.DATETIME_FORMAT).lower() != 'iso-8601':
+            return None
+        return _DATA_HORA
+    if isinstance(campo, serializers.DateField):
+        if getattr(campo, 'format', api_settings.DATE_FORMAT).lower() != 'iso-8601':
+            return None
+        return lambda valor: valor.isoformat()
+    if isinstance(campo, (serializers.PrimaryKeyRelatedField, serializers.IntegerField,
+                          serializers.CharField, serializers.ChoiceField, serializers.BooleanField)):
+        return _identidade
+    return None
+
+
+def _formatar_datahora(fuso):
+    def formatar(valor):
+        texto = valor.astimezone(fuso).isoformat() if timezone.is_aware(valor) else valor.isoformat()
+        return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+    return formatar
+
+
+class SerializacaoRapida:
+    """
+    Serialização equivalente à de ``serializer_class`` (um ``ModelSerializer``
+    sem campos calculados) a partir de tuplas de ``values_list``.
+    """
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        modelo = serializer_class.Meta.model
+        self.nomes = []
+        self.atributos = []
+        self._formatadores = []
+        for nome, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            campo_modelo = modelo._meta.get_field(campo.source)
+            atributo = 'pk' if campo_modelo.primary_key else campo_modelo.attname
+            formatador = _formatador(campo)
+            if formatador is None:
+                # Sem formatador próprio: o DRF converte o valor.
+                formatador = campo.to_representation
+            self.nomes.append(nome)
+            self.atributos.append(atributo)
+            self._formatadores.append(formatador)
+        ler = attrgetter(*self.atributos)
+        self._ler = ler if len(self.atributos) > 1 else (lambda linha: (ler(linha),))
+
+    def linhas(self, queryset):
+        """
+        O queryset como tuplas nomeadas com os atributos usados, que servem à
+        paginação como as instâncias (``linha.pk``, ``linha.date``...).
+        """
+        return queryset.values_list(*self.atributos, named=True)
+
+    def para_dicts(self, linhas):
+        """
+        Converte linhas (tuplas de ``linhas()`` ou instâncias, como as
+        transações arquivadas) nos dicionários que o serializer produziria.
+        """
+        data_hora = _formatar_datahora(timezone.get_current_timezone())
+        formatadores = [data_hora if f is _DATA_HORA else f for f in self._formatadores]
+        nomes, ler = self.nomes, self._ler
+        with serializacao_medida():
+            return [
+                {
+                    nome: None if valor is None else formatar(valor)
+                    for nome, formatar, valor in zip(nomes, formatadores, ler(linha))
+                }
+                for linha in linhas
+            ]
+
+
+@lru_cache(maxsize=None)
+def serializacao_de(serializer_class):
+    return SerializacaoRapida(serializer_class)
+
+
+class RenderizadorJSONRapido(JSONRenderer):
+    """
+    ``JSONRenderer`` que escreve com o ``orjson`` quando possível. A saída é
+    a do ``JSONRenderer`` compacto: sem espaços, sem escapar acentos e com
+    U+2028/U+2029 escapados.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            conteudo = orjson.dumps(data)
+        except TypeError:
+            # Tipos que só o encoder do DRF conhece (Decimal, lazy strings...).
+            return super().render(data, accepted_media_type, renderer_context)
+        return conteudo.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ListagemRapidaMixin:
+    """
+    ``ListAPIView`` cuja listagem em JSON usa ``SerializacaoRapida``. Outros
+    formatos (a API navegável) seguem pelo serializer.
+    """
+    renderer_classes = [RenderizadorJSONRapido, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return super().list(request, *args, **kwargs)
+        serializacao = serializacao_de(self.get_serializer_class())
+        linhas = serializacao.linhas(self.filter_queryset(self.get_queryset()))
+        pagina = self.paginate_queryset(linhas)
+        if pagina is not None:
+            return self.get_paginated_response(serializacao.para_dicts(pagina))
+        return Response(serializacao.para_dicts(linhas))
+
+
+# Codificador reaproveitado pelas exportações: ``json.dumps`` com argumentos
+# monta um ``JSONEncoder`` novo a cada chamada.
+codificar_json = json.JSONEncoder(ensure_ascii=False).encode
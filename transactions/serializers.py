@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from transactions.models import Transacao
+from accounts.instrumentacao import SerializacaoMedidaMixin
+from transactions.models import Transaction
 
-class TransacaoSerializer(serializers.ModelSerializer):
+class TransacaoSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     class Meta:
-        model = Transacao
+        model = Transaction
         fields = '__all__'
@@ -0,0 +1,136 @@
+"""
+Sinais de escrita de transações.
+
+Toda inclusão, alteração ou remoção de ``Transaction`` é traduzida em uma
+lista de ``Movimento``s (deltas aditivos) enviada pelo sinal
+``transacoes_movimentadas``. Uma alteração vira a remoção do estado anterior
+mais a inclusão do novo. Operações em lote (``bulk_create``, importação CSV)
+não disparam ``post_save``; quem as executa deve chamar ``emitir_movimentos``
+dentro da mesma transação de banco. Operações que disparam os sinais linha a
+linha (como ``QuerySet.delete``) podem ser feitas dentro de
+``movimentos_suspensos()``, emitindo depois os movimentos de uma vez.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from transactions.models import Transaction
+
+
+transacoes_movimentadas = Signal()  # argumentos: movimentos
+
+_suspensos = ContextVar('movimentos_suspensos', default=False)
+
+
+class Movimento(NamedTuple):
+    """
+    Efeito de uma transação sobre os agregados: ``quantidade`` é +1 para
+    inclusão e -1 para remoção, e ``valor`` já vem com o sinal aplicado.
+    """
+    user_id: int
+    data: date
+    tipo: str
+    categoria_id: Optional[int]
+    valor: Decimal
+    quantidade: int
+
+    @classmethod
+    def de(cls, transacao, sinal=1):
+        return cls(
+            user_id=transacao.user_id,
+            data=transacao.date,
+            tipo=transacao.transaction_type,
+            categoria_id=transacao.category_id,
+            valor=Decimal(transacao.amount) * sinal,
+            quantidade=sinal,
+        )
+
+    def inverso(self):
+        return self._replace(valor=-self.valor, quantidade=-self.quantidade)
+
+
+def emitir_movimentos(movimentos):
+    """
+    Envia ``transacoes_movimentadas`` se houver algum movimento. Com shards,
+    envia um sinal por usuário, roteado para o shard dele.
+    """
+    movimentos = list(movimentos)
+    if not movimentos:
+        return
+    if not settings.BANCOS_SHARD:
+        transacoes_movimentadas.send(sender=Transaction, movimentos=movimentos)
+        return
+
+    from accounts.shards import no_shard_do_usuario
+
+    por_usuario = defaultdict(list)
+    for movimento in movimentos:
+        por_usuario[movimento.user_id].append(movimento)
+    for user_id, do_usuario in por_usuario.items():
+        with no_shard_do_usuario(user_id):
+            transacoes_movimentadas.send(sender=Transaction, movimentos=do_usuario)
+
+
+@contextmanager
+def movimentos_suspensos():
+    """
+    Dentro do bloco, ``save``/``delete`` de transações não emitem movimentos;
+    quem usa o bloco é responsável por chamar ``emitir_movimentos``.
+    """
+    token = _suspensos.set(True)
+    try:
+        yield
+    finally:
+        _suspensos.reset(token)
+
+
+@receiver(pre_save, sender=Transaction)
+def guardar_estado_anterior(sender, instance, raw=False, **kwargs):
+    """
+    Guarda o estado persistido da transação antes de uma alteração, para que
+    ``post_save`` possa emitir a remoção do estado antigo.
+    """
+    instance._movimento_anterior = None
+    if raw or _suspensos.get() or instance._state.adding or instance.pk is None:
+        return
+    anterior = (
+        Transaction.objects.filter(pk=instance.pk)
+        .values('user_id', 'date', 'transaction_type', 'category_id', 'amount')
+        .first()
+    )
+    if anterior:
+        instance._movimento_anterior = Movimento(
+            user_id=anterior['user_id'],
+            data=anterior['date'],
+            tipo=anterior['transaction_type'],
+            categoria_id=anterior['category_id'],
+            valor=anterior['amount'],
+            quantidade=1,
+        )
+
+
+@receiver(post_save, sender=Transaction)
+def transacao_salva(sender, instance, raw=False, **kwargs):
+    if raw or _suspensos.get():
+        return
+    atual = Movimento.de(instance)
+    anterior = getattr(instance, '_movimento_anterior', None)
+    instance._movimento_anterior = None
+    if anterior == atual:
+        return
+    movimentos = [anterior.inverso()] if anterior else []
+    movimentos.append(atual)
+    emitir_movimentos(movimentos)
+
+
+@receiver(post_delete, sender=Transaction)
+def transacao_removida(sender, instance, **kwargs):
+    if not _suspensos.get():
+        emitir_movimentos([Movimento.de(instance, -1)])
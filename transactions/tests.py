@@ -1,3 +1,762 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer  # type: ignore
+
+from dashboard.models import DashboardSummary
+from dashboard.rollups import reconstruir_resumos
+from reports.models import Relatorio
+from reports.trabalhador import executar
+from setup.bancos import perfil_banco
+from transactions import arquivo, views
+from transactions.bench import medir_requisicoes
+from transactions.carga import comparar, percentis
+from transactions.busca import indice_disponivel
+from transactions.models import Category, ChaveIdempotencia, SegmentoArquivado, Transaction
+from transactions.retencao import ExpurgoTransacoes
+from transactions.serializacao import RenderizadorJSONRapido, serializacao_de
+from transactions.serializers import TransacaoSerializer
+from transactions.importacao import ImportacaoInterrompida, ImportadorCSV
+from transactions.signals import Movimento, emitir_movimentos, transacoes_movimentadas
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN é específico do SQLite.")
+class PlanoDeConsultaTests(TestCase):
+    """
+    Garante que as consultas de listagem, filtro e relatório usam os índices
+    de ``Transaction``: nenhuma pode varrer a tabela inteira nem ordenar em
+    uma B-tree temporária.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('plano', password='senha')
+        outro = User.objects.create_user('outro')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+        salario = Category.objects.create(name='Salário', type='income')
+        transacoes = []
+        for dono in (cls.usuario, outro):
+            for i in range(50):
+                despesa = i % 3 != 0
+                transacoes.append(Transaction(
+                    user=dono,
+                    transaction_type='expense' if despesa else 'income',
+                    category=cls.mercado if despesa else salario,
+                    amount=Decimal(i + 1),
+                    date=date(2024, 1, 1) + timedelta(days=i * 7),
+                    description=f"Transação {i}",
+                ))
+        Transaction.objects.bulk_create(transacoes)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def planos(self, url):
+        """
+        Executa ``url`` e devolve o EXPLAIN QUERY PLAN de cada consulta que
+        tocou a tabela de transações.
+        """
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        planos = []
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                sql = consulta['sql']
+                if 'transactions_transaction' not in sql or not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                planos.append((sql, [linha[-1] for linha in cursor.fetchall()]))
+        self.assertTrue(planos, f"Nenhuma consulta de transações em {url}.")
+        return planos
+
+    def assertUsaIndices(self, url, permitir_ordenacao=False):
+        for sql, plano in self.planos(url):
+            for passo in plano:
+                self.assertFalse(
+                    passo.startswith('SCAN transactions_transaction'),
+                    f"Varredura completa em {url}:\n{sql}\n{plano}",
+                )
+                if permitir_ordenacao:
+                    continue
+                self.assertNotIn(
+                    'USE TEMP B-TREE FOR ORDER BY', passo,
+                    f"Ordenação em B-tree temporária em {url}:\n{sql}\n{plano}",
+                )
+
+    def test_listagem(self):
+        self.assertUsaIndices('/api/transacoes/')
+        self.assertUsaIndices('/api/transacoes/?transaction_type=expense')
+        self.assertUsaIndices(f'/api/transacoes/?category={self.mercado.pk}')
+        self.assertUsaIndices('/api/transacoes/?date=2024-01-08')
+        self.assertUsaIndices('/api/transacoes/?ordering=amount')
+        self.assertUsaIndices('/api/transacoes/?ordering=-amount')
+        self.assertUsaIndices('/api/transacoes/?search=Transação')
+        proxima = self.client.get('/api/transacoes/?tamanho=10').json()['proximo']
+        self.assertUsaIndices(proxima)
+
+    def test_filtros(self):
+        base = '/api/transacoes/filtrar/'
+        self.assertUsaIndices(base)
+        self.assertUsaIndices(f'{base}?date__gte=2024-02-01&date__lte=2024-06-30')
+        self.assertUsaIndices(f'{base}?transaction_type=income&date__gte=2024-02-01')
+        self.assertUsaIndices(f'{base}?category={self.mercado.pk}&date__lte=2024-06-30')
+        # A faixa de valores é resolvida pelo índice (user, amount); só o
+        # subconjunto encontrado é ordenado por data.
+        self.assertUsaIndices(f'{base}?amount__gte=10&amount__lte=20', permitir_ordenacao=True)
+
+    def test_relatorios(self):
+        self.assertUsaIndices('/api/transacoes/relatorio/')
+        self.assertUsaIndices('/api/transacoes/relatorio/?inicio=2024-03-01&fim=2024-09-30')
+        self.assertUsaIndices('/api/transacoes/relatorio/?agrupar=categoria,mes')
+
+
+class PaginacaoPorCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('paginas')
+        # Várias transações na mesma data para exercitar o desempate por id.
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=cls.usuario,
+                transaction_type='expense',
+                amount=Decimal(i % 7 + 1),
+                date=date(2024, 1, 1) + timedelta(days=i // 3),
+            )
+            for i in range(25)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def percorrer(self, url, chave):
+        ids = []
+        while url:
+            pagina = self.client.get(url).json()
+            ids.extend(t['id'] for t in pagina['resultados'])
+            url = pagina[chave]
+        return ids
+
+    def test_percorre_todas_as_transacoes_sem_repetir(self):
+        esperado = list(
+            Transaction.objects.filter(user=self.usuario)
+            .order_by('-date', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(self.percorrer('/api/transacoes/?tamanho=4', 'proximo'), esperado)
+
+    def test_ordenacao_por_valor_e_volta(self):
+        esperado = list(
+            Transaction.objects.filter(user=self.usuario)
+            .order_by('amount', 'pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(self.percorrer('/api/transacoes/?ordering=amount&tamanho=6', 'proximo'), esperado)
+
+        primeira = self.client.get('/api/transacoes/?ordering=amount&tamanho=6').json()
+        segunda = self.client.get(primeira['proximo']).json()
+        de_volta = self.client.get(segunda['anterior']).json()
+        self.assertEqual(de_volta['resultados'], primeira['resultados'])
+        self.assertIsNone(de_volta['anterior'])
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get('/api/transacoes/?cursor=xyz').status_code, 404)
+        primeira = self.client.get('/api/transacoes/?tamanho=5').json()
+        cursor = primeira['proximo'].split('cursor=')[1]
+        resposta = self.client.get(f'/api/transacoes/?ordering=amount&cursor={cursor}')
+        self.assertEqual(resposta.status_code, 404)
+
+
+class TransacoesEmLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('lote')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+        cls.salario = Category.objects.create(name='Salário', type='income')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.url = reverse('transacoes_lote')
+        self.existente = Transaction.objects.create(
+            user=self.usuario, transaction_type='expense', category=self.mercado,
+            amount=Decimal('30.00'), date=date(2024, 1, 10),
+        )
+        self.removida = Transaction.objects.create(
+            user=self.usuario, transaction_type='expense', amount=Decimal('7.00'), date=date(2024, 1, 11),
+        )
+
+    def enviar(self, operacoes, chave=None, **parametros):
+        cabecalhos = {'HTTP_IDEMPOTENCY_KEY': chave} if chave else {}
+        url = self.url + ('?' + '&'.join(f'{k}={v}' for k, v in parametros.items()) if parametros else '')
+        return self.client.post(url, json.dumps(operacoes), content_type='application/json', **cabecalhos)
+
+    def lote_misto(self):
+        return [
+            {'op': 'criar', 'dados': {'transaction_type': 'income', 'category': self.salario.pk,
+                                      'amount': '1000.00', 'date': '2024-01-05'}},
+            {'op': 'criar', 'dados': {'transaction_type': 'expense', 'amount': 12.5, 'date': '2024-02-01'}},
+            {'op': 'atualizar', 'id': self.existente.pk, 'dados': {'amount': '45.00'}},
+            {'op': 'excluir', 'id': self.removida.pk},
+        ]
+
+    def test_lote_misto_com_resumos_consistentes(self):
+        resposta = self.enviar(self.lote_misto())
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        corpo = resposta.json()
+        self.assertEqual((corpo['criadas'], corpo['atualizadas'], corpo['excluidas']), (2, 1, 1))
+        self.assertEqual([r['status'] for r in corpo['resultados']], ['criada', 'criada', 'atualizada', 'excluida'])
+
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.amount, Decimal('45.00'))
+        self.assertFalse(Transaction.objects.filter(pk=self.removida.pk).exists())
+        janeiro = DashboardSummary.objects.get(user=self.usuario, period_start=date(2024, 1, 1))
+        self.assertEqual((janeiro.total_income, janeiro.total_expense), (Decimal('1000.00'), Decimal('45.00')))
+
+    def test_consultas_nao_crescem_com_o_lote(self):
+        def consultas(quantidade):
+            operacoes = [
+                {'op': 'criar', 'dados': {'transaction_type': 'expense', 'amount': '1.00', 'date': '2024-03-01'}}
+                for _ in range(quantidade)
+            ]
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assertEqual(self.enviar(operacoes).status_code, 200)
+            return len(capturadas)
+
+        consultas(1)  # cria o resumo do mês
+        self.assertEqual(consultas(2), consultas(100))
+
+    def test_erro_de_validacao_impede_o_lote_atomico(self):
+        operacoes = self.lote_misto() + [
+            {'op': 'criar', 'dados': {'transaction_type': 'income', 'category': self.mercado.pk,
+                                      'amount': '1.00', 'date': '2024-01-01'}},
+            {'op': 'excluir', 'id': 999999},
+        ]
+        resposta = self.enviar(operacoes)
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual([r['status'] for r in resposta.json()['resultados']][-2:], ['erro', 'erro'])
+        self.assertEqual(Transaction.objects.filter(user=self.usuario).count(), 2)
+
+        resposta = self.enviar(operacoes, atomico='false')
+        self.assertEqual(resposta.status_code, 207)
+        self.assertEqual(Transaction.objects.filter(user=self.usuario).count(), 3)
+
+    def test_reenvio_com_a_mesma_chave_nao_reaplica(self):
+        primeira = self.enviar(self.lote_misto(), chave='sync-1')
+        self.assertEqual(primeira.status_code, 200)
+        total = Transaction.objects.count()
+
+        repetida = self.enviar(self.lote_misto(), chave='sync-1')
+        self.assertEqual(repetida.status_code, 200)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primeira.json())
+        self.assertEqual(Transaction.objects.count(), total)
+
+        outra = self.enviar(self.lote_misto()[:1], chave='sync-1')
+        self.assertEqual(outra.status_code, 422)
+        outro_modo = self.enviar(self.lote_misto(), chave='sync-1', atomico='false')
+        self.assertEqual(outro_modo.status_code, 422)
+
+    def test_chaves_vencidas_sao_descartadas_e_expurgadas(self):
+        self.assertEqual(self.enviar(self.lote_misto()[:1], chave='antiga').status_code, 200)
+        self.assertEqual(self.enviar(self.lote_misto()[:1], chave='recente').status_code, 200)
+        ChaveIdempotencia.objects.filter(chave='antiga').update(created_at=timezone.now() - timedelta(hours=25))
+
+        reenvio = self.enviar(self.lote_misto()[1:2], chave='antiga')
+        self.assertEqual(reenvio.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', reenvio)
+
+        ChaveIdempotencia.objects.update(created_at=timezone.now() - timedelta(hours=25))
+        saida = io.StringIO()
+        call_command('expurgar_chaves_idempotencia', stdout=saida)
+        self.assertIn("2 chaves", saida.getvalue())
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+
+
+class ImportadorCSVTests(TestCase):
+    CSV = (
+        "tipo,valor,data,descricao,categoria\n"
+        "receita,100.00,2024-01-05,Salário,Salário\n"
+        "despesa,\"1.234,56\",05/01/2024,\"Aluguel\nde janeiro\",\n"
+        "despesa,abc,2024-01-06,,\n"
+        "transferencia,10,2024-01-06,,\n"
+        "despesa,10.00,2024-01-07,Feira,Mercado\n"
+        "receita,5.00,2024-01-08,Bônus,Mercado\n"
+        "despesa,20.00,2024-01-09,Cinema,Lazer\n"
+        "despesa,30.00,2024-01-10,Farmácia,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('importador')
+        cls.salario = Category.objects.create(name='Salário', type='income')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+
+    def setUp(self):
+        self.lotes = []
+        self.falhar_no_lote = None
+        transacoes_movimentadas.connect(self.receber)
+        self.addCleanup(transacoes_movimentadas.disconnect, self.receber)
+
+    def receber(self, sender, movimentos, **kwargs):
+        self.lotes.append(movimentos)
+        if len(self.lotes) == self.falhar_no_lote:
+            raise RuntimeError("Falha simulada na gravação do lote.")
+
+    def importar(self, **opcoes):
+        return ImportadorCSV(self.usuario, tamanho_lote=2, **opcoes).importar(io.StringIO(self.CSV))
+
+    def test_rejeicoes_com_o_numero_da_linha_e_movimentos_por_lote(self):
+        resultado = self.importar()
+
+        self.assertEqual(resultado.importadas, 4)
+        self.assertEqual(resultado.ultima_linha_gravada, 10)
+        self.assertEqual(resultado.rejeitadas, [
+            {'linha': 5, 'erro': "Valor inválido: 'abc'."},
+            {'linha': 6, 'erro': "Tipo inválido: 'transferencia'."},
+            {'linha': 8, 'erro': "O tipo da transação não corresponde ao tipo da categoria."},
+            {'linha': 9, 'erro': "Categoria inexistente: 'Lazer'."},
+        ])
+        u = self.usuario.pk
+        self.assertEqual(self.lotes, [
+            [Movimento(u, date(2024, 1, 5), 'income', self.salario.pk, Decimal('100.00'), 1),
+             Movimento(u, date(2024, 1, 5), 'expense', None, Decimal('1234.56'), 1)],
+            [Movimento(u, date(2024, 1, 7), 'expense', self.mercado.pk, Decimal('10.00'), 1),
+             Movimento(u, date(2024, 1, 10), 'expense', None, Decimal('30.00'), 1)],
+        ])
+        self.assertEqual(
+            Transaction.objects.get(user=self.usuario, amount=Decimal('1234.56')).description, "Aluguel\nde janeiro",
+        )
+
+    def test_falha_em_um_lote_desfaz_tudo_no_modo_atomico(self):
+        self.falhar_no_lote = 2
+        with self.assertRaises(RuntimeError):
+            self.importar()
+        self.assertFalse(Transaction.objects.filter(user=self.usuario).exists())
+
+    def test_modo_por_lote_mantem_os_lotes_gravados_e_retoma(self):
+        self.falhar_no_lote = 2
+        with self.assertRaises(ImportacaoInterrompida) as contexto:
+            self.importar(atomico=False)
+        self.assertEqual(Transaction.objects.filter(user=self.usuario).count(), 2)
+        # O primeiro lote terminou na linha 4 (a descrição ocupa duas linhas).
+        parcial = contexto.exception.resultado
+        self.assertEqual((parcial.importadas, parcial.ultima_linha_gravada), (2, 4))
+
+        self.falhar_no_lote = None
+        resultado = self.importar(atomico=False, linha_inicial=4)
+        self.assertEqual(resultado.importadas, 2)
+        self.assertEqual(resultado.ultima_linha_gravada, 10)
+        self.assertEqual(
+            sorted(Transaction.objects.filter(user=self.usuario).values_list('amount', flat=True)),
+            [Decimal('10.00'), Decimal('30.00'), Decimal('100.00'), Decimal('1234.56')],
+        )
+
+
+    def test_api_devolve_onde_retomar_apos_falha(self):
+        self.client.force_login(self.usuario)
+
+        def enviar(**campos):
+            arquivo = io.BytesIO(self.CSV.encode())
+            arquivo.name = 'extrato.csv'
+            return self.client.post(
+                reverse('transacoes_importar'), {'arquivo': arquivo, 'tamanho_lote': 2, 'atomico': 'false', **campos},
+            )
+
+        self.falhar_no_lote = 2
+        resposta = enviar()
+        self.assertEqual(resposta.status_code, 500)
+        corpo = resposta.json()
+        self.assertEqual(corpo['erro'], "Falha simulada na gravação do lote.")
+        self.assertEqual((corpo['importadas'], corpo['ultima_linha_gravada']), (2, 4))
+
+        self.falhar_no_lote = None
+        resposta = enviar(linha_inicial=corpo['ultima_linha_gravada'])
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(Transaction.objects.filter(user=self.usuario).count(), 4)
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('exportador')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+        cls.salario = Category.objects.create(name='Salário', type='income')
+        categorias = [cls.salario if i % 3 == 0 else cls.mercado for i in range(30)]
+        Transaction.objects.bulk_create([
+            Transaction(user=cls.usuario, transaction_type=categoria.type, category=categoria,
+                        amount=Decimal(i * 7 % 50 + 1), date=date(2024, 1, 1) + timedelta(days=i * 3),
+                        description=f"Item {i}\ncom quebra" if i % 4 == 0 else f"Item {i}")
+            for i, categoria in enumerate(categorias)
+        ])
+        Transaction.objects.create(user=User.objects.create_user('outro'), transaction_type='income',
+                                   amount=Decimal('5.00'), date=date(2024, 2, 1))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def exportar(self, consulta):
+        resposta = self.client.get(reverse('transacoes_exportar') + consulta)
+        self.assertEqual(resposta.status_code, 200)
+        return b''.join(resposta.streaming_content).decode()
+
+    def filtrar(self, consulta):
+        ids, url = [], reverse('transacoes_filtrar') + consulta + '&tamanho=7'
+        while url:
+            pagina = self.client.get(url).json()
+            ids.extend(t['id'] for t in pagina['resultados'])
+            url = pagina['proximo']
+        return ids
+
+    def test_mesmos_resultados_da_listagem_filtrada(self):
+        for consulta in (
+            '?formato=csv',
+            '?date__gte=2024-02-01&date__lte=2024-03-10',
+            f'?category={self.mercado.pk}&amount__gte=10',
+            '?transaction_type=income&amount__lte=20',
+        ):
+            with self.subTest(consulta=consulta):
+                linhas = list(csv.DictReader(io.StringIO(self.exportar(consulta))))
+                self.assertEqual([int(linha['id']) for linha in linhas], self.filtrar(consulta))
+
+        ndjson = [json.loads(linha) for linha in self.exportar('?formato=ndjson').splitlines()]
+        self.assertEqual([t['id'] for t in ndjson], self.filtrar('?'))
+        self.assertEqual(ndjson[-1]['descricao'], "Item 0\ncom quebra")
+        self.assertEqual(ndjson[-1]['categoria'], 'Salário')
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(reverse('transacoes_exportar') + '?formato=xml').status_code, 400)
+        self.assertEqual(self.client.get(reverse('transacoes_exportar') + '?amount__gte=abc').status_code, 400)
+
+    def test_relatorio_conta_transacoes_e_nao_quebras_de_linha(self):
+        for formato in ('csv', 'ndjson'):
+            with self.subTest(formato=formato), tempfile.TemporaryDirectory() as media, \
+                    override_settings(MEDIA_ROOT=media):
+                relatorio = Relatorio.objects.create(
+                    usuario=self.usuario, tipo='transacoes', parametros={'formato': formato, 'inicio': '2024-01-10'},
+                )
+                executar('teste', parar_quando_vazio=True)
+                esperado = Transaction.objects.filter(user=self.usuario, date__gte=date(2024, 1, 10)).count()
+                self.assertTrue(relatorio.logs.filter(mensagem=f"Concluído com {esperado} linhas.").exists())
+
+
+class ExpurgoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('antigo')
+        cls.outro = User.objects.create_user('vizinho')
+        transacoes = [
+            Transaction(user=dono, transaction_type='expense', amount=Decimal('2.00'),
+                        date=date(2010, 1, 1) + timedelta(days=i), description=f"Antiga {i}")
+            for dono in (cls.usuario, cls.outro) for i in range(25)
+        ]
+        transacoes.append(Transaction(user=cls.usuario, transaction_type='expense',
+                                      amount=Decimal('9.00'), date=date.today()))
+        Transaction.objects.bulk_create(transacoes)
+        emitir_movimentos(Movimento.de(t) for t in transacoes)
+
+    def test_expurgo_em_blocos_pela_fila_com_arquivamento(self):
+        self.client.force_login(self.usuario)
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            resposta = self.client.delete(reverse('transacoes_excluir_antigas') + '?arquivar=true&tamanho_bloco=10')
+            self.assertEqual(resposta.status_code, 202)
+            repetida = self.client.delete(reverse('transacoes_excluir_antigas') + '?tamanho_bloco=500')
+            self.assertEqual(repetida.status_code, 409)
+            self.assertEqual(repetida.json()['id_relatorio'], resposta.json()['id_relatorio'])
+            executar('teste', parar_quando_vazio=True)
+
+            relatorio = Relatorio.objects.get(id_relatorio=resposta.json()['id_relatorio'])
+            self.assertEqual(relatorio.status, 'concluido')
+            self.assertEqual(relatorio.parametros['progresso']['excluidas'], 25)
+            self.assertEqual(relatorio.parametros['progresso']['blocos'], 3)
+            with gzip.open(os.path.join(media, relatorio.caminho_arquivo.name), 'rt') as arquivo:
+                linhas = list(csv.DictReader(arquivo))
+
+        self.assertEqual(len(linhas), 25)
+        self.assertEqual(Transaction.objects.filter(user=self.usuario).count(), 1)
+        self.assertEqual(Transaction.objects.filter(user=self.outro).count(), 25)
+        janeiro = DashboardSummary.objects.get(user=self.usuario, period_start=date(2010, 1, 1))
+        self.assertEqual(janeiro.total_expense, Decimal('0.00'))
+
+    def test_expurgos_simultaneos_agendam_um_so(self):
+        self.client.force_login(self.usuario)
+        atomico = views.atomico_do_usuario
+        concorrentes = []
+
+        def concorrente_chega_antes(user_id):
+            # Entre a consulta e o INSERT, outra requisição agenda um expurgo.
+            if not concorrentes:
+                concorrentes.append(Relatorio.objects.create(usuario=self.usuario, tipo='expurgo', parametros={}))
+            return atomico(user_id)
+
+        with mock.patch.object(views, 'atomico_do_usuario', concorrente_chega_antes):
+            resposta = self.client.delete(reverse('transacoes_excluir_antigas'))
+
+        self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(resposta.json()['id_relatorio'], str(concorrentes[0].id_relatorio))
+        self.assertEqual(Relatorio.objects.filter(usuario=self.usuario, tipo='expurgo').count(), 1)
+
+
+class ArquivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('historico')
+        cls.mercado = Category.objects.create(name='Mercado', type='expense')
+        transacoes = [
+            Transaction(user=cls.usuario, transaction_type='expense', category=cls.mercado,
+                        amount=Decimal(i % 5 + 1), date=date(2012, 1, 1) + timedelta(days=i * 20),
+                        description=f"Compra {i}")
+            for i in range(15)
+        ] + [
+            Transaction(user=cls.usuario, transaction_type='income', amount=Decimal('100.00'),
+                        date=date(2024, 1, 1) + timedelta(days=i))
+            for i in range(5)
+        ]
+        Transaction.objects.bulk_create(transacoes)
+        emitir_movimentos(Movimento.de(t) for t in transacoes)
+
+    def setUp(self):
+        # Os ids de usuário se repetem entre testes; a versão do cache também.
+        caches['respostas'].clear()
+        self.client.force_login(self.usuario)
+
+    def listar(self, url):
+        ids = []
+        while url:
+            pagina = self.client.get(url).json()
+            ids.extend(t['id'] for t in pagina['resultados'])
+            url = pagina['proximo']
+        return ids
+
+    def test_leituras_atravessam_para_o_arquivo(self):
+        esperado = list(
+            Transaction.objects.filter(user=self.usuario).order_by('-date', '-pk').values_list('pk', flat=True)
+        )
+        relatorio = self.client.get('/api/transacoes/relatorio/?agrupar=categoria').json()
+        parcial = self.client.get('/api/transacoes/relatorio/?inicio=2012-03-01&fim=2024-01-02').json()
+        resumos = list(DashboardSummary.objects.values_list('period_start', 'total_expense').order_by('period_start'))
+        baratas = list(
+            Transaction.objects.filter(user=self.usuario, date__gte=date(2012, 6, 1), amount__lte=2)
+            .order_by('-date', '-pk').values_list('pk', flat=True)
+        )
+
+        call_command('archive_old_transactions', anos=5, stdout=io.StringIO())
+
+        self.assertEqual(Transaction.objects.filter(user=self.usuario).count(), 5)
+        self.assertEqual(self.listar('/api/transacoes/?tamanho=4'), esperado)
+        self.assertEqual(self.client.get('/api/transacoes/relatorio/?agrupar=categoria').json(), relatorio)
+        self.assertEqual(self.client.get('/api/transacoes/relatorio/?inicio=2012-03-01&fim=2024-01-02').json(), parcial)
+        filtradas = self.client.get('/api/transacoes/filtrar/?date__gte=2012-06-01&amount__lte=2').json()
+        self.assertEqual([t['id'] for t in filtradas['resultados']], baratas)
+        buscadas = self.client.get('/api/transacoes/?search=compra 1').json()
+        self.assertEqual(
+            sorted(t['description'] for t in buscadas['resultados']),
+            ['Compra 1', 'Compra 10', 'Compra 11', 'Compra 12', 'Compra 13', 'Compra 14'],
+        )
+
+        reconstruir_resumos([self.usuario.pk])
+        self.assertEqual(
+            list(DashboardSummary.objects.values_list('period_start', 'total_expense').order_by('period_start')),
+            resumos,
+        )
+
+    def test_paginas_leem_so_os_anos_necessarios(self):
+        extras = [
+            Transaction(user=self.usuario, transaction_type='expense', amount=Decimal('1.00'), date=date(ano, 6, 1))
+            for ano in (2010, 2011)
+        ]
+        Transaction.objects.bulk_create(extras)
+        emitir_movimentos(Movimento.de(t) for t in extras)
+        esperado = list(
+            Transaction.objects.filter(user=self.usuario).order_by('-date', '-pk').values_list('pk', flat=True)
+        )
+        quentes = list(
+            Transaction.objects.filter(user=self.usuario, date__year=2024)
+            .order_by('-amount', '-pk').values_list('pk', flat=True)
+        )
+        call_command('archive_old_transactions', anos=5, stdout=io.StringIO())
+        self.assertEqual(arquivo.anos_arquivados(self.usuario.pk), [2010, 2011, 2012])
+
+        with mock.patch.object(arquivo, 'descompactar', wraps=arquivo.descompactar) as lidos:
+            primeira = self.client.get('/api/transacoes/?tamanho=8').json()
+        # As 5 linhas quentes e 3 de 2012: os anos anteriores não são abertos.
+        self.assertEqual([t['id'] for t in primeira['resultados']], esperado[:8])
+        self.assertEqual(lidos.call_count, 1)
+        self.assertEqual(self.listar('/api/transacoes/?tamanho=8'), esperado)
+
+        with mock.patch.object(arquivo, 'descompactar', wraps=arquivo.descompactar) as lidos:
+            por_valor = self.client.get('/api/transacoes/?ordering=-amount').json()
+        self.assertEqual([t['id'] for t in por_valor['resultados']], quentes)
+        lidos.assert_not_called()
+
+    def test_detalhe_restrito_ao_dono(self):
+        quente = Transaction.objects.filter(user=self.usuario).first()
+        self.client.force_login(User.objects.create_user('intruso'))
+        detalhe = reverse('transacao_detalhe', args=[quente.pk])
+
+        self.assertEqual(self.client.get(detalhe).status_code, 404)
+        resposta = self.client.put(detalhe, {'amount': '1.00'}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 404)
+        self.assertEqual(self.client.delete(detalhe).status_code, 404)
+        self.assertTrue(Transaction.objects.filter(pk=quente.pk, amount=quente.amount).exists())
+
+    def test_detalhe_exportacao_e_relatorios_incluem_o_arquivo(self):
+        arquivada = Transaction.objects.filter(user=self.usuario).order_by('date').first()
+        baratas = list(
+            Transaction.objects.filter(user=self.usuario, date__gte=date(2012, 6, 1), amount__lte=2)
+            .order_by('-date', '-pk').values_list('pk', flat=True)
+        )
+        call_command('archive_old_transactions', anos=5, stdout=io.StringIO())
+
+        detalhe = reverse('transacao_detalhe', args=[arquivada.pk])
+        self.assertEqual(self.client.get(detalhe).json()['description'], arquivada.description)
+        self.assertEqual(self.client.delete(detalhe).status_code, 409)
+        self.assertEqual(self.client.get(reverse('transacao_detalhe', args=[99999])).status_code, 404)
+
+        resposta = self.client.get(reverse('transacoes_exportar') + '?date__gte=2012-06-01&amount__lte=2')
+        linhas = list(csv.DictReader(io.StringIO(b''.join(resposta.streaming_content).decode())))
+        self.assertEqual([int(linha['id']) for linha in linhas], baratas)
+        self.assertEqual(linhas[0]['categoria'], 'Mercado')
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            relatorio = Relatorio.objects.create(usuario=self.usuario, tipo='transacoes', parametros={'formato': 'ndjson'})
+            executar('teste', parar_quando_vazio=True)
+            relatorio.refresh_from_db()
+            with open(os.path.join(media, relatorio.caminho_arquivo.name)) as arquivo:
+                ids = [json.loads(linha)['id'] for linha in arquivo]
+        self.assertEqual(len(ids), 20)
+        self.assertIn(arquivada.pk, ids)
+
+    def test_expurgo_apara_os_segmentos(self):
+        restantes = Transaction.objects.filter(user=self.usuario, date__gte=date(2012, 6, 1))
+        esperado = list(restantes.order_by('-date', '-pk').values_list('pk', flat=True))
+        despesas = sum(t.amount for t in restantes if t.transaction_type == 'expense')
+        call_command('archive_old_transactions', anos=5, stdout=io.StringIO())
+
+        estado = ExpurgoTransacoes(date(2012, 6, 1), user_id=self.usuario.pk).executar()
+        self.assertEqual(estado.excluidas, 15 - sum(1 for t in restantes if t.transaction_type == 'expense'))
+        self.assertEqual(self.listar('/api/transacoes/?tamanho=4'), esperado)
+        relatorio = self.client.get('/api/transacoes/relatorio/').json()
+        self.assertEqual(Decimal(relatorio['total_despesas']), despesas)
+        self.assertEqual(SegmentoArquivado.objects.get(user=self.usuario).quantidade_despesas, len(esperado) - 5)
+
+        ExpurgoTransacoes(date(2013, 1, 1), user_id=self.usuario.pk).executar()
+        self.assertFalse(SegmentoArquivado.objects.filter(user=self.usuario).exists())
+        self.assertEqual(self.client.get('/api/transacoes/relatorio/').json()['total_despesas'], '0.00')
+        self.assertFalse(DashboardSummary.objects.filter(user=self.usuario, total_expense__gt=0).exists())
+
+
+class SerializacaoRapidaTests(TestCase):
+    def test_mesma_saida_do_serializer(self):
+        usuario = User.objects.create_user('serializado')
+        mercado = Category.objects.create(name='Mercado', type='expense')
+        Transaction.objects.create(user=usuario, transaction_type='expense', category=mercado,
+                                   amount=Decimal('12.5'), date=date(2024, 1, 31), description="Pão de açúcar\u2028")
+        Transaction.objects.create(user=usuario, transaction_type='income', amount=Decimal('1000.00'),
+                                   date=date(2024, 2, 1), description='')
+        transacoes = Transaction.objects.filter(user=usuario).order_by('-date', '-pk')
+        serializacao = serializacao_de(TransacaoSerializer)
+
+        esperado = JSONRenderer().render(TransacaoSerializer(transacoes, many=True).data)
+        rapido = RenderizadorJSONRapido().render(serializacao.para_dicts(serializacao.linhas(transacoes)))
+        self.assertEqual(rapido, esperado)
+        self.assertIn(b'-03:00', rapido)
+
+        self.client.force_login(usuario)
+        resposta = self.client.get('/api/transacoes/')
+        self.assertEqual(resposta.json()['resultados'], json.loads(esperado))
+        # A API navegável continua passando pelo serializer.
+        self.assertEqual(self.client.get('/api/transacoes/', HTTP_ACCEPT='text/html').status_code, 200)
+
+
+class BuscaTextualTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('buscador', is_staff=True, is_superuser=True)
+        self.saude = Category.objects.create(name='Saúde', type='expense')
+        self.farmacia = Transaction.objects.create(user=self.usuario, transaction_type='expense', category=self.saude,
+                                                   amount=Decimal('30.00'), date=date(2024, 1, 2), description='Farmácia São João')
+        self.mercado = Transaction.objects.create(user=self.usuario, transaction_type='expense', amount=Decimal('80.00'),
+                                                  date=date(2024, 1, 3), description='Pão de Açúcar')
+        self.client.force_login(self.usuario)
+
+    def buscar(self, termo):
+        return sorted(t['id'] for t in self.client.get('/api/transacoes/', {'search': termo}).json()['resultados'])
+
+    def test_acentos_prefixos_e_categoria(self):
+        self.assertTrue(indice_disponivel('default'))
+        self.assertEqual(self.buscar('farm'), [self.farmacia.pk])
+        self.assertEqual(self.buscar('acucar'), [self.mercado.pk])
+        self.assertEqual(self.buscar('SAUDE joão'), [self.farmacia.pk])
+        self.assertEqual(self.buscar('"pão de"'), [self.mercado.pk])
+        self.assertEqual(self.buscar('"de pão"'), [])
+        self.assertEqual(self.buscar('armacia'), [])
+
+        resposta = self.client.get(reverse('admin:transactions_transaction_changelist'), {'q': 'sao joao'})
+        self.assertEqual([t.pk for t in resposta.context['cl'].result_list], [self.farmacia.pk])
+
+    def test_indice_acompanha_as_escritas(self):
+        Transaction.objects.filter(pk=self.mercado.pk).update(description='Mercado Extra', category=self.saude)
+        self.assertEqual(self.buscar('acucar'), [])
+        self.assertEqual(self.buscar('extra saude'), [self.mercado.pk])
+
+        self.saude.name = 'Farmácia'
+        self.saude.save()
+        self.assertEqual(self.buscar('saude'), [])
+        self.assertEqual(self.buscar('farmacia'), [self.farmacia.pk, self.mercado.pk])
+
+        self.farmacia.delete()
+        self.assertEqual(self.buscar('farmacia'), [self.mercado.pk])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM transacao_busca')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class BenchmarkTests(TestCase):
+    def test_percentis_e_comparacao_com_a_base(self):
+        medidas = percentis([float(i) for i in range(100, 0, -1)])
+        self.assertEqual((medidas['p50_ms'], medidas['p95_ms'], medidas['p99_ms']), (50.0, 95.0, 99.0))
+
+        base = {'resultados': {'http': {
+            'listagem': {'p95_ms': 10.0, 'requisicoes_por_segundo': 100.0},
+            'relatorio': {'p95_ms': 10.0, 'requisicoes_por_segundo': 100.0},
+        }}}
+        atual = {'resultados': {'http': {
+            'listagem': {'p95_ms': 10.5, 'requisicoes_por_segundo': 98.0},
+            'relatorio': {'p95_ms': 10.0, 'requisicoes_por_segundo': 80.0},
+        }}}
+        self.assertEqual(comparar(atual, base)['regressoes'], ['http.relatorio'])
+
+    def test_medicao_pelo_cliente_conta_consultas(self):
+        usuario = User.objects.create_user('medido')
+        Transaction.objects.create(user=usuario, transaction_type='income', amount=Decimal('10.00'), date=date(2024, 1, 1))
+        self.client.force_login(usuario)
+        resultado = medir_requisicoes([self.client], [[('GET', '/api/transacoes/', None)]], 5)
+        self.assertEqual((resultado['requisicoes'], resultado['erros']), (5, 0))
+        # Sessão, usuário, a página e os segmentos arquivados.
+        self.assertEqual(resultado['consultas_por_requisicao'], 4)
+
+    def test_perfis_de_banco(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+        padrao = perfil_banco('sqlite_padrao', ambiente={})
+        self.assertNotIn('OPTIONS', padrao)
+        pool = perfil_banco('postgresql', ambiente={'BANCO_POOL': 'true', 'BANCO_POOL_MAX': '20'})
+        self.assertEqual((pool['CONN_MAX_AGE'], pool['OPTIONS']['pool']['max_size']), (0, 20))
+        self.assertGreater(perfil_banco('postgresql', ambiente={})['CONN_MAX_AGE'], 0)
+        with self.assertRaises(ValueError):
+            perfil_banco('mysql', ambiente={})
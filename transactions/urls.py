@@ -0,0 +1,22 @@
+from django.urls import path
+from transactions.views import (
+    TransacaoListCreateView,
+    TransacaoDetailView,
+    RelatorioTransacoesView,
+    FiltrarTransacoesView,
+    ExcluirTransacoesAntigasView,
+    ImportarTransacoesCSVView,
+    ExportarTransacoesView,
+    TransacoesEmLoteView,
+)
+
+urlpatterns = [
+    path('', TransacaoListCreateView.as_view(), name='transacoes'),
+    path('<int:pk>/', TransacaoDetailView.as_view(), name='transacao_detalhe'),
+    path('relatorio/', RelatorioTransacoesView.as_view(), name='transacoes_relatorio'),
+    path('filtrar/', FiltrarTransacoesView.as_view(), name='transacoes_filtrar'),
+    path('antigas/', ExcluirTransacoesAntigasView.as_view(), name='transacoes_excluir_antigas'),
+    path('importar/', ImportarTransacoesCSVView.as_view(), name='transacoes_importar'),
+    path('exportar/', ExportarTransacoesView.as_view(), name='transacoes_exportar'),
+    path('lote/', TransacoesEmLoteView.as_view(), name='transacoes_lote'),
+]
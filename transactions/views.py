@@ -1,25 +1,82 @@
+import json
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db import models
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError, models, router
+from django.http import Http404
 from rest_framework.views import APIView # type: ignore
 from rest_framework.response import Response # type: ignore
 from rest_framework import status, generics, filters # type: ignore
 from django_filters.rest_framework import DjangoFilterBackend # type: ignore
-from transactions.models import Transacao
+from transactions.models import Category, Transaction
 from transactions.serializers import TransacaoSerializer
+from transactions.serializacao import ListagemRapidaMixin
+from transactions.importacao import ImportadorCSV, ErroImportacao, ImportacaoInterrompida, TAMANHO_LOTE_PADRAO
+from transactions.resumo import resumir_transacoes
+from transactions.paginacao import PaginacaoPorCursor
+from transactions.filtros import TransacaoFiltro
+from transactions.exportacao import exportar
+from transactions.lote import ChaveReutilizada, ErroLote, aplicar_lote
+from transactions.retencao import TAMANHO_BLOCO_PADRAO
+from transactions.busca import BuscaTextualFilter, corresponde, indice_disponivel
+from transactions.arquivo import (
+    anos_arquivados, arquivadas_do_filtro, corresponde_aos_filtros, metricas_arquivadas, transacao_arquivada,
+    transacoes_arquivadas,
+)
+from reports.models import Relatorio
+from accounts.cache import em_cache
+from accounts.replicas import LeituraEmReplicaMixin
+from accounts.shards import atomico_do_usuario
 
 
-class TransacaoListCreateView(generics.ListCreateAPIView):
+class LeituraDoArquivoMixin:
+    """
+    Inclui nas listagens paginadas as transações arquivadas que atendem aos
+    mesmos filtros (ver ``transactions.arquivo``). Só a ordenação por data
+    inclui o arquivo; ordenando por valor, a listagem traz apenas a tabela
+    principal.
+    """
+    def anos_arquivados(self):
+        return anos_arquivados(self.request.user.pk)
+
+    def transacoes_arquivadas(self, inicio=None, fim=None):
+        filtro = DjangoFilterBackend().get_filterset(self.request, self.get_queryset(), self)
+        dados = filtro.form.cleaned_data if filtro is not None and filtro.is_valid() else {}
+        inicio = max([d for d in (inicio, dados.get('date__gte'), dados.get('date')) if d], default=None)
+        fim = min([d for d in (fim, dados.get('date__lte'), dados.get('date')) if d], default=None)
+        if inicio and fim and inicio > fim:
+            return []
+
+        transacoes = [t for t in transacoes_arquivadas(self.request.user.pk, inicio, fim) if corresponde_aos_filtros(t, dados)]
+        if BuscaTextualFilter not in self.filter_backends:
+            return transacoes
+        # Mesma regra da busca no banco: todos os termos, cada um em algum campo.
+        termos = BuscaTextualFilter().get_search_terms(self.request)
+        if not termos:
+            return transacoes
+        indexada = indice_disponivel(self.get_queryset().db)
+        nomes = dict(Category.objects.values_list('pk', 'name'))
+        return [
+            t for t in transacoes
+            if corresponde(termos, [t.description, nomes.get(t.category_id)], indexada)
+        ]
+
+
+class TransacaoListCreateView(ListagemRapidaMixin, LeituraDoArquivoMixin, generics.ListCreateAPIView):
     """
     View para listar e criar transações.
     """
-    queryset = Transacao.objects.all()
+    queryset = Transaction.objects.all()
     serializer_class = TransacaoSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
-    filterset_fields = ['tipo', 'categoria', 'usuario', 'data']
-    ordering_fields = ['valor', 'data']
-    search_fields = ['descricao', 'categoria']
+    pagination_class = PaginacaoPorCursor
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, BuscaTextualFilter]
+    filterset_fields = ['transaction_type', 'category', 'user', 'date']
+    ordering_fields = ['amount', 'date']
+    search_fields = ['description', 'category__name']
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
 
     def perform_create(self, serializer):
         """
@@ -27,66 +84,123 @@ class TransacaoListCreateView(generics.ListCreateAPIView):
         - O valor deve ser positivo.
         - A data deve ser informada corretamente.
         """
-        if serializer.validated_data['valor'] <= 0:
+        if serializer.validated_data['amount'] <= 0:
             raise ValueError("O valor da transação deve ser positivo.")
 
-        serializer.save(usuario=self.request.user)
+        serializer.save(user=self.request.user)
 
 
 class TransacaoDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     View para recuperar, atualizar e deletar uma transação específica.
     """
-    queryset = Transacao.objects.all()
+    queryset = Transaction.objects.all()
     serializer_class = TransacaoSerializer
 
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_object(self):
+        """
+        As transações arquivadas aparecem na listagem, então o detalhe também
+        as encontra (somente para leitura).
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            transacao = transacao_arquivada(self.request.user.pk, self.kwargs['pk'])
+            if transacao is None:
+                raise
+            return transacao
+
+    def update(self, request, *args, **kwargs):
+        if getattr(self.get_object(), 'arquivada', False):
+            return self._arquivada()
+        return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        if getattr(self.get_object(), 'arquivada', False):
+            return self._arquivada()
+        return super().destroy(request, *args, **kwargs)
+
+    def _arquivada(self):
+        return JsonResponse(
+            {"erro": "A transação está arquivada e não pode ser alterada nem excluída."},
+            status=status.HTTP_409_CONFLICT,
+        )
+
     def perform_update(self, serializer):
         """
         Regras ao atualizar uma transação:
         - Verificar se o valor permanece positivo.
         """
-        if serializer.validated_data.get('valor', 0) <= 0:
+        if serializer.validated_data.get('amount', 0) <= 0:
             raise ValueError("O valor da transação deve ser positivo.")
 
         serializer.save()
 
 
-class RelatorioTransacoesView(APIView):
+class RelatorioTransacoesView(LeituraEmReplicaMixin, APIView):
     """
     View para gerar um relatório com o resumo das transações do usuário.
     """
     def get(self, request):
         """
         Retorna um resumo das transações, incluindo total de receitas, despesas e saldo final.
+
+        Parâmetros opcionais:
+        - ``inicio`` e ``fim`` (AAAA-MM-DD): intervalo de datas.
+        - ``agrupar``: ``categoria``, ``mes`` ou ambos separados por vírgula.
+
+        Tudo é calculado em uma única consulta com agregação condicional, e o
+        resultado fica em cache até a próxima escrita do usuário.
         """
-        usuario = request.user
-        transacoes = Transacao.objects.filter(usuario=usuario)
+        try:
+            inicio = self._data(request, 'inicio')
+            fim = self._data(request, 'fim')
+            agrupar = [g for g in request.query_params.get('agrupar', '').split(',') if g]
+            resumo, acertou = em_cache('resumo', request.user.pk, request.query_params, lambda: resumir_transacoes(
+                Transaction.objects.filter(user=request.user),
+                inicio=inicio,
+                fim=fim,
+                agrupar=agrupar,
+                extras=metricas_arquivadas(request.user.pk, inicio, fim, agrupar),
+            ))
+        except ValueError as e:
+            return JsonResponse({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_receitas = transacoes.filter(tipo='receita').aggregate(models.Sum('valor'))['valor__sum'] or 0
-        total_despesas = transacoes.filter(tipo='despesa').aggregate(models.Sum('valor'))['valor__sum'] or 0
-        saldo_final = total_receitas - total_despesas
+        geral = resumo['geral']
+        resumo = dict(resumo, **{
+            'total_receitas': geral['total_receitas'],
+            'total_despesas': geral['total_despesas'],
+            'saldo_final': geral['saldo'],
+        })
+        resposta = JsonResponse(resumo, status=status.HTTP_200_OK)
+        resposta['X-Cache'] = 'HIT' if acertou else 'MISS'
+        return resposta
 
-        resumo = {
-            'total_receitas': total_receitas,
-            'total_despesas': total_despesas,
-            'saldo_final': saldo_final,
-        }
-        return JsonResponse(resumo, status=status.HTTP_200_OK)
+    def _data(self, request, parametro):
+        valor = request.query_params.get(parametro)
+        if not valor:
+            return None
+        data = parse_date(valor)
+        if data is None:
+            raise ValueError(f"Data inválida em '{parametro}': '{valor}'.")
+        return data
 
 
-class FiltrarTransacoesView(generics.ListAPIView):
+class FiltrarTransacoesView(LeituraEmReplicaMixin, ListagemRapidaMixin, LeituraDoArquivoMixin, generics.ListAPIView):
     """
     View para filtrar transações com base em parâmetros avançados.
     """
-    queryset = Transacao.objects.all()
+    queryset = Transaction.objects.all()
     serializer_class = TransacaoSerializer
+    pagination_class = PaginacaoPorCursor
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = {
-        'valor': ['gte', 'lte'],  # Faixa de valores
-        'data': ['gte', 'lte'],  # Faixa de datas
-        'tipo': ['exact'],
-        'categoria': ['exact'],
-    }
+    filterset_class = TransacaoFiltro
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
 
 
 class ExcluirTransacoesAntigasView(APIView):
@@ -95,16 +209,59 @@ class ExcluirTransacoesAntigasView(APIView):
     """
     def delete(self, request):
         """
-        Remove transações com data superior a 5 anos a partir da data atual.
+        Agenda o expurgo das transações com data superior a 5 anos a partir da
+        data atual. A remoção é feita em blocos pelos trabalhadores da fila de
+        relatórios; o andamento pode ser acompanhado em
+        ``/api/relatorios/<id_relatorio>/``.
+
+        Parâmetros opcionais: ``arquivar`` (``true`` para guardar as linhas em
+        um CSV compactado antes de removê-las), ``tamanho_bloco`` e ``pausa``
+        (segundos entre blocos).
+
+        Se já houver um expurgo pendente ou em andamento, responde 409 com o
+        ``id_relatorio`` dele: os novos parâmetros não são aplicados.
         """
-        limite_data = timezone.now() - timezone.timedelta(days=5 * 365)
-        transacoes_antigas = Transacao.objects.filter(data__lt=limite_data, usuario=request.user)
-        total_excluidas = transacoes_antigas.count()
-        transacoes_antigas.delete()
+        try:
+            tamanho_bloco = int(request.query_params.get('tamanho_bloco', TAMANHO_BLOCO_PADRAO))
+            pausa = float(request.query_params.get('pausa', 0))
+        except ValueError:
+            return JsonResponse({"erro": "Parâmetros numéricos inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < tamanho_bloco <= 50000 or not 0 <= pausa <= 60:
+            return JsonResponse(
+                {"erro": "Use tamanho_bloco entre 1 e 50000 e pausa entre 0 e 60 segundos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        limite_data = timezone.localdate() - timezone.timedelta(days=5 * 365)
+        while True:
+            em_andamento = Relatorio.objects.filter(
+                usuario=request.user, tipo='expurgo', status__in=['pendente', 'em_processamento'],
+            ).first()
+            if em_andamento:
+                return JsonResponse({
+                    "erro": "Já existe um expurgo agendado; aguarde a conclusão para agendar outro.",
+                    "id_relatorio": em_andamento.id_relatorio,
+                    "status": em_andamento.status,
+                }, status=status.HTTP_409_CONFLICT)
+            try:
+                with atomico_do_usuario(request.user.pk):
+                    relatorio = Relatorio.objects.create(usuario=request.user, tipo='expurgo', parametros={
+                        'antes_de': limite_data.isoformat(),
+                        'arquivar': request.query_params.get('arquivar', 'false').lower() == 'true',
+                        'tamanho_bloco': tamanho_bloco,
+                        'pausa': pausa,
+                    })
+                break
+            except IntegrityError:
+                # Outra requisição agendou um expurgo entre a consulta e o INSERT
+                # (``expurgo_unico_em_andamento``): responde com o dela.
+                continue
 
         return JsonResponse({
-            "mensagem": f"{total_excluidas} transações antigas foram excluídas com sucesso."
-        }, status=status.HTTP_200_OK)
+            "mensagem": "Expurgo de transações antigas agendado.",
+            "id_relatorio": relatorio.id_relatorio,
+            "status": relatorio.status,
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class ImportarTransacoesCSVView(APIView):
@@ -114,29 +271,104 @@ class ImportarTransacoesCSVView(APIView):
     def post(self, request):
         """
         Processa o upload de um arquivo CSV e importa as transações para o banco de dados.
+        O arquivo é lido em fluxo e gravado em lotes; linhas inválidas são
+        devolvidas em ``rejeitadas`` com o número da linha. Com
+        ``atomico=false``, uma falha no meio do arquivo responde com o
+        resultado parcial e ``ultima_linha_gravada``.
         """
         arquivo = request.FILES.get('arquivo')
         if not arquivo:
             return JsonResponse({"erro": "Nenhum arquivo enviado."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Implementar lógica de importação aqui.
-        # Exemplo simplificado:
         try:
-            import csv
-
-            with arquivo.open('r') as f:
-                reader = csv.DictReader(f)
-                for linha in reader:
-                    Transacao.objects.create(
-                        usuario=request.user,
-                        tipo=linha['tipo'],
-                        valor=float(linha['valor']),
-                        descricao=linha['descricao'],
-                        categoria=linha['categoria'],
-                        data=linha['data'],
-                    )
-
-            return JsonResponse({"mensagem": "Transações importadas com sucesso."}, status=status.HTTP_201_CREATED)
-        except Exception as e:
-            return JsonResponse({"erro": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            importador = ImportadorCSV(
+                usuario=request.user,
+                tamanho_lote=int(request.data.get('tamanho_lote', TAMANHO_LOTE_PADRAO)),
+                atomico=str(request.data.get('atomico', 'true')).lower() != 'false',
+                linha_inicial=int(request.data.get('linha_inicial', 0)),
+            )
+            resultado = importador.importar(arquivo)
+        except (ErroImportacao, ValueError) as e:
+            return JsonResponse({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ImportacaoInterrompida as e:
+            # Os lotes anteriores ficaram gravados: o cliente retoma de
+            # ``ultima_linha_gravada`` com ``linha_inicial``.
+            return JsonResponse(
+                {"erro": str(e), **e.resultado.como_dict()}, status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return JsonResponse({
+            "mensagem": f"{resultado.importadas} transações importadas com sucesso.",
+            **resultado.como_dict(),
+        }, status=status.HTTP_201_CREATED)
+
+
+class TransacoesEmLoteView(APIView):
+    """
+    View para criar, atualizar e excluir várias transações em uma requisição.
+    """
+    def post(self, request):
+        """
+        Aceita uma lista JSON de operações (ou ``{"operacoes": [...]}``) ou
+        NDJSON (``Content-Type: application/x-ndjson``), uma operação por linha.
+        Com ``?atomico=false`` as operações válidas são gravadas mesmo que
+        outras falhem. O cabeçalho ``Idempotency-Key`` evita que um lote
+        reenviado seja aplicado duas vezes.
+        """
+        try:
+            operacoes = self._operacoes(request)
+            resposta, codigo, repetido = aplicar_lote(
+                request.user,
+                operacoes,
+                atomico=request.query_params.get('atomico', 'true').lower() != 'false',
+                chave=request.headers.get('Idempotency-Key'),
+                corpo=request.body,
+            )
+        except ErroLote as e:
+            codigo = status.HTTP_422_UNPROCESSABLE_ENTITY if isinstance(e, ChaveReutilizada) else status.HTTP_400_BAD_REQUEST
+            return JsonResponse({"erro": str(e)}, status=codigo)
+
+        resposta = JsonResponse(resposta, status=codigo)
+        if repetido:
+            resposta['Idempotent-Replayed'] = 'true'
+        return resposta
+
+    def _operacoes(self, request):
+        try:
+            if request.content_type == 'application/x-ndjson':
+                return [json.loads(linha) for linha in request.body.decode('utf-8').splitlines() if linha.strip()]
+            dados = json.loads(request.body or b'null')
+        except (UnicodeDecodeError, ValueError) as e:
+            raise ErroLote(f"Corpo inválido: {e}.")
+        if isinstance(dados, dict):
+            dados = dados.get('operacoes')
+        return dados
+
+
+class ExportarTransacoesView(LeituraEmReplicaMixin, APIView):
+    """
+    View para exportar as transações do usuário em CSV ou NDJSON.
+    """
+    def get(self, request):
+        """
+        Transmite o arquivo em fluxo, aceitando os mesmos filtros de
+        ``FiltrarTransacoesView`` e ``formato`` (``csv`` ou ``ndjson``). As
+        transações arquivadas entram no arquivo, como na listagem.
+        """
+        filtro = TransacaoFiltro(request.query_params, queryset=Transaction.objects.filter(user=request.user))
+        if not filtro.is_valid():
+            return JsonResponse({"erro": filtro.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = request.query_params.get('formato', 'csv')
+        try:
+            # O arquivo é lido depois que a view retorna, fora dos escopos da
+            # réplica e do shard: o banco fica fixado nas consultas.
+            banco = router.db_for_read(Transaction)
+            arquivadas = arquivadas_do_filtro(request.user.pk, filtro.form.cleaned_data, using=banco)
+            blocos, content_type = exportar(filtro.qs.using(banco), formato, arquivadas)
+        except ValueError as e:
+            return JsonResponse({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        resposta = StreamingHttpResponse(blocos, content_type=content_type)
+        resposta['Content-Disposition'] = f'attachment; filename="transacoes.{formato}"'
+        return resposta